@@ -2,7 +2,7 @@ import copy
 import uuid
 from typing import List, Tuple, Union
 
-from knowledge_base import syntax, unification
+from knowledge_base import syntax, tracing, unification
 
 T_Value = Union[str, syntax.Node]
 T_Children = List[syntax.Node]
@@ -31,7 +31,8 @@ def convert_to_cnf(node: syntax.Node) -> Tuple[syntax.Node,
               _skolemize,
               _distribute_conjunction):
         state = syntax.WalkState.make()
-        node = syntax.walk(node, f, state=state)
+        with tracing.span(f.__name__.lstrip('_'), 'cnf'):
+            node = syntax.walk(node, f, state=state)
 
         replaced = state.context.get('replaced', {})
         assert not (replaced.keys() & rv.keys())
@@ -0,0 +1,201 @@
+"""Congruence closure of ground equalities.
+
+Ground terms are hash-consed into integer IDs, which are kept in a union-find
+structure. Merging two classes also merges all function applications whose
+arguments became equal (congruence), so e.g. `A = B` implies `F(A) = F(B)`.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from knowledge_base import syntax
+
+Node = syntax.Node
+
+
+class CongruenceClosure:
+    """Equivalence classes of ground terms closed under congruence."""
+
+    def __init__(self):
+        #: Term by its ID.
+        self._terms: List[Node] = []
+
+        #: ID by type, value and IDs of the children of the term.
+        self._ids: Dict[tuple, int] = {}
+
+        #: IDs of the children by ID of the term.
+        self._children: List[Tuple[int, ...]] = []
+
+        #: Union-find parent by ID of the term.
+        self._parent: List[int] = []
+
+        #: IDs of the terms which have a term from the class as their child
+        #: (only valid for the roots of the classes).
+        self._uses: List[List[int]] = []
+
+        #: ID of the term by its signature (its type, value and roots of its
+        #: children).
+        self._signatures: Dict[tuple, int] = {}
+
+        #: Representative term and its size by root of the class. (Built
+        #: lazily and dropped whenever classes are merged.)
+        self._representatives: Optional[Dict[int, Tuple[int, Node]]] = None
+
+    def add_equality(self, s: Node, t: Node) -> None:
+        """Asserts that two ground terms are equal."""
+
+        self._merge(self._intern(s), self._intern(t))
+
+    def are_equal(self, s: Node, t: Node) -> bool:
+        """:returns: Whether two ground terms are equal."""
+
+        s, t = self._intern(s), self._intern(t)
+        return self._find(s) == self._find(t)
+
+    def canonicalize(self, node: Node) -> Node:
+        """Replaces all ground terms inside the node with the representatives
+        of their classes.
+
+        Representative of a class is its smallest term, so e.g. with
+        `Julius = Caesar` both constants are replaced with `Caesar`.
+
+        :param node: Term or formula to rewrite.
+        :returns: Rewritten node.
+        """
+
+        return self._canonicalize(node).normalize()
+
+    def _canonicalize(self, node: Node) -> Node:
+        if _is_ground_term(node):
+            id_ = self._intern(node)
+            return self._get_representatives()[self._find(id_)][1]
+
+        children = [self._canonicalize(k) for k in node.children]
+        return node._replace(children=children)
+
+    def __len__(self):
+        return len(self._terms)
+
+    # Union-Find
+    # -------------------------------------------------------------------------
+
+    def _intern(self, node: Node) -> int:
+        children = tuple(self._intern(k) for k in node.children)
+        key = (node.type_, node.value, children)
+
+        try:
+            return self._ids[key]
+        except KeyError:
+            pass
+
+        id_ = len(self._terms)
+        self._ids[key] = id_
+        self._terms.append(node)
+        self._children.append(children)
+        self._parent.append(id_)
+        self._uses.append([])
+        for k in set(self._find(k) for k in children):
+            self._uses[k].append(id_)
+
+        signature = self._signature(id_)
+        other = self._signatures.get(signature)
+        if other is None:
+            self._signatures[signature] = id_
+            if self._representatives is not None:
+                self._representatives[id_] = self._make_representative(id_)
+        else:
+            self._merge(id_, other)  # congruent to a known term
+
+        return id_
+
+    def _find(self, id_: int) -> int:
+        parent = self._parent
+        root = id_
+        while parent[root] != root:
+            root = parent[root]
+        while parent[id_] != root:  # path compression
+            parent[id_], id_ = root, parent[id_]
+        return root
+
+    def _merge(self, a: int, b: int) -> None:
+        pending = [(a, b)]
+        while pending:
+            a, b = pending.pop()
+            a, b = self._find(a), self._find(b)
+            if a == b:
+                continue
+
+            if len(self._uses[a]) < len(self._uses[b]):
+                a, b = b, a
+            self._parent[b] = a
+            self._representatives = None
+
+            for k in self._uses[b]:
+                signature = self._signature(k)
+                other = self._signatures.get(signature)
+                if other is None:
+                    self._signatures[signature] = k
+                elif self._find(other) != self._find(k):
+                    pending.append((k, other))
+
+            self._uses[a].extend(self._uses[b])
+            self._uses[b] = []
+
+    def _signature(self, id_: int) -> tuple:
+        term = self._terms[id_]
+        return (term.type_, term.value,
+                tuple(self._find(k) for k in self._children[id_]))
+
+    # Representatives
+    # -------------------------------------------------------------------------
+
+    def _get_representatives(self) -> Dict[int, Tuple[int, Node]]:
+        if self._representatives is not None:
+            return self._representatives
+
+        # Bellman-Ford style: a term is a candidate once all classes of its
+        # children have a representative.
+        rv: Dict[int, Tuple[int, Node]] = {}
+        changed = True
+        while changed:
+            changed = False
+            for id_ in range(len(self._terms)):
+                try:
+                    candidate = self._make_representative(id_, rv)
+                except KeyError:
+                    continue
+                root = self._find(id_)
+                current = rv.get(root)
+                if current is None or _key(candidate) < _key(current):
+                    rv[root] = candidate
+                    changed = True
+
+        self._representatives = rv
+        return rv
+
+    def _make_representative(self, id_: int,
+                             representatives=None) -> Tuple[int, Node]:
+        if representatives is None:
+            representatives = self._representatives
+
+        children = [representatives[self._find(k)]
+                    for k in self._children[id_]]
+        size = 1 + sum(k[0] for k in children)
+        node = self._terms[id_]._replace(children=[k[1] for k in children])
+        return size, node
+
+
+def is_ground(node: Node) -> bool:
+    """:returns: Whether the node contains no variables."""
+
+    return not node.is_variable() and all(is_ground(k)
+                                          for k in node.children)
+
+
+def _is_ground_term(node: Node) -> bool:
+    return ((node.is_constant() or node.is_function())
+            and all(_is_ground_term(k) for k in node.children))
+
+
+def _key(representative: Tuple[int, Node]) -> tuple:
+    size, node = representative
+    return size, str(node)
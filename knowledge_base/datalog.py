@@ -0,0 +1,583 @@
+"""Bottom-up evaluation of Datalog programs.
+
+Horn clauses without function symbols (e.g. `*x, *y: parent(x, y) =>
+ancestor(x, y)`) always have finitely many ground consequences, so they can be
+materialized without `Node` per derived atom. Constants are interned into
+integer IDs and ground atoms of each predicate are stored column-wise in
+`array('i')` columns (`Relation`).
+
+Rules are evaluated by semi-naive evaluation: Each round joins every rule body
+with at least one literal restricted to the rows added in the previous round
+(the delta), so no join is repeated on rows it has already seen. Literals of
+the body are joined one after another (in order chosen by `planner`) as hash
+joins of the batch of bindings found so far with an index of the relation on
+the already bound columns.
+
+Goal-directed databases don't materialize anything upfront. Instead, the rules
+are rewritten for each query by the magic sets transformation: Bindings of the
+query's constants are propagated (left to right) through the rule bodies into
+"magic" relations, which hold the subgoals that are relevant to the query, and
+every rule is guarded by the magic relation of its head. Bottom-up evaluation
+of the rewritten rules then derives only facts relevant to the query.
+"""
+
+import bisect
+from array import array
+from typing import (
+    Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple,
+    Union,
+)
+
+from knowledge_base import horn, planner, syntax
+
+Node = syntax.Node
+T_Substitution = syntax.T_Substitution
+T_Clause = FrozenSet[Node]
+
+#: Relations are identified by predicate symbol and arity.
+T_RelationKey = Tuple[str, int]
+
+#: Constant ID or variable name.
+T_Argument = Union[int, str]
+
+#: Values of variables (in order of `Bindings.variables`).
+T_Row = Tuple[int, ...]
+
+_ID_BITS = 32
+
+
+class Relation:
+    """Set of ground atoms of a predicate stored in columns of constant IDs.
+
+    Rows are only appended, so the rows added since some point in time are
+    always a contiguous range of row numbers.
+    """
+
+    def __init__(self, arity: int):
+        self.arity = arity
+        self.columns = [array('i') for _ in range(arity)]
+        self._size = 0
+
+        #: Encoded rows (for detecting duplicates).
+        self._rows = set()
+
+        #: Row numbers by values of the columns at the positions, by the
+        #: positions. (Built on first use.)
+        self._indexes: Dict[Tuple[int, ...], Dict[T_Row, array]] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, row: T_Row) -> bool:
+        return _encode(row) in self._rows
+
+    def add(self, row: T_Row) -> bool:
+        """Appends row, unless it is in the relation already.
+
+        :returns: Whether the row was appended.
+        """
+
+        key = _encode(row)
+        if key in self._rows:
+            return False
+
+        self._rows.add(key)
+        for column, k in zip(self.columns, row):
+            column.append(k)
+        for positions, index in self._indexes.items():
+            value = tuple(row[i] for i in positions)
+            index.setdefault(value, array('i')).append(self._size)
+        self._size += 1
+        return True
+
+    def get_row(self, i: int) -> T_Row:
+        return tuple(k[i] for k in self.columns)
+
+    def lookup(self, positions: Tuple[int, ...], value: T_Row,
+               start: int = 0, end: int = None) -> array:
+        """:returns: Numbers of rows in `[start, end)` that have the values
+        at the positions."""
+
+        index = self._indexes.get(positions)
+        if index is None:
+            index = self._indexes[positions] = {}
+            for i in range(self._size):
+                k = tuple(self.columns[j][i] for j in positions)
+                index.setdefault(k, array('i')).append(i)
+
+        rows = index.get(value)
+        if rows is None:
+            return array('i')
+        end = self._size if end is None else end
+        return rows[bisect.bisect_left(rows, start):
+                    bisect.bisect_left(rows, end)]
+
+
+class Atom(NamedTuple):
+    relation: T_RelationKey
+    arguments: Tuple[T_Argument, ...]
+
+
+class Rule(NamedTuple):
+    """Compiled `body[0] & body[1] & ... => head`. (Head is None for
+    integrity constraints.)"""
+
+    head: Optional[Atom]
+    body: List[Atom]
+
+
+class Bindings(NamedTuple):
+    """Batch of bindings of the variables."""
+
+    variables: List[str]
+    rows: List[T_Row]
+
+
+class Database:
+    """Materialization of a Datalog program, which is maintained
+    incrementally as new clauses are added."""
+
+    def __init__(self, goal_directed: bool = False,
+                 statistics: planner.Statistics = None):
+        """
+        :param goal_directed: Whether to derive only facts relevant to each
+            query (by magic sets rewriting of the rules), instead of
+            materializing everything upfront.
+        :param statistics: Statistics to maintain about the relations.
+        """
+
+        self._goal_directed = goal_directed
+        self._statistics = statistics or planner.Statistics()
+
+        #: Interned constants.
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+        self._relations: Dict[T_RelationKey, Relation] = {}
+        self._rules: List[Rule] = []
+
+        #: Number of rows of each relation which were joined with all rules.
+        self._done: Dict[T_RelationKey, int] = {}
+
+        #: Whether an integrity constraint was violated.
+        self._inconsistent = False
+
+        #: Bodies of integrity constraints. (Checked lazily when
+        #: goal-directed.)
+        self._constraints: List[List[Atom]] = []
+        self._consistent: Optional[bool] = None
+
+    def __len__(self) -> int:
+        """:returns: Number of ground atoms."""
+
+        return sum(len(k) for k in self._relations.values())
+
+    def is_complete(self) -> bool:
+        """:returns: Whether all entailed atoms were derived. (Always, as
+        Datalog programs have finite models.)"""
+
+        return True
+
+    def is_consistent(self, check: horn.T_Check = None) -> bool:
+        """:param check: Called during the evaluation of the integrity
+            constraints (if goal-directed)."""
+
+        if not self._goal_directed:
+            return not self._inconsistent
+
+        if self._consistent is None:
+            self._consistent = not any(self._evaluate_magic(k, check).rows
+                                       for k in self._constraints)
+        return self._consistent
+
+    @staticmethod
+    def supports(clauses: Iterable[T_Clause]) -> bool:
+        clauses = list(clauses)
+        return (horn.is_horn(clauses)
+                and all(_is_function_free(_get_atom(x))
+                        for c in clauses for x in c))
+
+    def add_clauses(self, clauses: Iterable[T_Clause]) -> None:
+        """Adds Datalog clauses and updates the materialization.
+
+        :raises ValueError: If the clauses are not supported.
+        """
+
+        clauses = list(clauses)
+        if not self.supports(clauses):
+            raise ValueError("Clauses are not function-free range-restricted "
+                             "Horn clauses")
+
+        for c in clauses:
+            head = next((x for x in c if not x.is_negation()), None)
+            body = [x.children[0] for x in c if x.is_negation()]
+
+            if not body:
+                self._add_row(self._compile(head, intern=True))
+                continue
+
+            rule = Rule(head and self._compile(head, intern=True),
+                        [self._compile(k, intern=True) for k in body])
+            self._rules.append(rule)
+            if head is None:
+                self._constraints.append(rule.body)
+            if self._goal_directed:
+                continue
+
+            # fire the new rule on the rows joined with the other rules
+            ranges = [(0, self._done.get(k.relation, 0)) for k in rule.body]
+            self._fire(rule, self._join(rule.body, ranges))
+
+        self._consistent = None
+        self._run()
+
+    def add_atoms(self, atoms: Iterable[Node]) -> None:
+        """Adds ground atoms without function symbols and updates the
+        materialization. (Cheaper alternative to `add_clauses` for bulk
+        loading of facts.)"""
+
+        for k in atoms:
+            self._add_row(self._compile(k, intern=True))
+        self._run()
+
+    def query(self, f: Node,
+              check: horn.T_Check = None) -> Iterator[T_Substitution]:
+        """Answers conjunctive query.
+
+        :param f: The query. (See `horn.get_query`.)
+        :param check: Called during the evaluation.
+        :returns: Bindings of the query variables that satisfy the query.
+        :raises horn.Unsupported: If the query is not a conjunctive query
+            without function symbols.
+        """
+
+        atoms = horn.get_query(f)
+        if atoms is None or not all(_is_function_free(k) for k in atoms):
+            raise horn.Unsupported("Query is not a conjunction of atoms "
+                                   "without function symbols")
+
+        if not self.is_consistent(check):
+            yield {}
+            return
+
+        body = [self._compile(k) for k in atoms]
+        if None in body:
+            return  # unknown constant
+
+        if self._goal_directed:
+            bindings = self._evaluate_magic(body, check)
+        else:
+            bindings = self._join(body, [(0, None)] * len(body), check)
+        seen = set()
+        for row in bindings.rows:
+            if row not in seen:
+                seen.add(row)
+                yield {k: syntax.make_constant(self._names[v])
+                       for k, v in zip(bindings.variables, row)}
+
+    # Evaluation
+    # -------------------------------------------------------------------------
+
+    def _run(self, check: horn.T_Check = None) -> None:
+        """Semi-naive evaluation of the rules until no new rows are added."""
+
+        if self._goal_directed:
+            return
+
+        while True:
+            end = {k: len(v) for k, v in self._relations.items()}
+            if all(self._done.get(k, 0) == v for k, v in end.items()):
+                return
+
+            for rule in self._rules:
+                for i, atom in enumerate(rule.body):
+                    start = self._done.get(atom.relation, 0)
+                    if start == end.get(atom.relation, 0):
+                        continue  # no delta
+
+                    # Literals before the delta literal are joined with all
+                    # rows and literals after it only with old rows, so that
+                    # no combination of rows is joined twice.
+                    ranges = []
+                    for j, k in enumerate(rule.body):
+                        old = self._done.get(k.relation, 0)
+                        if j < i:
+                            ranges.append((0, end.get(k.relation, 0)))
+                        elif j == i:
+                            ranges.append((old, end.get(k.relation, 0)))
+                        else:
+                            ranges.append((0, old))
+
+                    self._fire(rule, self._join(rule.body, ranges, check))
+
+            self._done = end
+
+    def _fire(self, rule: Rule, bindings: Bindings) -> None:
+        if not bindings.rows:
+            return
+
+        if rule.head is None:
+            self._inconsistent = True
+            return
+
+        slots = {k: i for i, k in enumerate(bindings.variables)}
+        head = [(slots[k], None) if isinstance(k, str) else (None, k)
+                for k in rule.head.arguments]
+        key = rule.head.relation
+        relation = self._get_relation(key)
+        for row in bindings.rows:
+            row = tuple(c if i is None else row[i] for i, c in head)
+            if relation.add(row):
+                self._statistics.add(key, row)
+
+    def _add_row(self, atom: Atom) -> None:
+        if self._get_relation(atom.relation).add(atom.arguments):
+            self._statistics.add(atom.relation, atom.arguments)
+
+    def _evaluate_magic(self, body: List[Atom],
+                        check: Optional[horn.T_Check]) -> Bindings:
+        """Evaluates the conjunction by magic sets rewriting of the rules.
+
+        :returns: Bindings of the variables of the conjunction which satisfy
+            it.
+        """
+
+        variables = []
+        for atom in body:
+            for k in atom.arguments:
+                if isinstance(k, str) and k not in variables:
+                    variables.append(k)
+
+        query = Rule(Atom((_QUERY, len(variables)), tuple(variables)), body)
+        rules, seed, answers = magic_sets(self._rules, query)
+
+        # Evaluate the rewritten rules in a scratch database. Relations of
+        # the facts are shared, the rewritten rules derive only into new
+        # (adorned and magic) relations.
+        scratch = Database(statistics=planner.Statistics(self._statistics))
+        scratch._ids = self._ids
+        scratch._names = self._names
+        scratch._relations = dict(self._relations)
+        scratch._rules = rules
+        scratch._add_row(Atom(seed, ()))
+        scratch._run(check)
+
+        relation = scratch._relations.get(answers)
+        rows = ([relation.get_row(i) for i in range(len(relation))]
+                if relation is not None else [])
+        return Bindings(variables, rows)
+
+    # Joins
+    # -------------------------------------------------------------------------
+
+    def _join(self, body: List[Atom],
+              ranges: List[Tuple[int, Optional[int]]],
+              check: horn.T_Check = None) -> Bindings:
+        """Joins the atoms, each with the rows of its relation in the range.
+
+        :param check: Called before joining each atom.
+        :returns: Bindings of the variables which satisfy all atoms.
+        """
+
+        cardinalities = []
+        for atom, (start, end) in zip(body, ranges):
+            relation = self._relations.get(atom.relation)
+            size = len(relation) if relation is not None else 0
+            cardinalities.append((size if end is None else end) - start)
+
+        steps = planner.plan(
+            [(k.relation, [frozenset([x] if isinstance(x, str) else ())
+                           for x in k.arguments])
+             for k in body],
+            self._statistics,
+            cardinalities=cardinalities)
+
+        bindings = Bindings([], [()])
+        for step in steps:
+            if check is not None:
+                check()
+            bindings = self._join_atom(bindings, body[step.index],
+                                       *ranges[step.index])
+            if not bindings.rows:
+                break
+        return bindings
+
+    def _join_atom(self, bindings: Bindings, atom: Atom,
+                   start: int, end: Optional[int]) -> Bindings:
+        relation = self._relations.get(atom.relation)
+        if relation is None:
+            return Bindings(bindings.variables, [])
+
+        end = len(relation) if end is None else end
+        slots = {k: i for i, k in enumerate(bindings.variables)}
+
+        positions = []  # of bound arguments
+        keys = []  # slots of bound variables or constants
+        new = {}  # positions of first occurrences of new variables
+        checks = []  # repeated new variables
+        for i, k in enumerate(atom.arguments):
+            if not isinstance(k, str):
+                positions.append(i)
+                keys.append((None, k))
+            elif k in slots:
+                positions.append(i)
+                keys.append((slots[k], None))
+            elif k in new:
+                checks.append((i, new[k]))
+            else:
+                new[k] = i
+
+        positions = tuple(positions)
+        columns = [relation.columns[i] for i in new.values()]
+        rows = []
+        for row in bindings.rows:
+            if positions:
+                value = tuple(c if j is None else row[j] for j, c in keys)
+                candidates = relation.lookup(positions, value, start, end)
+            else:
+                candidates = range(start, end)
+
+            for r in candidates:
+                if any(relation.columns[i][r] != relation.columns[j][r]
+                       for i, j in checks):
+                    continue
+                rows.append(row + tuple(k[r] for k in columns))
+
+        return Bindings([*bindings.variables, *new], rows)
+
+    # Helpers
+    # -------------------------------------------------------------------------
+
+    def _get_relation(self, key: T_RelationKey) -> Relation:
+        relation = self._relations.get(key)
+        if relation is None:
+            relation = self._relations[key] = Relation(key[1])
+        return relation
+
+    def _compile(self, atom: Node, intern: bool = False) -> Optional[Atom]:
+        """:returns: Atom with constants replaced by their IDs. (None, if
+        some constant is not interned and `intern` is False.)"""
+
+        arguments = []
+        for k in atom.children:
+            if k.is_variable():
+                arguments.append(k.value)
+                continue
+
+            i = self._ids.get(k.value)
+            if i is None:
+                if not intern:
+                    return None
+                i = self._ids[k.value] = len(self._names)
+                self._names.append(k.value)
+            arguments.append(i)
+
+        return Atom((atom.value, len(arguments)), tuple(arguments))
+
+
+# Magic Sets
+# -----------------------------------------------------------------------------
+
+_QUERY = '_query'
+
+
+def magic_sets(rules: List[Rule],
+               query: Rule) -> Tuple[List[Rule], T_RelationKey,
+                                     T_RelationKey]:
+    """Rewrites the rules, so that their bottom-up evaluation derives only
+    facts relevant to the query.
+
+    Every relation derived by the rules is specialized by adornment (which of
+    its arguments are bound when it is used as a subgoal) and guarded by its
+    magic relation of the bound arguments. The adornments are propagated by
+    the left-to-right sideways information passing.
+
+    :param query: Rule whose head collects the answers to the query. (Its
+        arguments are unbound.)
+    :returns: The rewritten rules, magic relation that has to be seeded by
+        the empty row and relation of the answers.
+    """
+
+    derived = {k.head.relation for k in rules if k.head is not None}
+    by_head: Dict[T_RelationKey, List[Rule]] = {}
+    for k in [*rules, query]:
+        if k.head is not None:
+            by_head.setdefault(k.head.relation, []).append(k)
+
+    rv = []
+    start = (query.head.relation, 'f' * len(query.head.arguments))
+    pending = [start]
+    seen = {start}
+
+    while pending:
+        relation, adornment = pending.pop()
+
+        # facts of the derived relation
+        head = Atom(_adorn(relation, adornment),
+                    tuple(f'x{i}' for i in range(relation[1])))
+        guard = _magic_atom(relation, adornment, head.arguments)
+        rv.append(Rule(head, [guard, Atom(relation, head.arguments)]))
+
+        for rule in by_head.get(relation, []):
+            guard = _magic_atom(relation, adornment, rule.head.arguments)
+            bound = {k for k in guard.arguments if isinstance(k, str)}
+            body = [guard]
+
+            for atom in rule.body:
+                if atom.relation not in derived:
+                    body.append(atom)
+                else:
+                    a = ''.join('b' if not isinstance(x, str) or x in bound
+                                else 'f'
+                                for x in atom.arguments)
+                    if (atom.relation, a) not in seen:
+                        seen.add((atom.relation, a))
+                        pending.append((atom.relation, a))
+
+                    # magic rule propagating the bindings into the subgoal
+                    rv.append(Rule(_magic_atom(atom.relation, a,
+                                               atom.arguments),
+                                   list(body)))
+                    body.append(Atom(_adorn(atom.relation, a),
+                                     atom.arguments))
+
+                bound.update(k for k in atom.arguments if isinstance(k, str))
+
+            rv.append(Rule(Atom(_adorn(relation, adornment),
+                                rule.head.arguments),
+                           body))
+
+    return rv, _magic_atom(*start, ()).relation, _adorn(*start)
+
+
+def _adorn(relation: T_RelationKey, adornment: str) -> T_RelationKey:
+    return f'{relation[0]}^{adornment}', relation[1]
+
+
+def _magic_atom(relation: T_RelationKey, adornment: str,
+                arguments: Tuple[T_Argument, ...]) -> Atom:
+    """:returns: Atom of the magic relation with the bound arguments."""
+
+    bound = tuple(k for k, a in zip(arguments, adornment) if a == 'b')
+    return Atom((f'_magic_{relation[0]}^{adornment}', adornment.count('b')),
+                bound)
+
+
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _get_atom(x: Node) -> Node:
+    return x.children[0] if x.is_negation() else x
+
+
+def _is_function_free(atom: Node) -> bool:
+    return all(k.is_constant() or k.is_variable() for k in atom.children)
+
+
+def _encode(row: T_Row) -> int:
+    """:returns: Row packed into single integer (smaller than tuple)."""
+
+    rv = 0
+    for k in row:
+        rv = (rv << _ID_BITS) | k
+    return rv
@@ -0,0 +1,559 @@
+"""Forward and backward chaining over Horn clauses.
+
+`ForwardChainer` materializes Horn clauses of a knowledge base (rules like
+`*x: man(x) => person(x)` and ground facts) into all ground atoms they entail.
+Each new atom is put on an agenda and, once taken from it, triggers only rules
+that have a literal with its predicate in their body. The rest of the body is
+joined against atoms indexed by predicate and argument values (in order
+chosen by `planner`). Queries which are conjunctions of atoms (e.g. `?x:
+hate(x, Caesar)`) are then answered by lookups into the materialized atoms.
+
+`BackwardChainer` answers the same queries goal-first by SLD resolution, so
+only rules relevant to the query are touched. Answers to each subgoal are
+tabled (memoized by the subgoal up to variable renaming), which prevents
+infinite loops on recursive rules and recomputation of the same subgoals.
+Recursive subgoals consume the answers tabled so far, and the evaluation is
+iterated until no table grows.
+"""
+
+from typing import (
+    Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional,
+    Tuple,
+)
+
+from knowledge_base import common, congruence, planner, syntax, unification
+
+Node = syntax.Node
+T_Substitution = syntax.T_Substitution
+T_Clause = FrozenSet[Node]
+
+#: Called regularly by the evaluation of queries, it stops the evaluation by
+#: raising (e.g. when limits of the search are exceeded).
+T_Check = Callable[[], None]
+
+
+class Unsupported(common.KnowledgeBaseError):
+    pass
+
+
+class Rule(NamedTuple):
+    """Definite clause `body[0] & body[1] & ... => head`. (Head is None for
+    clauses without positive literal, i.e. integrity constraints.)"""
+
+    head: Optional[Node]
+    body: List[Node]
+
+
+def is_horn(clauses: Iterable[T_Clause],
+            range_restricted: bool = True) -> bool:
+    """:returns: Whether the clauses are Horn clauses without equalities.
+
+    :param range_restricted: Whether variables of positive literals have to
+        appear in negative literals as well. (Otherwise the clauses entail
+        non-ground atoms and can't be materialized.)
+    """
+
+    for c in clauses:
+        positive = [x for x in c if not x.is_negation()]
+        if len(positive) > 1:
+            return False
+        if any(_get_atom(x).is_equality() for x in c):
+            return False
+        if positive and range_restricted:
+            body = set()
+            for x in c:
+                if x.is_negation():
+                    body.update(_variables(x))
+            if not _variables(positive[0]) <= body:
+                return False
+    return True
+
+
+def get_query(f: Node) -> Optional[List[Node]]:
+    """:returns: Atoms of the formula, if it is an (existentially quantified)
+    conjunction of atoms."""
+
+    while (f.is_quantified()
+           and f.get_quantifier_type() == syntax.EXISTENTIAL_QUANTIFIER):
+        f = f.children[0]
+
+    atoms = f.children if f.is_conjunction() else [f]
+    if all(k.is_atom() and not k.is_equality() for k in atoms):
+        return atoms
+    else:
+        return None
+
+
+class ForwardChainer:
+    """Materialization of Horn clauses, which is maintained incrementally as
+    new clauses are added."""
+
+    def __init__(self, max_depth: int = 8,
+                 max_work: Optional[int] = 100000,
+                 statistics: planner.Statistics = None):
+        """
+        :param max_depth: Maximum depth of terms in derived atoms. (Rules
+            with function symbols might derive infinitely many atoms.)
+        :param max_work: Maximum total size (number of nodes) of the atoms
+            derived by rules with function symbols in their heads. (Even
+            atoms of bounded depth might be too many, e.g. of `*x, *y: p(x) &
+            p(y) => p(F(x, y))`. Function-free rules derive only atoms of
+            the known constants, thus they are not limited.) None for no
+            limit.
+        :param statistics: Statistics to maintain about the materialized
+            atoms.
+        """
+
+        self._max_depth = max_depth
+        self._max_work = max_work
+        self._work = 0
+        self._statistics = statistics or planner.Statistics()
+
+        #: Rules by predicate symbols in their bodies (with position of the
+        #: literal in the body).
+        self._triggers: Dict[str, List[Tuple[Rule, int]]] = {}
+
+        #: Materialized atoms.
+        self._atoms: Dict[tuple, Node] = {}
+
+        #: Atoms by predicate symbol.
+        self._by_predicate: Dict[str, List[Node]] = {}
+
+        #: Atoms by predicate symbol, argument position and argument.
+        self._by_argument: Dict[tuple, List[Node]] = {}
+
+        self._agenda: List[Node] = []
+
+        #: Whether some atoms were not derived due to `max_depth`.
+        self._truncated = False
+
+        #: Whether an integrity constraint was violated.
+        self._inconsistent = False
+
+    @property
+    def atoms(self) -> List[Node]:
+        return list(self._atoms.values())
+
+    def is_complete(self) -> bool:
+        """:returns: Whether all entailed atoms were derived."""
+
+        return not self._truncated
+
+    def is_consistent(self) -> bool:
+        return not self._inconsistent
+
+    @staticmethod
+    def supports(clauses: Iterable[T_Clause]) -> bool:
+        return is_horn(clauses)
+
+    def add_clauses(self, clauses: Iterable[T_Clause]) -> None:
+        """Adds Horn clauses and updates the materialization.
+
+        :raises ValueError: If the clauses are not supported.
+        :raises Unsupported: If the materialization exceeds `max_work`.
+            (It's left incomplete, thus the chainer shouldn't be used
+            anymore.)
+        """
+
+        clauses = list(clauses)
+        if not self.supports(clauses):
+            raise ValueError("Clauses are not range-restricted Horn clauses")
+
+        for c in clauses:
+            head = next((x for x in c if not x.is_negation()), None)
+            body = [x.children[0] for x in c if x.is_negation()]
+
+            if not body:
+                self._add_atom(head)
+                continue
+
+            rule = Rule(head, body)
+            for i, k in enumerate(body):
+                self._triggers.setdefault(k.value, []).append((rule, i))
+
+            # fire the new rule on the atoms derived so far
+            for subst in self._join(body, {}):
+                self._fire(rule, subst)
+
+        self._run()
+
+    def query(self, f: Node,
+              check: T_Check = None) -> Iterator[T_Substitution]:
+        """Answers conjunctive query.
+
+        :param f: The query. (See `get_query`.)
+        :param check: Called during the evaluation.
+        :returns: Bindings of the query variables that satisfy the query.
+        :raises Unsupported: If the query is not a conjunctive query.
+        """
+
+        atoms = get_query(f)
+        if atoms is None:
+            raise Unsupported("Query is not a conjunction of atoms")
+
+        if self._inconsistent:
+            yield {}
+            return
+
+        seen = set()
+        for subst in self._join(atoms, {}, check):
+            key = frozenset(subst.items())
+            if key not in seen:
+                seen.add(key)
+                yield subst
+
+    # Materialization
+    # -------------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while self._agenda:
+            atom = self._agenda.pop()
+            for rule, i in self._triggers.get(atom.value, []):
+                try:
+                    subst = unification.match(rule.body[i], atom)
+                except unification.NotUnifiable:
+                    continue
+                rest = [*rule.body[:i], *rule.body[i + 1:]]
+                for k in self._join(rest, subst):
+                    self._fire(rule, k)
+
+    def _fire(self, rule: Rule, subst: T_Substitution) -> None:
+        if rule.head is None:
+            self._inconsistent = True
+            return
+
+        atom = rule.head.apply(subst)
+        if (self._max_work is not None
+                and any(k.is_function() for k in rule.head.children)):
+            self._work += _size(atom)
+            if self._work > self._max_work:
+                raise Unsupported("Materialization exceeded 'max_work'")
+        self._add_atom(atom)
+
+    def _add_atom(self, atom: Node) -> None:
+        key = _key(atom)
+        if key in self._atoms:
+            return
+
+        if _depth(atom) > self._max_depth:
+            self._truncated = True
+            return
+
+        self._atoms[key] = atom
+        self._by_predicate.setdefault(atom.value, []).append(atom)
+        arguments = key[1:]
+        for i, k in enumerate(arguments):
+            index = (atom.value, i, k)
+            self._by_argument.setdefault(index, []).append(atom)
+        self._statistics.add(atom.value, arguments)
+        self._agenda.append(atom)
+
+    # Joins
+    # -------------------------------------------------------------------------
+
+    def _join(self, atoms: List[Node],
+              subst: T_Substitution,
+              check: T_Check = None) -> Iterator[T_Substitution]:
+        """Yields substitutions which make all `atoms` materialized."""
+
+        steps = planner.plan(
+            [(k.value, [frozenset(_variables(x)) for x in k.children])
+             for k in atoms],
+            self._statistics,
+            bound=subst)
+        yield from self._join_steps(atoms, steps, subst, check)
+
+    def _join_steps(self, atoms: List[Node], steps: List[planner.Step],
+                    subst: T_Substitution,
+                    check: Optional[T_Check]) -> Iterator[T_Substitution]:
+        if not steps:
+            yield subst
+            return
+
+        step, *rest = steps
+        pattern = atoms[step.index]
+        for atom in self._lookup(pattern, subst, step.positions):
+            if check is not None:
+                check()
+            try:
+                k = unification.match(pattern, atom, subst)
+            except unification.NotUnifiable:
+                continue
+            yield from self._join_steps(atoms, rest, k, check)
+
+    def _lookup(self, pattern: Node, subst: T_Substitution,
+                positions: Tuple[int, ...]) -> List[Node]:
+        """:returns: Candidate atoms which might match the pattern.
+
+        :param positions: Positions of arguments bound by the substitution.
+        """
+
+        if positions:
+            i = positions[0]
+            k = pattern.children[i]
+            k = subst[k.value] if k.is_variable() else k.apply(subst)
+            return self._by_argument.get((pattern.value, i, _key(k)), [])
+
+        return self._by_predicate.get(pattern.value, [])
+
+
+class BackwardChainer:
+    """Tabled SLD resolution over Horn clauses."""
+
+    def __init__(self, max_depth: int = 8):
+        """
+        :param max_depth: Maximum depth of terms in answers. (Rules with
+            function symbols might have infinitely many answers.)
+        """
+
+        self._max_depth = max_depth
+
+        #: Rules and non-ground facts by predicate symbol of their heads.
+        self._rules: Dict[str, List[Rule]] = {}
+
+        #: Ground facts by predicate symbol.
+        self._by_predicate: Dict[str, List[Node]] = {}
+
+        #: Ground facts by predicate symbol, argument position and argument.
+        self._by_argument: Dict[tuple, List[Node]] = {}
+
+        #: Bodies of integrity constraints.
+        self._constraints: List[List[Node]] = []
+
+        #: Answers by subgoal (up to variable renaming).
+        self._tables: Dict[tuple, _Table] = {}
+        self._iteration = 0
+        self._changed = False
+        self._renamed = 0
+        self._check: Optional[T_Check] = None  # (of the running evaluation)
+
+        #: Whether some answers were dropped due to `max_depth`.
+        self._truncated = False
+
+        self._consistent: Optional[bool] = None
+
+    def is_complete(self) -> bool:
+        """:returns: Whether all answers to the queries so far were found."""
+
+        return not self._truncated
+
+    @staticmethod
+    def supports(clauses: Iterable[T_Clause]) -> bool:
+        return is_horn(clauses, range_restricted=False)
+
+    def add_clauses(self, clauses: Iterable[T_Clause]) -> None:
+        """Adds Horn clauses.
+
+        :raises ValueError: If the clauses are not supported.
+        """
+
+        clauses = list(clauses)
+        if not self.supports(clauses):
+            raise ValueError("Clauses are not Horn clauses")
+
+        for c in clauses:
+            head = next((x for x in c if not x.is_negation()), None)
+            body = [x.children[0] for x in c if x.is_negation()]
+
+            if head is None:
+                self._constraints.append(body)
+            elif not body and congruence.is_ground(head):
+                self._by_predicate.setdefault(head.value, []).append(head)
+                for i, k in enumerate(head.children):
+                    index = (head.value, i, _key(k))
+                    self._by_argument.setdefault(index, []).append(head)
+            else:
+                self._rules.setdefault(head.value, []).append(Rule(head, body))
+
+        # answers might have changed
+        self._tables = {}
+        self._truncated = False
+        self._consistent = None
+
+    def query(self, f: Node,
+              check: T_Check = None) -> Iterator[T_Substitution]:
+        """Answers conjunctive query.
+
+        :param f: The query. (See `get_query`.)
+        :param check: Called during the evaluation. (Tables evaluated so far
+            are kept if it raises.)
+        :returns: Bindings of the query variables that satisfy the query.
+        :raises Unsupported: If the query is not a conjunctive query.
+        """
+
+        atoms = get_query(f)
+        if atoms is None:
+            raise Unsupported("Query is not a conjunction of atoms")
+
+        if not self._is_consistent(check):
+            yield {}
+            return
+
+        variables = set()
+        for k in atoms:
+            variables.update(_variables(k))
+
+        seen = set()
+        for subst in self._evaluate(atoms, check):
+            subst = {k: v for k, v in subst.items() if k in variables}
+            key = frozenset(subst.items())
+            if key not in seen:
+                seen.add(key)
+                yield subst
+
+    def _is_consistent(self, check: Optional[T_Check]) -> bool:
+        if self._consistent is None:
+            self._consistent = not any(self._evaluate(k, check)
+                                       for k in self._constraints)
+        return self._consistent
+
+    # Evaluation
+    # -------------------------------------------------------------------------
+
+    def _evaluate(self, atoms: List[Node],
+                  check: Optional[T_Check]) -> List[T_Substitution]:
+        """Evaluates the conjunction until the tables reach a fixpoint."""
+
+        self._check = check
+        try:
+            while True:
+                self._iteration += 1
+                self._changed = False
+                rv = list(self._solve_body(atoms, {}))
+                if not self._changed:
+                    break
+        finally:
+            self._check = None
+
+        for k in self._tables.values():
+            k.complete = True
+        return rv
+
+    def _solve_body(self, body: List[Node],
+                    subst: T_Substitution) -> Iterator[T_Substitution]:
+        if not body:
+            yield subst
+            return
+
+        first = body[0].apply(subst)
+        for answer in self._solve(first):
+            if self._check is not None:
+                self._check()
+            answer, = self._rename(answer)
+            try:
+                k = unification.unify(first, answer)
+            except unification.NotUnifiable:
+                continue
+            yield from self._solve_body(body[1:],
+                                        unification.compose(subst, k))
+
+    def _solve(self, atom: Node) -> List[Node]:
+        """:returns: Answers (instances of the atom) tabled so far."""
+
+        key = _variant_key(atom)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = _Table()
+            self._changed = True
+
+        if table.complete or table.iteration == self._iteration:
+            return list(table.answers)  # (possibly incomplete) answers
+        table.iteration = self._iteration
+
+        for fact in self._lookup(atom):
+            try:
+                subst = unification.unify(atom, fact)
+            except unification.NotUnifiable:
+                continue
+            self._add_answer(table, atom.apply(subst))
+
+        for rule in self._rules.get(atom.value, []):
+            head, *body = self._rename(rule.head, *rule.body)
+            try:
+                subst = unification.unify(atom, head)
+            except unification.NotUnifiable:
+                continue
+            for k in self._solve_body(body, subst):
+                self._add_answer(table, atom.apply(k))
+
+        return list(table.answers)
+
+    def _add_answer(self, table: '_Table', answer: Node) -> None:
+        if _depth(answer) > self._max_depth:
+            self._truncated = True
+            return
+
+        key = _variant_key(answer)
+        if key not in table.keys:
+            table.keys.add(key)
+            table.answers.append(answer)
+            self._changed = True
+
+    def _lookup(self, atom: Node) -> List[Node]:
+        for i, k in enumerate(atom.children):
+            if congruence.is_ground(k):
+                return self._by_argument.get((atom.value, i, _key(k)), [])
+        return self._by_predicate.get(atom.value, [])
+
+    def _rename(self, *nodes: Node) -> List[Node]:
+        """Renames variables apart from the variables of the goals."""
+
+        names = set()
+        for k in nodes:
+            names.update(_variables(k))
+        if not names:
+            return list(nodes)
+
+        self._renamed += 1
+        subst = {k: syntax.make_variable(f'{k}#{self._renamed}')
+                 for k in names}
+        return [k.apply(subst) for k in nodes]
+
+
+class _Table:
+    def __init__(self):
+        self.answers: List[Node] = []
+        self.keys = set()
+        self.iteration = 0
+        self.complete = False
+
+
+def _get_atom(x: Node) -> Node:
+    return x.children[0] if x.is_negation() else x
+
+
+def _variables(node: Node) -> set:
+    if node.is_variable():
+        return {node.value}
+    rv = set()
+    for k in node.children:
+        rv.update(_variables(k))
+    return rv
+
+
+def _key(node: Node) -> tuple:
+    """Cheaper alternative to `hash(node)` for terms and atoms."""
+
+    return (node.value, *(_key(k) for k in node.children))
+
+
+def _variant_key(node: Node) -> tuple:
+    """Same as `_key`, but with variables numbered in order of their first
+    occurrence."""
+
+    names = {}
+
+    def key(k: Node) -> tuple:
+        if k.is_variable():
+            return (names.setdefault(k.value, len(names)),)
+        return (k.value, *(key(j) for j in k.children))
+
+    return key(node)
+
+
+def _depth(node: Node) -> int:
+    return 1 + max((_depth(k) for k in node.children), default=0)
+
+
+def _size(node: Node) -> int:
+    return 1 + sum(_size(k) for k in node.children)
@@ -1,8 +1,51 @@
+"""Inference by resolution and paramodulation.
+
+Clauses are saturated by the given-clause loop: Clauses wait in the passive
+set, and each clause taken from it (the given clause) is resolved and
+paramodulated with every clause in the active set, before it's moved there as
+well. Which clause is taken next, and whether clauses derived only from the
+premises are combined, is configured by `Strategy`.
+
+Inferences between the given clause and the active set can be generated by
+worker processes. Each worker holds part of the active set, the given clause
+is sent to all of them, and their inferences are collected back in the same
+order as if they were generated by a single process. Selection of the given
+clause and bookkeeping of the derived clauses stays in the main process.
+
+Several conclusions can be decided by a single saturation. Every clause is
+tagged by the conclusions whose negations it was derived from. Clauses derived
+only from the premises are thus shared by all conclusions, while clauses of
+different conclusions are never combined. Empty clause tagged by a conclusion
+proves it, untagged empty clause proves all of them.
+
+The saturation might never end (e.g. when Skolem functions make the Herbrand
+universe infinite), so it can be bounded by `Limits`. Results of the search are
+three-valued: proved, disproved (the clauses were saturated without a proof)
+or unknown (the search ran out of resources). The search can be also cancelled
+from another thread, which is checked at the same points as the limits.
+
+Events of the given-clause loop (e.g. generated, kept and given clauses) are
+reported to `Observer`s, such as `LoggingObserver`. Timeline of the search
+(selection of the given clauses and their iterations) is recorded by
+`tracing.trace`.
+"""
+
+import array
+import heapq
 import itertools
 import logging
-from typing import List, Optional, Set, Tuple
+import multiprocessing
+import threading
+import time
+import tracemalloc
+from typing import (
+    Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple,
+    Optional, Sequence, Set, Tuple, Union,
+)
 
-from knowledge_base import common, syntax, unification
+from knowledge_base import (
+    common, congruence, sat, syntax, tracing, unification, utils,
+)
 
 T_Substitution = syntax.T_Substitution
 Node = syntax.Node
@@ -14,7 +57,292 @@ class _NotInferable(common.KnowledgeBaseError):
     pass
 
 
-def infer(premises: List[Node], conclusion: Node) -> Optional[T_Substitution]:
+class ResourceExhausted(common.KnowledgeBaseError):
+    pass
+
+
+class Cancelled(common.KnowledgeBaseError):
+    pass
+
+
+# Statuses of results
+PROVED = 'Proved'
+DISPROVED = 'Disproved'
+UNKNOWN = 'Unknown'
+
+# Rule of input clauses (i.e. of clauses without parents)
+INPUT = 'input'
+
+
+class Limits(NamedTuple):
+    #: Wall-clock seconds.
+    timeout: Optional[float] = None
+
+    #: Maximum number of inferences.
+    max_generated: Optional[int] = None
+
+    #: Maximum number of kept (active and passive) clauses.
+    max_kept: Optional[int] = None
+
+    #: Maximum number of bytes allocated during the search (as traced by
+    #: `tracemalloc`).
+    max_memory: Optional[int] = None
+
+
+NO_LIMITS = Limits()
+
+
+class Statistics:
+    """Statistics of a search."""
+
+    def __init__(self):
+        #: Number of clauses selected as the given clause.
+        self.given = 0
+
+        #: Number of inferences.
+        self.generated = 0
+
+        #: Number of kept (i.e. not redundant) clauses.
+        self.kept = 0
+
+        #: Number of generated clauses subsumed by kept ones (i.e. their
+        #: duplicates derived from the same or fewer conclusions).
+        self.subsumed = 0
+
+        #: Number of kept clauses deleted before they were given, because
+        #: their conclusions were decided already.
+        self.deleted = 0
+
+        #: Number of inferences by each rule.
+        self.inferences: Dict[str, int] = {
+            'resolve': 0,
+            'resolve_reflexivity': 0,
+            'paramodulate': 0,
+        }
+
+        #: Number of attempted and failed unifications.
+        self.unifications = 0
+        self.unification_failures = 0
+
+        #: Seconds spent by conversion into clauses, unification, and
+        #: indexing of the kept clauses (into the passive set and the index
+        #: of duplicates).
+        self.cnf_time = 0.0
+        self.unification_time = 0.0
+        self.indexing_time = 0.0
+
+        #: Wall-clock seconds.
+        self.elapsed = 0.0
+
+        #: Name of the limit which stopped the search (if any).
+        self.exhausted: Optional[str] = None
+
+        #: Peak number of bytes allocated during the search (None if
+        #: `tracemalloc` is not tracing).
+        self.peak_memory: Optional[int] = None
+
+        #: Number of bytes taken by the clauses, indexes (of the passive set
+        #: and of duplicates), substitutions and parse trees at the end of
+        #: the search (empty if `tracemalloc` is not tracing).
+        self.memory: Dict[str, int] = {}
+
+    def __repr__(self):
+        args = ", ".join(f"{k}={v!r}" for k, v in vars(self).items())
+        return f"{type(self).__name__}({args})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(vars(self), inferences=dict(self.inferences),
+                    memory=dict(self.memory))
+
+    def merge(self, other: 'Statistics') -> None:
+        """Adds unification counters of the other statistics (e.g. of a
+        worker process)."""
+
+        self.unifications += other.unifications
+        self.unification_failures += other.unification_failures
+        self.unification_time += other.unification_time
+
+
+class Observer:
+    """Receives events of the given-clause loop. (Each method does nothing
+    by default.)
+
+    Clauses are identified by their sequence numbers within the search.
+    """
+
+    def on_clause_generated(self, clause_id: int,
+                            parent_ids: Tuple[int, ...],
+                            rule: str,
+                            literals: FrozenSet[Node]) -> None:
+        """Called for each input clause (without parents, rule is INPUT)
+        and for each inference."""
+
+    def on_clause_kept(self, clause_id: int) -> None:
+        """Called when the clause is added into the passive set."""
+
+    def on_subsumed(self, clause_id: int) -> None:
+        """Called when the clause is discarded as redundant."""
+
+    def on_clause_deleted(self, clause_id: int) -> None:
+        """Called when passive clause is discarded, because its conclusion
+        was decided already."""
+
+    def on_given(self, clause_id: int) -> None:
+        """Called when the clause is selected as the given clause."""
+
+    def on_proof_found(self, clause_id: int, goals: FrozenSet[int]) -> None:
+        """Called when the empty clause refutes the conclusions (their
+        positions)."""
+
+
+class LoggingObserver(Observer):
+    """Logs the inferences on debug level."""
+
+    def __init__(self, log: logging.Logger = _log):
+        self._log = log
+
+    def on_clause_generated(self, clause_id: int,
+                            parent_ids: Tuple[int, ...],
+                            rule: str,
+                            literals: FrozenSet[Node]) -> None:
+        if not self._log.isEnabledFor(logging.DEBUG):
+            return  # (formatting of each clause is expensive)
+
+        clause = _str_clause(literals, {}) if literals else '■'
+        if parent_ids:
+            rule += " " + ", ".join(str(k) for k in parent_ids)
+        self._log.debug(f"[{clause_id}] {clause} ({rule})")
+
+    def on_proof_found(self, clause_id: int, goals: FrozenSet[int]) -> None:
+        self._log.debug(f"[{clause_id}] refutes {sorted(goals)}")
+
+
+class Result(NamedTuple):
+    #: PROVED, DISPROVED or UNKNOWN.
+    status: str
+
+    #: Bindings of the variables of the conclusion (if proved).
+    substitution: Optional[T_Substitution]
+
+    statistics: Statistics
+
+    #: Derivation of the empty clause (if proved by the saturation).
+    proof: Optional['Proof'] = None
+
+
+class Step(NamedTuple):
+    """Clause of a proof."""
+
+    #: Sequence number of the clause within the search.
+    id: int
+
+    #: INPUT or name of the inference rule (e.g. 'resolve').
+    rule: str
+
+    #: Ids of the premises of the inference.
+    parents: Tuple[int, ...]
+
+    literals: FrozenSet[Node]
+
+    #: Positions of the conclusions the clause is derived from. (Empty if
+    #: it is derived from the premises alone.)
+    goals: FrozenSet[int]
+
+
+class Proof:
+    """Derivation of the empty clause (i.e. of a clause of just the answer
+    literals) from the input clauses."""
+
+    def __init__(self, steps: List[Step]):
+        #: Steps in order of the derivation. (The last one is the empty
+        #: clause.)
+        self.steps = steps
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.steps!r})"
+
+    def get_lemmas(self) -> List[FrozenSet[Node]]:
+        """:returns: Clauses inferred from the premises alone (i.e. entailed
+        by them)."""
+
+        return [k.literals for k in self.steps
+                if k.rule != INPUT and not k.goals and k.literals]
+
+    def __str__(self):
+        rv = []
+        for k in self.steps:
+            clause = _str_clause(k.literals, {}) if k.literals else '■'
+            rule = k.rule
+            if k.parents:
+                rule += " " + ", ".join(str(j) for j in k.parents)
+            rv.append(f"[{k.id}] {clause} ({rule})")
+        return "\n".join(rv)
+
+
+class Strategy(NamedTuple):
+    name: str = 'default'
+
+    #: How to weigh passive clauses (the lightest one is given next): By
+    #: number of their 'literals', number of their 'symbols', or by 'age'.
+    weight: str = 'literals'
+
+    #: Every n-th given clause is the oldest one instead of the lightest one.
+    #: (0 to never pick by age.)
+    age_ratio: int = 0
+
+    #: Whether to combine only clauses where at least one of them is derived
+    #: from the negated conclusion. (Incomplete, if the premises are
+    #: inconsistent.)
+    set_of_support: bool = False
+
+
+DEFAULT_STRATEGY = Strategy()
+
+#: Strategies which complement each other.
+PORTFOLIO = [
+    DEFAULT_STRATEGY,
+    Strategy('symbols', weight='symbols', age_ratio=5),
+    Strategy('breadth-first', weight='age'),
+    Strategy('set-of-support', set_of_support=True),
+]
+
+
+class _Clause(NamedTuple):
+    literals: FrozenSet[Node]
+
+    #: Conclusions whose negations the clause was derived from.
+    goals: FrozenSet[int]
+
+    #: Sequence number of the clause within the search. (See `Observer`.)
+    id: int = 0
+
+
+class Premises(NamedTuple):
+    """Clausified premises. (Can be reused by several inferences.)"""
+
+    formulas: List[Node]
+    clauses: List[FrozenSet[Node]]
+
+    #: Maps variables of the clauses into the formulas.
+    subst: T_Substitution
+
+
+def add_premises(premises: Premises, formulas: List[Node]) -> Premises:
+    """:returns: The premises together with the formulas (which are
+    clausified, unlike the premises)."""
+
+    rv = clausify(formulas)
+    # (variables of the clauses are unique, thus the substitutions are
+    # disjoint)
+    return Premises([*premises.formulas, *rv.formulas],
+                    [*premises.clauses, *rv.clauses],
+                    {**premises.subst, **rv.subst})
+
+
+def clausify(premises: List[Node],
+             check: Callable[[], None] = None) -> Premises:
+    """:param check: Called before each premise (e.g. `Budget.check`)."""
+
     # break down the expressions into disjunctions
 
     _log.debug(" CNF ".center(80, "="))
@@ -22,75 +350,771 @@ def infer(premises: List[Node], conclusion: Node) -> Optional[T_Substitution]:
     clauses = []
     input_subst = {}  # to map intermediary results into original input
 
-    for k in (*premises, conclusion.negate()):
-        if not k.is_formula():
-            raise ValueError(f"'{k}' is not a well-formed formula")
+    for k in premises:
+        if check is not None:
+            check()
+        c, subst = _clausify(k)
+        clauses.extend(c)
+        input_subst = unification.compose(input_subst, subst)
 
-        f, subst = k.to_cnf()
-        c = f.to_clause_form()
+    return Premises(list(premises), clauses, input_subst)
 
-        _log.debug(f"{k} -> {set(_str_clause(j, subst) for j in c)}")
 
-        clauses.extend(c)
-        input_subst = unification.compose(input_subst, subst)
+def infer(premises: Union[List[Node], Premises],
+          conclusion: Node,
+          strategy: Strategy = DEFAULT_STRATEGY,
+          workers: int = 0,
+          limits: Limits = NO_LIMITS,
+          cancel: threading.Event = None,
+          observers: Sequence['Observer'] = ()) -> Optional[T_Substitution]:
+    """:returns: Substitution for variables of the conclusion, if it is
+    entailed by the premises. (See `search`.)"""
 
-    clauses = frozenset(clauses)
-    conclusion_subst = subst  # to map query result into original input
+    return search(premises, conclusion,
+                  strategy=strategy,
+                  workers=workers,
+                  limits=limits,
+                  cancel=cancel,
+                  observers=observers).substitution
 
-    if not premises:
-        return {}
 
-    # derive new clauses
-    _log.debug(" Inference ".center(80, "="))
-    answer = {}
-    seen = []
-    while True:
-        restart = False
-
-        for i, func in ((2, _resolve),
-                        (1, _resolve_reflexivity),
-                        (2, _paramodulate)):
-            if not restart:
-                for args in itertools.combinations(clauses, i):
-                    if args in seen:
-                        continue
-                    seen.append(args)
-
-                    try:
-                        subst, inferred = func(*args)
-                    except _NotInferable:
-                        continue
+def infer_many(premises: Union[List[Node], Premises],
+               conclusions: Iterable[Node],
+               strategy: Strategy = DEFAULT_STRATEGY,
+               workers: int = 0,
+               limits: Limits = NO_LIMITS,
+               cancel: threading.Event = None,
+               observers: Sequence['Observer'] = ()) \
+        -> Iterator[Tuple[int, Optional[T_Substitution]]]:
+    """:returns: Index of each conclusion and substitution for its variables,
+    if it is entailed (None otherwise). (See `search_many`.)"""
+
+    for i, rv in search_many(premises, conclusions,
+                             strategy=strategy,
+                             workers=workers,
+                             limits=limits,
+                             cancel=cancel,
+                             observers=observers):
+        yield i, rv.substitution
+
+
+def infer_all(premises: Union[List[Node], Premises],
+              conclusion: Node,
+              strategy: Strategy = DEFAULT_STRATEGY,
+              workers: int = 0,
+              limits: Limits = NO_LIMITS,
+              answer_timeout: float = None,
+              cancel: threading.Event = None,
+              observers: Sequence['Observer'] = ()) \
+        -> Iterator[T_Substitution]:
+    """Finds distinct substitutions for variables of the conclusion (e.g.
+    every `x` such that `hate(x, Caesar)`).
+
+    The saturation goes on after each answer, until it ends (or runs out of
+    resources).
+
+    :param limits: Limits of the whole search.
+    :param answer_timeout: Wall-clock seconds of finding each answer.
+    :returns: Answers, as soon as they're found.
+    :raises Cancelled: If the cancel event is set during the search.
+    """
+
+    statistics = Statistics()
+    with tracing.span('search', 'inference'), \
+            Budget(limits, statistics, cancel) as budget:
+        budget.restart_answer_timeout(answer_timeout)
+        seen = set()
+        for _, rv in _search_many(premises, [conclusion], strategy, workers,
+                                  budget, observers, all_answers=True):
+            if rv.status != PROVED:
+                return
+            key = frozenset(rv.substitution.items())
+            if key not in seen:
+                seen.add(key)
+                yield rv.substitution
+                budget.restart_answer_timeout(answer_timeout)
+
+
+def search(premises: Union[List[Node], Premises],
+           conclusion: Node,
+           strategy: Strategy = DEFAULT_STRATEGY,
+           workers: int = 0,
+           limits: Limits = NO_LIMITS,
+           cancel: threading.Event = None,
+           observers: Sequence['Observer'] = ()) -> Result:
+    """Decides whether the conclusion is entailed by the premises.
+
+    (See `search_many`.)
+    """
+
+    results = search_many(premises, [conclusion],
+                          strategy=strategy,
+                          workers=workers,
+                          limits=limits,
+                          cancel=cancel,
+                          observers=observers)
+    try:
+        _, rv = next(results)
+    finally:
+        results.close()
+    return rv
+
+
+def search_many(premises: Union[List[Node], Premises],
+                conclusions: Iterable[Node],
+                strategy: Strategy = DEFAULT_STRATEGY,
+                workers: int = 0,
+                limits: Limits = NO_LIMITS,
+                cancel: threading.Event = None,
+                observers: Sequence['Observer'] = ()) \
+        -> Iterator[Tuple[int, Result]]:
+    """Decides several conclusions by a single saturation of the premises.
+
+    :param premises: Premises, or premises clausified by `clausify`.
+    :param workers: Number of worker processes generating the inferences.
+        (0 to generate them in this process.)
+    :param limits: Limits of the search. Conclusions which are not decided
+        when any of them is exceeded are UNKNOWN.
+    :param cancel: Event (set e.g. by another thread) which stops the
+        search.
+    :param observers: Observers of the given-clause loop.
+    :returns: Index and result of each conclusion. Entailed conclusions are
+        yielded as soon as they're proved, the rest after the saturation (or
+        after running out of resources). Results share statistics of the
+        search.
+    :raises Cancelled: If the cancel event is set during the search.
+    """
+
+    statistics = Statistics()
+    with tracing.span('search', 'inference'), \
+            Budget(limits, statistics, cancel) as budget:
+        yield from _search_many(premises, conclusions, strategy, workers,
+                                budget, observers)
+
+
+def check_proof(premises: Union[List[Node], Premises],
+                conclusion: Node,
+                proof: 'Proof') -> bool:
+    """Replays the proof of the conclusion.
+
+    Input clauses of the proof have to be (up to renaming of variables)
+    clauses of the premises or of the negated conclusion, and each other
+    clause has to be inferred from its parents by its rule (by any of their
+    literals, up to renaming of variables). So the proof stays valid when
+    the premises it doesn't use change.
+
+    :param premises: Premises, or premises clausified by `clausify`.
+    :returns: Whether the proof is valid.
+    """
+
+    if not isinstance(premises, Premises):
+        premises = clausify(premises)
+
+    clauses, _, _ = _get_input_clauses(premises, [conclusion])
+    inputs = {}
+    for c in clauses:
+        utils.appenddefault(inputs, _get_shape(c.literals), c.literals)
+
+    derived = {}
+    for step in proof.steps:
+        if step.rule == INPUT:
+            candidates = inputs.get(_get_shape(step.literals), [])
+            if not any(_is_variant(step.literals, k) for k in candidates):
+                return False
+        else:
+            if any(k not in derived for k in step.parents):
+                return False
+            parents = [derived[k] for k in step.parents]
+            if not _replay(step, parents):
+                return False
+        derived[step.id] = step.literals
+
+    return bool(proof.steps) and _is_refutation(proof.steps[-1].literals)
+
+
+def _search_many(premises: Union[List[Node], Premises],
+                 conclusions: Iterable[Node],
+                 strategy: Strategy,
+                 workers: int,
+                 budget: 'Budget',
+                 observers: Sequence['Observer'],
+                 all_answers: bool = False) \
+        -> Iterator[Tuple[int, Result]]:
+    # (with all_answers, conclusions refuted with an answer stay pending,
+    # and each of their refutations is yielded)
+
+    statistics = budget.statistics
+    start = time.perf_counter()
+    conclusions = list(conclusions)
+    pending = set(range(len(conclusions)))
+    pool = None
+
+    try:
+        with tracing.span('clausify', 'inference'):
+            if not isinstance(premises, Premises):
+                premises = clausify(premises, budget.check)
+
+            clauses, conclusion_substs, answer_variables = \
+                _get_input_clauses(premises, conclusions, budget.check)
+
+        statistics.cnf_time += time.perf_counter() - start
+        budget.measure(parse_trees=[*premises.formulas, *conclusions],
+                       substitutions=[premises.subst, *conclusion_substs])
+
+        if not premises.formulas:
+            for i in sorted(pending):
+                yield i, Result(PROVED, {}, statistics)
+            return
+
+        if _is_propositional(clauses):
+            _log.debug(" SAT ".center(80, "="))
+            for i in sorted(pending):
+                if not _is_satisfiable((k.literals for k in clauses
+                                        if not k.goals or i in k.goals),
+                                       budget.check):
+                    yield i, Result(PROVED, _apply(conclusion_substs[i], {}),
+                                    statistics)
+                    pending.discard(i)
+            budget.measure(clauses=clauses)
+
+        else:
+            # derive new clauses
+            _log.debug(" Inference ".center(80, "="))
+            pool = _Workers(workers) if workers else None
+            for goals, proof in _saturate(clauses, pending, strategy, pool,
+                                          budget, observers, all_answers):
+                refutation = proof.steps[-1].literals
+                for i in sorted(goals):
+                    answer = _get_answer(refutation, answer_variables[i])
+                    subst = _apply(conclusion_substs[i], answer)
+                    yield i, Result(PROVED, subst, statistics, proof)
+                    if not (all_answers and refutation):
+                        pending.discard(i)
+
+    except ResourceExhausted as e:
+        statistics.exhausted = str(e)
+        _log.debug(f"Search stopped: {e} exceeded")
+        if statistics.memory:
+            _log.debug(f"Memory: {statistics.memory}")
+    finally:
+        if pool is not None:
+            pool.close()
+
+    status = UNKNOWN if statistics.exhausted else DISPROVED
+    for i in sorted(pending):
+        yield i, Result(status, None, statistics)
+
+
+def _get_input_clauses(premises: Premises, conclusions: List[Node],
+                       check: Callable[[], None] = None) \
+        -> Tuple[List[_Clause], List[T_Substitution], List[List[str]]]:
+    """:param check: Called before each conclusion.
+    :returns: Clauses of the premises and of the negated conclusions
+    (tagged by their positions), substitutions mapping variables of the
+    conclusions into the original ones, and variables of their answer
+    literals."""
+
+    clauses = [_Clause(k, frozenset()) for k in premises.clauses]
+
+    conclusion_substs = []  # to map query results into original input
+    answer_variables = []
+    for i, k in enumerate(conclusions):
+        if check is not None:
+            check()
+        c, subst = _clausify(k.negate())
+        variables = _get_answer_variables(c, subst)
+        clauses.extend(_Clause(_add_answer_literal(j, variables),
+                               frozenset([i]))
+                       for j in c)
+        conclusion_substs.append(subst)
+        answer_variables.append(variables)
+
+    clauses = _absorb_ground_equalities(clauses)
+    return clauses, conclusion_substs, answer_variables
+
+
+def _clausify(f: Node) -> Tuple[FrozenSet[FrozenSet[Node]], T_Substitution]:
+    if not f.is_formula():
+        raise ValueError(f"'{f}' is not a well-formed formula")
+
+    cnf, subst = f.to_cnf()
+    rv = cnf.to_clause_form()
+
+    if _log.isEnabledFor(logging.DEBUG):
+        _log.debug(f"{f} -> {set(_str_clause(j, subst) for j in rv)}")
+
+    return rv, subst
+
+
+def _saturate(clauses: List[_Clause],
+              pending: Set[int],
+              strategy: Strategy,
+              pool: Optional['_Workers'],
+              budget: 'Budget',
+              observers: Sequence['Observer'],
+              all_answers: bool = False) \
+        -> Iterator[Tuple[FrozenSet[int], Proof]]:
+    """Given-clause loop.
+
+    :param pending: Conclusions to decide.
+    :param pool: Workers generating the inferences.
+    :param all_answers: Whether to keep deriving refutations of conclusions
+        refuted with an answer (i.e. with some answer literals).
+    :returns: Conclusions refuted by each empty clause (i.e. clause of just
+        the answer literals), and its derivation.
+    :raises ResourceExhausted: If the budget is exceeded.
+    """
+
+    statistics = budget.statistics
+    pending = set(pending)
+    passive = _Passive(strategy)
+    active: List[_Clause] = []
+    kept: Dict[FrozenSet[Node], List[FrozenSet[int]]] = {}
+    derivations = _Derivations()
+    ids = itertools.count(1)
+    tracer = tracing.get_tracer()
+
+    def keep(c: _Clause) -> bool:
+        start = time.perf_counter()
+        try:
+            # (clause derived from subset of the conclusions subsumes it)
+            tags = kept.setdefault(c.literals, [])
+            if any(k <= c.goals for k in tags):
+                statistics.subsumed += 1
+                derivations.forget(c.id)
+                for o in observers:
+                    o.on_subsumed(c.id)
+                return False
+            tags.append(c.goals)
+            passive.push(c)
+            statistics.kept += 1
+            for o in observers:
+                o.on_clause_kept(c.id)
+            return True
+        finally:
+            statistics.indexing_time += time.perf_counter() - start
+
+    try:
+        for c in clauses:
+            c = c._replace(id=next(ids))
+            derivations.add(c.id, INPUT, (), c.literals, c.goals)
+            for o in observers:
+                o.on_clause_generated(c.id, (), INPUT, c.literals)
+
+            if _is_refutation(c.literals):
+                refuted = pending if not c.goals else c.goals & pending
+                if refuted:
+                    for o in observers:
+                        o.on_proof_found(c.id, frozenset(refuted))
+                    yield frozenset(refuted), derivations.get_proof(c.id)
+                    if not (all_answers and c.literals):
+                        pending -= refuted
+            else:
+                keep(c)
+
+        while passive and pending:
+            budget.check()
+            start = time.perf_counter()
+            given = passive.pop()
+            end = time.perf_counter()
+            statistics.indexing_time += end - start
+            if tracer is not None:
+                tracer.add_span('select', 'inference', start, end)
+
+            if given.goals - pending:
+                statistics.deleted += 1
+                for o in observers:
+                    o.on_clause_deleted(given.id)
+                continue  # conclusion is decided already
+
+            active.append(given)
+            statistics.given += 1
+            for o in observers:
+                o.on_given(given.id)
+
+            if pool is None:
+                inferences = _infer_given(given, active[:-1], pending,
+                                          strategy, statistics)
+            else:
+                inferences = pool.infer_given(given, active[:-1], pending,
+                                              strategy, statistics)
+
+            counters = (_get_counters(statistics) if tracer is not None
+                        else None)
+            try:
+                for func, args, _, inferred in inferences:
+                    goals = frozenset().union(*(k.goals for k in args))
+                    if goals - pending:
+                        continue  # conclusion was decided meanwhile
+                    inferred = _Clause(frozenset(inferred), goals, next(ids))
+                    rule = func.__name__.lstrip('_')
+                    parents = tuple(k.id for k in args)
+                    statistics.generated += 1
+                    statistics.inferences[rule] += 1
+                    derivations.add(inferred.id, rule, parents,
+                                    inferred.literals, goals)
+                    for o in observers:
+                        o.on_clause_generated(inferred.id, parents, rule,
+                                              inferred.literals)
+
+                    if _is_refutation(inferred.literals):
+                        refuted = pending if not goals else goals
+                        for o in observers:
+                            o.on_proof_found(inferred.id, frozenset(refuted))
+                        yield (frozenset(refuted),
+                               derivations.get_proof(inferred.id))
+                        if not (all_answers and inferred.literals):
+                            pending -= refuted
+                        if not pending:
+                            return
                     else:
-                        inferred = frozenset(inferred)
+                        keep(inferred)
+
+                    budget.check()
+            finally:
+                if tracer is not None:
+                    details = {k: v - counters[k]
+                               for k, v in _get_counters(statistics).items()}
+                    tracer.add_span('given clause', 'inference',
+                                    start, time.perf_counter(),
+                                    dict(details, id=given.id))
+    finally:
+        budget.measure(clauses=itertools.chain(active, passive),
+                       indexes=[kept, passive],
+                       proofs=[derivations])
+
+
+def _infer_given(given: _Clause,
+                 active: List[_Clause],
+                 pending: Set[int],
+                 strategy: Strategy,
+                 statistics: Statistics) -> Iterator[tuple]:
+    """:returns: Rule, premises, unifier and conclusion of each inference
+    between the given clause and the active clauses."""
+
+    for _, subst, inferred in _combine((given,), (_resolve_reflexivity,),
+                                       pending, strategy, statistics):
+        yield _resolve_reflexivity, (given,), subst, inferred
+
+    rules = (_resolve, _paramodulate)
+    for other in active:
+        for i, subst, inferred in _combine((other, given), rules,
+                                           pending, strategy, statistics):
+            yield rules[i], (other, given), subst, inferred
+
+
+def _combine(args: Tuple[_Clause, ...],
+             rules: tuple,
+             pending: Set[int],
+             strategy: Strategy,
+             statistics: Statistics) -> Iterator[tuple]:
+    """:returns: Index of the rule, unifier and conclusion of each
+    inference."""
+
+    goals = frozenset().union(*(k.goals for k in args))
+    if len(goals) > 1 or goals - pending:
+        return
+    if strategy.set_of_support and not goals:
+        return
+
+    for i, func in enumerate(rules):
+        try:
+            subst, inferred = func(*(k.literals for k in args),
+                                   statistics=statistics)
+        except _NotInferable:
+            continue
+        yield i, subst, inferred
 
-                    input_subst = unification.compose(input_subst, subst)
-                    answer = unification.compose(answer, subst)
 
-                    if _log.level <= logging.DEBUG:
-                        _log.debug(" + ".join(_str_clause(a, input_subst)
-                                              for a in args) +
-                                   " -> " + (_str_clause(inferred, input_subst)
-                                             if inferred
-                                             else '■') +
-                                   f" ({func.__name__})")
+class _Workers:
+    """Worker processes generating inferences with parts of the active
+    set."""
 
-                    if not inferred:
-                        return _apply(conclusion_subst, answer)
+    def __init__(self, n: int):
+        self._connections = []
+        self._processes = []
+        for i in range(n):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_work,
+                                              args=(child, i, n),
+                                              daemon=True)
+            process.start()
+            self._connections.append(conn)
+            self._processes.append(process)
 
-                    if not inferred.issubset(clauses):
-                        # clauses = [frozenset(k.apply(subst) for k in j)
-                        #            for j in clauses]
-                        clauses = frozenset([*clauses, inferred])
-                        restart = True
-                        break
+    def close(self) -> None:
+        for conn in self._connections:
+            conn.send(None)
+        for process in self._processes:
+            process.join()
 
-        if not restart:
-            return None
+    def infer_given(self, given: _Clause,
+                    active: List[_Clause],
+                    pending: Set[int],
+                    strategy: Strategy,
+                    statistics: Statistics) -> Iterator[tuple]:
+        """Same as `_infer_given`. (Also adds the given clause to the active
+        set of one of the workers.)"""
+
+        for _, subst, inferred in _combine((given,), (_resolve_reflexivity,),
+                                           pending, strategy, statistics):
+            yield _resolve_reflexivity, (given,), subst, inferred
+
+        for conn in self._connections:
+            conn.send((given, len(active), frozenset(pending), strategy))
+
+        inferences = []
+        for conn in self._connections:
+            rv, worker_statistics = conn.recv()
+            inferences.extend(rv)
+            statistics.merge(worker_statistics)
+        inferences.sort(key=lambda k: k[:2])
+
+        rules = (_resolve, _paramodulate)
+        for position, i, subst, inferred in inferences:
+            yield rules[i], (active[position], given), subst, inferred
+
+
+def _work(conn, worker: int, workers: int) -> None:
+    active = []  # (position in the whole active set, clause)
+    rules = (_resolve, _paramodulate)
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            return
+
+        given, position, pending, strategy = message
+        statistics = Statistics()
+        rv = []
+        for j, other in active:
+            for i, subst, inferred in _combine((other, given), rules,
+                                               pending, strategy,
+                                               statistics):
+                rv.append((j, i, subst, inferred))
+        conn.send((rv, statistics))
+
+        if position % workers == worker:
+            active.append((position, given))
+
+
+class Budget:
+    """Checks limits of a search. (Context manager measuring the search.)
+
+    Memory is accounted (i.e. the peak and the structures of the search are
+    measured) if `tracemalloc` is tracing, e.g. because of the `max_memory`
+    limit. Concurrent searches share the tracing, thus the peak and the
+    memory limit include allocations of each other.
+    """
+
+    def __init__(self, limits: Limits, statistics: Statistics,
+                 cancel: threading.Event = None):
+        self.limits = limits
+        self.statistics = statistics
+        self._cancel = cancel
+        self._start = None
+        self._deadline = None
+        self._answer_deadline = None
+        self._tracing = self.limits.max_memory is not None
+        self._accounting = False
+        self._memory = 0  # allocated before the search
+        self._peak = 0
+
+    def __enter__(self) -> 'Budget':
+        self._start = time.monotonic()
+        if self.limits.timeout is not None:
+            self._deadline = self._start + self.limits.timeout
+
+        self._accounting = _tracing.acquire(self._tracing)
+        if self._accounting:
+            self._memory, _ = tracemalloc.get_traced_memory()
+
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.statistics.elapsed = time.monotonic() - self._start
+        if self._accounting:
+            self._update_peak()
+            self.statistics.peak_memory = self._peak - self._memory
+        _tracing.release(self._tracing, self._accounting)
+
+    def restart_answer_timeout(self, timeout: Optional[float]) -> None:
+        """Sets deadline of the next answer (None for no deadline)."""
+
+        self._answer_deadline = (time.monotonic() + timeout
+                                 if timeout is not None
+                                 else None)
+
+    def measure(self, **structures: Iterable[Any]) -> None:
+        """Records number of bytes taken by the structures (if memory is
+        accounted). Objects shared by several of them are counted in the
+        first one."""
+
+        if not self._accounting:
+            return
+
+        # (the measurement itself is not counted in the peak)
+        self._update_peak()
+        seen = set()
+        memory = self.statistics.memory
+        for k, v in structures.items():
+            size = sum(utils.getsizeof(j, seen) for j in v)
+            memory[k] = memory.get(k, 0) + size
+        del seen
+        _tracing.reset_peak()
+
+    def _update_peak(self) -> None:
+        _, peak = tracemalloc.get_traced_memory()
+        self._peak = max(self._peak, peak)
+
+    def check(self) -> None:
+        """:raises ResourceExhausted: If any of the limits is exceeded.
+        :raises Cancelled: If the search is cancelled."""
+
+        limits = self.limits
+        statistics = self.statistics
+
+        if self._cancel is not None and self._cancel.is_set():
+            raise Cancelled("Search was cancelled")
+
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise ResourceExhausted('timeout')
+        if (self._answer_deadline is not None
+                and time.monotonic() > self._answer_deadline):
+            raise ResourceExhausted('answer_timeout')
+        if (limits.max_generated is not None
+                and statistics.generated >= limits.max_generated):
+            raise ResourceExhausted('max_generated')
+        if (limits.max_kept is not None
+                and statistics.kept >= limits.max_kept):
+            raise ResourceExhausted('max_kept')
+        if limits.max_memory is not None:
+            memory, _ = tracemalloc.get_traced_memory()
+            if memory - self._memory > limits.max_memory:
+                raise ResourceExhausted('max_memory')
+
+
+class _Tracing:
+    """Tracing of memory allocations shared by concurrent budgets.
+
+    It's started by the first budget which needs it (unless it's traced
+    already, e.g. by the user) and stopped by the last one. The peak is only
+    reset while a single budget measures it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = 0  # budgets which need the tracing
+        self._started = False  # by the budgets
+        self._accounting = 0  # budgets which measure the memory
+
+    def acquire(self, trace: bool) -> bool:
+        """:param trace: Whether the budget needs the tracing.
+        :returns: Whether the memory is traced (thus measured by the
+            budget)."""
+
+        with self._lock:
+            if trace:
+                if not self._users and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started = True
+                self._users += 1
+
+            if not tracemalloc.is_tracing():
+                return False
+            self._accounting += 1
+            if self._accounting == 1:
+                tracemalloc.reset_peak()
+            return True
+
+    def release(self, trace: bool, accounting: bool) -> None:
+        with self._lock:
+            if accounting:
+                self._accounting -= 1
+            if trace:
+                self._users -= 1
+                if not self._users and self._started:
+                    tracemalloc.stop()
+                    self._started = False
+
+    def reset_peak(self) -> None:
+        with self._lock:
+            if self._accounting == 1:
+                tracemalloc.reset_peak()
+
+
+_tracing = _Tracing()
+
+
+def _get_counters(statistics: Statistics) -> Dict[str, float]:
+    return {
+        'generated': statistics.generated,
+        'kept': statistics.kept,
+        'unifications': statistics.unifications,
+        'unification_failures': statistics.unification_failures,
+        'unification_time': statistics.unification_time,
+    }
+
+
+class _Passive:
+    """Passive clauses ordered by the strategy."""
+
+    def __init__(self, strategy: Strategy):
+        self._strategy = strategy
+        self._by_weight = []  # heap of (weight, age, clause)
+        self._by_age = []  # heap of (age, clause)
+        self._given = set()  # ages
+        self._age = 0
+
+    def __len__(self) -> int:
+        return self._age - len(self._given)
+
+    def __iter__(self) -> Iterator[_Clause]:
+        # (may include given clauses, which are popped from one heap only)
+        for *_, c in self._by_weight:
+            yield c
+
+    def push(self, c: _Clause) -> None:
+        self._age += 1
+        heapq.heappush(self._by_weight, (_weigh(c, self._strategy.weight),
+                                         self._age, c))
+        if self._strategy.age_ratio:
+            heapq.heappush(self._by_age, (self._age, c))
+
+    def pop(self) -> _Clause:
+        ratio = self._strategy.age_ratio
+        heap = (self._by_age
+                if ratio and len(self._given) % ratio == ratio - 1
+                else self._by_weight)
+
+        while True:
+            *_, age, c = heapq.heappop(heap)
+            if age not in self._given:
+                self._given.add(age)
+                return c
+
+
+def _weigh(c: _Clause, weight: str) -> int:
+    literals = [k for k in c.literals if not _is_answer(k)]
+    if weight == 'literals':
+        return len(literals)
+    elif weight == 'symbols':
+        return sum(_count_symbols(k) for k in literals)
+    elif weight == 'age':
+        return 0
+    else:
+        raise ValueError("Provided 'weight' is not valid")
+
+
+def _count_symbols(node: Node) -> int:
+    return 1 + sum(_count_symbols(k) for k in node.children)
 
 
 def _apply(p: T_Substitution, q: T_Substitution) -> T_Substitution:
     rv = {}
     for k, v in p.items():
+        if k not in q:
+            continue  # not bound during the inference
         k2 = p[k]
         assert k2.is_variable()
         k2 = k2.value
@@ -99,14 +1123,360 @@ def _apply(p: T_Substitution, q: T_Substitution) -> T_Substitution:
     return rv
 
 
+# Proofs
+# -----------------------------------------------------------------------------
+
+# Rules by their positions in the derivations
+_RULES = (INPUT, 'resolve', 'resolve_reflexivity', 'paramodulate')
+
+
+class _Derivations:
+    """Rules and parents of the clauses of a search (in arrays indexed by
+    ids of the clauses), and literals of the clauses which may be premises
+    of inferences."""
+
+    def __init__(self):
+        self._rules = array.array('B')  # positions in _RULES
+        self._parents = array.array('I')  # two per clause (0 if none)
+        self._literals: List[Optional[FrozenSet[Node]]] = []
+        self._goals: List[Optional[FrozenSet[int]]] = []
+
+    def add(self, id_: int, rule: str, parents: Tuple[int, ...],
+            literals: FrozenSet[Node], goals: FrozenSet[int]) -> None:
+        assert id_ == len(self._literals) + 1  # ids are sequence numbers
+        assert len(parents) <= 2
+
+        self._rules.append(_RULES.index(rule))
+        self._parents.extend((*parents, 0, 0)[:2])
+        self._literals.append(literals)
+        self._goals.append(goals)
+
+    def forget(self, id_: int) -> None:
+        """Drops literals of a redundant clause."""
+
+        self._literals[id_ - 1] = None
+        self._goals[id_ - 1] = None
+
+    def get_proof(self, id_: int) -> Proof:
+        """:returns: Derivation of the clause."""
+
+        ids = set()
+        stack = [id_]
+        while stack:
+            k = stack.pop()
+            if k not in ids:
+                ids.add(k)
+                stack.extend(self._get_parents(k))
+
+        # (parents precede their children)
+        return Proof([Step(k, _RULES[self._rules[k - 1]],
+                           self._get_parents(k), self._literals[k - 1],
+                           self._goals[k - 1])
+                      for k in sorted(ids)])
+
+    def _get_parents(self, id_: int) -> Tuple[int, ...]:
+        i = 2 * (id_ - 1)
+        return tuple(k for k in self._parents[i:i + 2] if k)
+
+
+def _replay(step: Step, parents: List[FrozenSet[Node]]) -> bool:
+    """:returns: Whether the clause is inferred from its parents by its
+    rule. (By any of their literals and positions, since the search infers
+    the first one in order of iteration, which may differ e.g. in another
+    process. Up to renaming of the variables.)"""
+
+    rules = {
+        'resolve': (_get_resolvents, 2),
+        'resolve_reflexivity': (_get_reflexivity_resolvents, 1),
+        'paramodulate': (_get_paramodulants, 2),
+    }
+
+    try:
+        func, arity = rules[step.rule]
+    except KeyError:
+        return False
+    if len(parents) != arity:
+        return False
+
+    statistics = Statistics()
+    return any(_is_variant(frozenset(inferred), step.literals)
+               for _, inferred in func(*parents, statistics=statistics))
+
+
+def _get_shape(literals: FrozenSet[Node]) -> tuple:
+    """:returns: Literals without names of their variables (i.e. the same
+    for clauses which differ only in the names)."""
+
+    def get_shape(x: Node) -> tuple:
+        if x.is_variable():
+            return x.type_,
+        return x.type_, x.value, tuple(get_shape(k) for k in x.children)
+
+    return tuple(sorted(get_shape(k) for k in literals))
+
+
+def subsumes(p: FrozenSet[Node], q: FrozenSet[Node]) -> bool:
+    """:returns: Whether the clause `p` subsumes the clause `q` (i.e. some
+    instance of `p` is a subset of `q`, thus `q` is redundant)."""
+
+    if len(p) > len(q):
+        return False
+    if not {_get_symbol(k) for k in p} <= {_get_symbol(k) for k in q}:
+        return False
+    return _subsume_literals(list(p), list(q), {})
+
+
+def _subsume_literals(p: List[Node], q: List[Node],
+                      subst: Dict[str, Node]) -> bool:
+    if not p:
+        return True
+
+    x, *rest = p
+    for y in q:
+        subst2 = dict(subst)
+        if (_match_instance(x, y, subst2)
+                and _subsume_literals(rest, q, subst2)):
+            return True
+    return False
+
+
+def _match_instance(x: Node, y: Node, subst: Dict[str, Node]) -> bool:
+    # (binds variables of x to terms of y, variables of y are fixed)
+
+    if x.is_variable():
+        return subst.setdefault(x.value, y) == y
+
+    return (x.type_ == y.type_
+            and x.value == y.value
+            and len(x.children) == len(y.children)
+            and all(_match_instance(j, k, subst)
+                    for j, k in zip(x.children, y.children)))
+
+
+def _get_symbol(x: Node) -> Tuple[bool, str]:
+    # (sign and predicate of the literal)
+    return x.is_negation(), _get_atom(x).value
+
+
+def _is_variant(p: FrozenSet[Node], q: FrozenSet[Node]) -> bool:
+    """:returns: Whether the clauses differ only in names of their
+    variables."""
+
+    return len(p) == len(q) and _match_literals(list(p), list(q), {}, {})
+
+
+def _match_literals(p: List[Node], q: List[Node],
+                    names: Dict[str, str], inverse: Dict[str, str]) -> bool:
+    if not p:
+        return True
+
+    x, *rest = p
+    for i, y in enumerate(q):
+        names2, inverse2 = dict(names), dict(inverse)
+        if (_match(x, y, names2, inverse2)
+                and _match_literals(rest, q[:i] + q[i + 1:],
+                                    names2, inverse2)):
+            return True
+    return False
+
+
+def _match(x: Node, y: Node,
+           names: Dict[str, str], inverse: Dict[str, str]) -> bool:
+    # (renames variables of x into variables of y one-to-one)
+
+    if x.is_variable() and y.is_variable():
+        return (names.setdefault(x.value, y.value) == y.value
+                and inverse.setdefault(y.value, x.value) == x.value)
+
+    return (x.type_ == y.type_
+            and x.value == y.value
+            and len(x.children) == len(y.children)
+            and all(_match(j, k, names, inverse)
+                    for j, k in zip(x.children, y.children)))
+
+
+# Answer Literals
+# -----------------------------------------------------------------------------
+#
+# Clauses of a negated conclusion carry the answer literal `$ans(x, ...)` of
+# its variables, so that their bindings travel with the clauses derived from
+# it. Clause of just the answer literals refutes the conclusion, and arguments
+# of the literals are the answer.
+
+_ANSWER = '$ans'
+
+
+def _get_answer_variables(clauses: FrozenSet[FrozenSet[Node]],
+                          subst: T_Substitution) -> List[str]:
+    """:returns: Variables of the conclusion which occur in its clauses."""
+
+    names = {k for c in clauses for x in c for k in _find_variables(x)}
+    return sorted(k for k, v in subst.items()
+                  if k in names and v.is_variable())
+
+
+def _add_answer_literal(literals: FrozenSet[Node],
+                        variables: List[str]) -> FrozenSet[Node]:
+    if not variables:
+        return literals
+
+    answer = Node(type_=syntax.PREDICATE,
+                  value=_ANSWER,
+                  children=[syntax.make_variable(k) for k in variables])
+    return literals | {answer}
+
+
+def _is_answer(x: Node) -> bool:
+    return x.is_predicate() and x.value == _ANSWER
+
+
+def _is_refutation(literals: FrozenSet[Node]) -> bool:
+    return all(_is_answer(k) for k in literals)
+
+
+def _get_answer(literals: FrozenSet[Node],
+                variables: List[str]) -> T_Substitution:
+    """:returns: Bindings of the variables by the answer literals of the
+    refutation. (Disjunctive answer - i.e. several answer literals - binds
+    only the variables bound equally by all of them.)"""
+
+    rv = None
+    for x in literals:
+        answer = {k: v for k, v in zip(variables, x.children)
+                  if not (v.is_variable() and v.value == k)}
+        rv = (answer if rv is None
+              else {k: v for k, v in rv.items() if answer.get(k) == v})
+    return rv or {}
+
+
+def _find_variables(node: Node) -> Iterator[str]:
+    if node.is_variable():
+        yield node.value
+    for x in node.children:
+        yield from _find_variables(x)
+
+
 def _str_clause(a, subst):
     return str(set(j.replace(subst) for j in a))
 
 
+# Ground Equalities
+# -----------------------------------------------------------------------------
+
+def _absorb_ground_equalities(clauses: List[_Clause]) -> List[_Clause]:
+    """Moves ground unit equalities of the premises into congruence closure
+    and rewrites ground terms of the remaining clauses into their canonical
+    forms.
+
+    Ground equality literals decided by the closure are removed as well - true
+    ones remove the whole clause, false ones just the literal.
+    """
+
+    cc = congruence.CongruenceClosure()
+    absorbed = []
+    positions = set()  # of the absorbed clauses
+    for i, c in enumerate(clauses):
+        if len(c.literals) == 1 and not c.goals:
+            x, = c.literals
+            if x.is_equality() and congruence.is_ground(x):
+                cc.add_equality(*x.children)
+                absorbed.append(c)
+                positions.add(i)
+
+    if not absorbed:
+        return clauses
+
+    rv = []
+    seen = set()
+    for i, c in enumerate(clauses):
+        if i in positions:
+            continue
+
+        literals = set()
+        for x in c.literals:
+            x = cc.canonicalize(x)
+            atom = _get_atom(x)
+            if atom.is_equality() and congruence.is_ground(atom):
+                s, t = atom.children
+                if s == t:
+                    if x.is_negation():
+                        continue  # false literal
+                    else:
+                        break  # tautology
+            literals.add(x)
+        else:
+            c = _Clause(frozenset(literals), c.goals)
+            if c not in seen:
+                seen.add(c)
+                rv.append(c)
+
+    # Canonical forms are enough for the resolution when there are no other
+    # equalities, and when terms of non-ground literals can't be instantiated
+    # into (non-canonical) function terms. Otherwise paramodulation still
+    # needs the original equalities.
+    for c in rv:
+        for x in c.literals:
+            atom = _get_atom(x)
+            if atom.is_equality() or not (congruence.is_ground(atom)
+                                          or _is_function_free(atom)):
+                return [*absorbed, *rv]
+
+    return rv
+
+
+def _get_atom(x: Node) -> Node:
+    return x.children[0] if x.is_negation() else x
+
+
+def _is_function_free(atom: Node) -> bool:
+    return all(k.is_variable() or k.is_constant() for k in atom.children)
+
+
+# Propositional Logic
+# -----------------------------------------------------------------------------
+
+def _is_propositional(clauses: List[_Clause]) -> bool:
+    return all(congruence.is_ground(x) and not _get_atom(x).is_equality()
+               for c in clauses for x in c.literals)
+
+
+def _is_satisfiable(clauses: Iterable[FrozenSet[Node]],
+                    check: Callable[[], None] = None) -> bool:
+    """Decides ground clauses by SAT solver. (Atoms are treated as
+    propositional variables.)
+
+    :param check: Called before each clause and on each conflict of the
+        solver.
+    """
+
+    variables = {}
+    solver = sat.Solver()
+    for c in clauses:
+        if check is not None:
+            check()
+        literals = []
+        for x in c:
+            var = variables.setdefault(_get_atom(x), len(variables) + 1)
+            literals.append(-var if x.is_negation() else var)
+        if not solver.add_clause(literals):
+            return False
+    return solver.solve(check)
+
+
 # Binary Resolution
 # -----------------------------------------------------------------------------
 
-def _resolve(p: Set[Node], q: Set[Node]) -> Tuple[T_Substitution, List[Node]]:
+def _resolve(p: Set[Node], q: Set[Node],
+             statistics: Statistics) -> Tuple[T_Substitution, List[Node]]:
+    # (the search infers only the first resolvent of the clauses)
+    for rv in _get_resolvents(p, q, statistics):
+        return rv
+    raise _NotInferable()
+
+
+def _get_resolvents(p: Set[Node], q: Set[Node],
+                    statistics: Statistics) \
+        -> Iterator[Tuple[T_Substitution, List[Node]]]:
     # assume: {A | C} + {!B | D}
     # infer:  {C | D} * mgu(A, B)
     #
@@ -119,7 +1489,7 @@ def _resolve(p: Set[Node], q: Set[Node]) -> Tuple[T_Substitution, List[Node]]:
         # and the another is its negation)
 
         try:
-            subst = _unify_complementary(x, y)
+            subst = _unify_complementary(x, y, statistics)
         except unification.NotUnifiable:
             continue
 
@@ -128,12 +1498,11 @@ def _resolve(p: Set[Node], q: Set[Node]) -> Tuple[T_Substitution, List[Node]]:
         rv.remove(y)
         rv = [k.apply(subst) for k in rv]
 
-        return subst, rv
-
-    raise _NotInferable()
+        yield subst, rv
 
 
-def _unify_complementary(x: Node, y: Node) -> T_Substitution:
+def _unify_complementary(x: Node, y: Node,
+                         statistics: Statistics) -> T_Substitution:
     x_neg = x.is_negation()
     y_neg = y.is_negation()
 
@@ -149,14 +1518,36 @@ def _unify_complementary(x: Node, y: Node) -> T_Substitution:
     if x.is_equality() or y.is_equality():
         raise unification.NotUnifiable()
 
-    return x.unify(y)
+    return _unify(x, y, statistics)
+
+
+def _unify(x: Node, y: Node, statistics: Statistics) -> T_Substitution:
+    statistics.unifications += 1
+    start = time.perf_counter()
+    try:
+        return x.unify(y)
+    except unification.NotUnifiable:
+        statistics.unification_failures += 1
+        raise
+    finally:
+        statistics.unification_time += time.perf_counter() - start
 
 
 # Binary Paramodulation
 # -----------------------------------------------------------------------------
 
-def _paramodulate(p: Set[Node], q: Set[Node]) -> Tuple[T_Substitution,
-                                                       List[Node]]:
+def _paramodulate(p: Set[Node], q: Set[Node],
+                  statistics: Statistics) -> Tuple[T_Substitution,
+                                                   List[Node]]:
+    # (the search infers only the first paramodulant of the clauses)
+    for rv in _get_paramodulants(p, q, statistics):
+        return rv
+    raise _NotInferable()
+
+
+def _get_paramodulants(p: Set[Node], q: Set[Node],
+                       statistics: Statistics) \
+        -> Iterator[Tuple[T_Substitution, List[Node]]]:
     # assume: {s = t | C} + {L[r] | D}
     # infer:  {L[t] | C | D} * mgu(s, r)
     #
@@ -165,34 +1556,28 @@ def _paramodulate(p: Set[Node], q: Set[Node]) -> Tuple[T_Substitution,
     #   premises have no variables in common
 
     for c1, c2 in ((p, q), (q, p)):
-        rv = [*c1, *c2]
-
-        # find equality
         for x1 in c1:
-            if x1.is_equality():
-                rv.remove(x1)
-                s, t = x1.children
-                break
-        else:
-            continue
+            if not x1.is_equality():
+                continue
 
-        # find term that unifies with one of the equality operands
-        for x2 in c2:
-            for s, t in ((s, t), (t, s)):
-                try:
-                    subst, r = _unify_recursively(s, x2)
-                except unification.NotUnifiable:
-                    pass
-                else:
-                    rv.remove(x2)
-                    rv.append(x2.replace2(r, t))
-                    rv = [k.apply(subst) for k in rv]
-                    return subst, rv
+            # find term that unifies with one of the equality operands
+            for x2 in c2:
+                for s, t in (x1.children, reversed(x1.children)):
+                    for subst, r in _unify_recursively(s, x2, statistics):
+                        rv = [*c1, *c2]
+                        rv.remove(x1)
+                        rv.remove(x2)
+                        rv.append(x2.replace2(r, t))
+                        rv = [k.apply(subst) for k in rv]
+                        yield subst, rv
 
-    raise _NotInferable()
 
+def _unify_recursively(s: Node, in_: Node,
+                       statistics: Statistics) \
+        -> Iterator[Tuple[T_Substitution, Node]]:
+    """:returns: Unifier with `s` of each subterm (innermost first), and the
+    subterm."""
 
-def _unify_recursively(s: Node, in_: Node) -> Tuple[T_Substitution, Node]:
     # assert s.is_term()
     # assert in_.is_literal() or in_.is_term()
 
@@ -200,24 +1585,29 @@ def _unify_recursively(s: Node, in_: Node) -> Tuple[T_Substitution, Node]:
         in_ = in_.children[0]
 
     for r in in_.children:
-        try:
-            return _unify_recursively(s, r)
-        except unification.NotUnifiable:
-            pass
+        yield from _unify_recursively(s, r, statistics)
 
         try:
-            return s.unify(r), r
+            yield _unify(s, r, statistics), r
         except unification.NotUnifiable:
             pass
 
-    raise unification.NotUnifiable()
-
 
 # Reflexivity Resolution
 # -----------------------------------------------------------------------------
 
-def _resolve_reflexivity(clauses: Set[Node]) -> Tuple[T_Substitution,
-                                                      List[Node]]:
+def _resolve_reflexivity(clauses: Set[Node],
+                         statistics: Statistics) -> Tuple[T_Substitution,
+                                                          List[Node]]:
+    # (the search infers only the first resolvent of the clause)
+    for rv in _get_reflexivity_resolvents(clauses, statistics):
+        return rv
+    raise _NotInferable()
+
+
+def _get_reflexivity_resolvents(clauses: Set[Node],
+                                statistics: Statistics) \
+        -> Iterator[Tuple[T_Substitution, List[Node]]]:
     # assume: {s != t | D}
     # infer:  {D} * mgu(s, t)
 
@@ -231,13 +1621,11 @@ def _resolve_reflexivity(clauses: Set[Node]) -> Tuple[T_Substitution,
         # assert s.is_term()
         # assert t.is_term()
         try:
-            subst = s.unify(t)
+            subst = _unify(s, t, statistics)
         except unification.NotUnifiable:
             pass
         else:
             rv = [*clauses]
             rv.remove(c)
             rv = [k.apply(subst) for k in rv]
-            return subst, rv
-
-    raise _NotInferable()
+            yield subst, rv
@@ -0,0 +1,123 @@
+"""Cost-based ordering of joins.
+
+Order in which atoms of a conjunctive query or a rule body (e.g. `person(x) &
+ruler(y) & tryAssassin(x, y)`) are joined decides how many intermediate
+bindings are enumerated. `plan` orders them greedily: At each step, it picks
+the atom with the fewest expected matches given the variables bound by the
+atoms before it. The matches are estimated from `Statistics` (number of atoms
+of each predicate and number of distinct values of each of its arguments) under
+the usual assumption that the values are distributed uniformly and
+independently.
+"""
+
+from typing import (
+    Dict, FrozenSet, Hashable, Iterable, List, NamedTuple, Optional,
+    Sequence, Tuple,
+)
+
+#: Predicate and variables of each of its arguments.
+T_Atom = Tuple[Hashable, Sequence[FrozenSet[str]]]
+
+
+class Statistics:
+    """Statistics of atoms, which are maintained incrementally as the atoms
+    are added."""
+
+    def __init__(self, base: 'Statistics' = None):
+        """
+        :param base: Statistics of predicates which are not added to these.
+        """
+
+        self._base = base
+        self._cardinality: Dict[Hashable, int] = {}
+        self._distinct: Dict[Tuple[Hashable, int], set] = {}
+
+    def add(self, predicate: Hashable, arguments: Iterable[Hashable]) -> None:
+        """Accounts for new (not seen before) atom."""
+
+        self._cardinality[predicate] = self._cardinality.get(predicate, 0) + 1
+        for i, k in enumerate(arguments):
+            values = self._distinct.get((predicate, i))
+            if values is None:
+                values = self._distinct[predicate, i] = set()
+            values.add(k)
+
+    def get_cardinality(self, predicate: Hashable) -> int:
+        """:returns: Number of atoms of the predicate."""
+
+        if predicate not in self._cardinality and self._base is not None:
+            return self._base.get_cardinality(predicate)
+        return self._cardinality.get(predicate, 0)
+
+    def get_distinct(self, predicate: Hashable, position: int) -> int:
+        """:returns: Number of distinct values of the argument."""
+
+        if predicate not in self._cardinality and self._base is not None:
+            return self._base.get_distinct(predicate, position)
+        return len(self._distinct.get((predicate, position), ()))
+
+    def estimate(self, predicate: Hashable, positions: Iterable[int],
+                 cardinality: int = None) -> float:
+        """:returns: Expected number of atoms of the predicate which have
+        the given values at the positions.
+
+        :param cardinality: Number of atoms to choose from (if only some atoms
+            of the predicate are joined).
+        """
+
+        rv = (self.get_cardinality(predicate)
+              if cardinality is None
+              else cardinality)
+        for i in positions:
+            rv /= max(1, self.get_distinct(predicate, i))
+        return rv
+
+
+class Step(NamedTuple):
+    """Atom to be joined next."""
+
+    #: Position of the atom in the conjunction.
+    index: int
+
+    #: Positions of its bound arguments, by which it can be looked up.
+    #: (Starting with the most selective one.)
+    positions: Tuple[int, ...]
+
+
+def plan(atoms: Sequence[T_Atom],
+         statistics: Statistics,
+         bound: Iterable[str] = (),
+         cardinalities: Sequence[Optional[int]] = None) -> List[Step]:
+    """Orders joins of the atoms.
+
+    :param bound: Variables bound before the join.
+    :param cardinalities: Number of atoms to choose from for each of the
+        atoms. (See `Statistics.estimate`.)
+    :returns: Steps of the join.
+    """
+
+    bound = set(bound)
+    pending = list(range(len(atoms)))
+    rv = []
+
+    while pending:
+        best = None
+        for i in pending:
+            predicate, arguments = atoms[i]
+            positions = [j for j, k in enumerate(arguments) if k <= bound]
+            cost = statistics.estimate(
+                predicate, positions,
+                cardinalities[i] if cardinalities else None)
+            if best is None or cost < best[0]:
+                best = (cost, i, positions)
+
+        _, i, positions = best
+        predicate, arguments = atoms[i]
+        positions.sort(key=lambda j: -statistics.get_distinct(predicate, j))
+        rv.append(Step(i, tuple(positions)))
+
+        pending.remove(i)
+        for k in arguments:
+            bound.update(k)
+
+    return rv
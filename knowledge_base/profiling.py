@@ -0,0 +1,106 @@
+"""Profiling by cProfile, summarized by modules of the project.
+
+Time spent by each function itself (i.e. not by the functions it calls) is
+attributed to its module - `syntax`, `unification`, `cnf`, `inference`, ...
+Functions of third-party packages are grouped by the packages (e.g.
+`pyparsing`), the rest of the standard library as 'other', and built-in
+functions (implemented in C) as 'builtins'.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+from typing import Any, Callable, Dict, List, Tuple
+
+OTHER = 'other'
+BUILTINS = 'builtins'
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def profile(func: Callable, *args, path: str = None,
+            **kwargs) -> Tuple[Any, pstats.Stats]:
+    """Calls the function under cProfile.
+
+    :param path: Path to the file where the stats are written (in `pstats`
+        format).
+    :returns: Return value of the function and the stats.
+    """
+
+    profiler = cProfile.Profile()
+    try:
+        rv = profiler.runcall(func, *args, **kwargs)
+    finally:
+        if path:
+            profiler.dump_stats(path)
+    return rv, pstats.Stats(profiler)
+
+
+def group_by_module(stats: pstats.Stats) -> Dict[str, float]:
+    """:returns: Seconds spent by functions of each module (in descending
+    order)."""
+
+    rv = {}
+    for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+        module = get_module(filename)
+        rv[module] = rv.get(module, 0.0) + tottime
+    return dict(sorted(rv.items(), key=lambda k: -k[1]))
+
+
+def get_module(filename: str) -> str:
+    """:returns: Name of the project module or third-party package (or OTHER
+    or BUILTINS) which defines functions of the file."""
+
+    if filename == '~':
+        return BUILTINS
+
+    path = os.path.abspath(filename)
+    directory, name = os.path.split(path)
+    module, _ = os.path.splitext(name)
+    if directory == _PACKAGE_DIR:
+        return module
+    if directory == os.path.dirname(_PACKAGE_DIR) and module == 'main':
+        return module
+
+    parts = path.split(os.sep)
+    if 'site-packages' in parts:
+        i = parts.index('site-packages')
+        if i + 1 < len(parts):
+            return os.path.splitext(parts[i + 1])[0]
+
+    return OTHER
+
+
+def format_summary(stats: pstats.Stats, top: int = 10) -> str:
+    """:returns: Time by modules, and the functions which spent the most
+    time themselves."""
+
+    total = stats.total_tt or 1.0
+
+    rv = ["Time by module:"]
+    for module, seconds in group_by_module(stats).items():
+        rv.append(f"  {module:<15} {seconds:9.3f}s {seconds / total:7.1%}")
+    rv.append("")
+
+    fp = io.StringIO()
+    stream, stats.stream = stats.stream, fp
+    try:
+        stats.sort_stats('tottime').print_stats(top)
+    finally:
+        stats.stream = stream
+    rv.append(f"Top {top} functions:")
+    rv.extend(_strip_header(fp.getvalue()))
+
+    return "\n".join(rv)
+
+
+def _strip_header(text: str) -> List[str]:
+    # (pstats prints the list of files the stats were loaded from and their
+    # totals before the table)
+
+    lines = text.strip('\n').splitlines()
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith('ncalls'):
+            return lines[i:]
+    return lines
@@ -0,0 +1,114 @@
+"""Selection of axioms relevant to a goal (SInE).
+
+Most axioms of a large knowledge base are irrelevant to any given goal, yet
+each of them enters the saturation. Axioms are selected by the symbols
+(predicates, functions and constants) which trigger them: An axiom is triggered
+by its symbol, if the symbol occurs in at most `tolerance` times more axioms
+than the rarest symbol of the axiom. (I.e. common symbols, such as `person`,
+trigger only the axioms which don't contain anything more specific.) Symbols of
+the goal trigger the first axioms, whose symbols trigger the next ones, and so
+on up to `depth` steps.
+
+The selection is incomplete: A proof might need an axiom which isn't selected,
+thus the callers fall back to a larger selection (or all axioms) if the proof
+from the selected ones fails.
+"""
+
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set
+
+from knowledge_base import syntax
+
+
+class Filter(NamedTuple):
+    """Parameters of the selection."""
+
+    #: Maximum number of steps from the symbols of the goal. (None for no
+    #: limit, i.e. every axiom transitively related to the goal.)
+    depth: Optional[int] = None
+
+    #: How many times more axioms than the rarest symbol of an axiom its
+    #: symbol might occur in to trigger the axiom. (At least 1, greater
+    #: tolerance selects more axioms.)
+    tolerance: float = 1.0
+
+
+class Index:
+    """Axioms by their symbols, which is maintained incrementally as the
+    axioms are added."""
+
+    def __init__(self):
+        self._symbols: List[FrozenSet[str]] = []
+        self._axioms: Dict[str, List[int]] = {}
+
+        # Axioms without symbols (e.g. `*x: x = x`), which are always
+        # selected.
+        self._unconditional: List[int] = []
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def add(self, f: syntax.Node) -> None:
+        """Indexes the axiom at the next position."""
+
+        symbols = get_symbols(f)
+        i = len(self._symbols)
+        self._symbols.append(symbols)
+
+        if not symbols:
+            self._unconditional.append(i)
+        for k in symbols:
+            self._axioms.setdefault(k, []).append(i)
+
+    def select(self, goal: syntax.Node,
+               filter_: Filter = Filter()) -> Set[int]:
+        """:returns: Positions of the axioms relevant to the goal.
+
+        :raises ValueError: If the filter is not valid.
+        """
+
+        if filter_.depth is not None and filter_.depth < 1:
+            raise ValueError("Provided 'depth' is not valid")
+        if filter_.tolerance < 1:
+            raise ValueError("Provided 'tolerance' is not valid")
+
+        rv = set(self._unconditional)
+        seen = set()
+        symbols = get_symbols(goal)
+        depth = 0
+
+        while symbols and (filter_.depth is None or depth < filter_.depth):
+            seen |= symbols
+            triggered = set()
+            for k in symbols:
+                axioms = self._axioms.get(k, ())
+                for i in axioms:
+                    if (i not in rv
+                            and (len(axioms)
+                                 <= filter_.tolerance * self._get_rarest(i))):
+                        rv.add(i)
+                        triggered |= self._symbols[i]
+
+            symbols = triggered - seen
+            depth += 1
+
+        return rv
+
+    def _get_rarest(self, i: int) -> int:
+        # (number of axioms of the rarest symbol of the axiom)
+        return min(len(self._axioms[k]) for k in self._symbols[i])
+
+
+def get_symbols(f: syntax.Node) -> FrozenSet[str]:
+    """:returns: Names of the predicates, functions and constants of the
+    formula. (Except of the equality, which is related to everything.)"""
+
+    rv = set()
+    stack = [f]
+    while stack:
+        x = stack.pop()
+        if ((x.is_predicate() and not x.is_equality())
+                or x.is_function()
+                or x.is_constant()):
+            rv.add(x.value)
+        stack.extend(x.children)
+    return frozenset(rv)
@@ -0,0 +1,396 @@
+"""Knuth-Bendix completion of equational axioms.
+
+Unit equalities (e.g. `*x: F(F(x)) = x`) are oriented by the lexicographic
+path ordering into rewrite rules, which are completed by adding critical pairs
+until the rules are confluent. The resulting `RewriteSystem` then normalizes
+the remaining formulas, so that the equational axioms it was built from do not
+have to be used in paramodulation.
+
+Equations that can't be oriented (e.g. commutativity) are kept aside as
+`RewriteSystem.equations` and have to be passed to the prover as they are.
+"""
+
+import json
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from knowledge_base import common, grammar, syntax, unification
+
+Node = syntax.Node
+T_Substitution = syntax.T_Substitution
+T_Equation = Tuple[Node, Node]
+
+
+class CompletionError(common.KnowledgeBaseError):
+    pass
+
+
+class Rule(NamedTuple):
+    """Oriented equation `lhs -> rhs`."""
+
+    lhs: Node
+    rhs: Node
+
+    def __str__(self):
+        return f'{self.lhs} -> {self.rhs}'
+
+    __repr__ = __str__
+
+
+class RewriteSystem(NamedTuple):
+    """Result of the completion."""
+
+    #: Axioms the system was completed from.
+    #:
+    #: Stored as strings, so that the system can be cached and compared
+    #: against the content of the knowledge base in another session.
+    axioms: List[str]
+
+    #: Oriented rules.
+    rules: List[Rule]
+
+    #: Equations that couldn't be oriented.
+    equations: List[T_Equation]
+
+    def is_convergent(self) -> bool:
+        """:returns: Whether all axioms were turned into rules."""
+
+        return not self.equations
+
+    def is_up_to_date(self, formulas: List[Node]) -> bool:
+        """:returns: Whether the system was completed from the equational
+        axioms among `formulas`."""
+
+        return self.axioms == [str(k) for k in formulas if is_equation(k)]
+
+    def normalize(self, node: Node) -> Node:
+        """Rewrites all terms inside the node into their normal forms.
+
+        :param node: Term or formula to rewrite.
+        :returns: Rewritten node.
+        """
+
+        return _normalize(node, self.rules).normalize()
+
+    def get_equations(self) -> List[Node]:
+        """:returns: Equations that couldn't be oriented as formulas."""
+
+        return [_make_formula(s, t) for s, t in self.equations]
+
+    # Serialization
+    # -------------------------------------------------------------------------
+
+    def dumps(self, **kwargs) -> str:
+        """Serializes the system into JSON.
+
+        :param kwargs: Additional keyword arguments are passed to JSON
+        serializer.
+        :returns: Serialized system.
+        """
+
+        rv = {
+            'Axioms': self.axioms,
+            'Rules': [[str(k.lhs), str(k.rhs)] for k in self.rules],
+            'Equations': [[str(s), str(t)] for s, t in self.equations],
+        }
+        return json.dumps(rv, **kwargs)
+
+    @classmethod
+    def loads(cls, value: str) -> 'RewriteSystem':
+        """Deserializes the system.
+
+        :param value: Output of `dumps`.
+        :returns: Deserialized system.
+        """
+
+        value = json.loads(value)
+        return cls(axioms=value['Axioms'],
+                   rules=[Rule(*(_parse_term(j) for j in k))
+                          for k in value['Rules']],
+                   equations=[tuple(_parse_term(j) for j in k)
+                              for k in value['Equations']])
+
+    def __str__(self):
+        return "\n".join([*(str(k) for k in self.rules),
+                          *(f'{s} = {t}' for s, t in self.equations)])
+
+
+def is_equation(f: Node) -> bool:
+    """:returns: Whether the formula is a unit equality (possibly universally
+    quantified)."""
+
+    return _get_equation(f) is not None
+
+
+def complete(formulas: Iterable[Node],
+             precedence: List[str] = None,
+             max_rules: int = 1000) -> RewriteSystem:
+    """Runs Knuth-Bendix completion on the equational axioms.
+
+    :param formulas: Formulas to pick the equational axioms from. (The other
+        formulas are ignored.)
+    :param precedence: Function and constant symbols ordered from the
+        greatest. Unlisted symbols are smaller than the listed ones and are
+        ordered by their arity and name.
+    :param max_rules: Maximum number of rules to generate.
+    :returns: Completed system.
+    :raises CompletionError: If the completion does not finish within
+        `max_rules` rules.
+    """
+
+    axioms = []
+    pending: List[T_Equation] = []
+    for k in formulas:
+        eq = _get_equation(k)
+        if eq is not None:
+            axioms.append(str(k))
+            pending.append(eq)
+
+    key = _precedence_key(precedence or [])
+    rules: List[Rule] = []
+    unorientable: List[T_Equation] = []
+    generated = 0
+
+    while pending:
+        s, t = pending.pop(0)
+        s = _normalize(s, rules)
+        t = _normalize(t, rules)
+        if s == t:
+            continue
+
+        if _greater(s, t, key):
+            rule = Rule(s, t)
+        elif _greater(t, s, key):
+            rule = Rule(t, s)
+        else:
+            unorientable.append((s, t))
+            continue
+
+        rule = _rename_rule(rule, 'x')
+        generated += 1
+        if generated > max_rules:
+            raise CompletionError(f"Completion did not finish within "
+                                  f"{max_rules} rules")
+
+        # interreduce: rules whose left-hand side is reducible by the new
+        # rule become equations again
+        kept = []
+        for k in rules:
+            if _is_reducible(k.lhs, rule):
+                pending.append(k)
+            else:
+                kept.append(k)
+        rules = [Rule(k.lhs, _normalize(k.rhs, [*kept, rule]))
+                 for k in kept]
+        rules.append(rule)
+
+        for k in rules:
+            pending.extend(_critical_pairs(rule, k))
+            if k is not rule:
+                pending.extend(_critical_pairs(k, rule))
+
+        # the new rule might have made some equations orientable
+        pending.extend(unorientable)
+        unorientable = []
+
+    equations = []
+    for s, t in unorientable:
+        s = _normalize(s, rules)
+        t = _normalize(t, rules)
+        if s != t and (s, t) not in equations and (t, s) not in equations:
+            equations.append(tuple(_rename_rule(Rule(s, t), 'x')))
+
+    return RewriteSystem(axioms=axioms, rules=rules, equations=equations)
+
+
+def _get_equation(f: Node) -> Optional[T_Equation]:
+    if not f.is_formula():
+        return None
+
+    cnf, _ = f.to_cnf()
+    clauses = cnf.to_clause_form()
+    if len(clauses) != 1:
+        return None
+
+    clause, = clauses
+    if len(clause) != 1:
+        return None
+
+    literal, = clause
+    if not literal.is_equality():
+        return None
+
+    s, t = literal.children
+    return s, t
+
+
+def _make_formula(s: Node, t: Node) -> Node:
+    rv = Node(type_=syntax.PREDICATE, value=syntax.EQUALITY, children=[s, t])
+    for name in reversed(_variables(rv)):
+        quant = syntax.make_quantifier(syntax.UNIVERSAL_QUANTIFIER, name)
+        rv = syntax.make_formula(quant, [rv])
+    return rv
+
+
+def _parse_term(s: str) -> Node:
+    return grammar.parse(s,
+                         _allow_private_symbols=True,
+                         _allow_partial_expression=True)
+
+
+# Rewriting
+# -----------------------------------------------------------------------------
+
+def _normalize(node: Node, rules: List[Rule]) -> Node:
+    """Rewrites the node innermost-first until no rule applies."""
+
+    if node.is_variable():
+        return node
+
+    children = [_normalize(k, rules) for k in node.children]
+    node = node._replace(children=children)
+
+    if _is_term(node):
+        for rule in rules:
+            try:
+                subst = unification.match(rule.lhs, node)
+            except unification.NotUnifiable:
+                continue
+            return _normalize(rule.rhs.apply(subst), rules)
+
+    return node
+
+
+def _is_reducible(node: Node, rule: Rule) -> bool:
+    for k in _subterms(node):
+        try:
+            unification.match(rule.lhs, k)
+        except unification.NotUnifiable:
+            continue
+        return True
+    return False
+
+
+# Critical Pairs
+# -----------------------------------------------------------------------------
+
+def _critical_pairs(r1: Rule, r2: Rule) -> List[T_Equation]:
+    """:returns: Equations arising from overlapping left-hand side of `r2`
+    into left-hand side of `r1`."""
+
+    same = r1 == r2
+    r2 = _rename_rule(r2, 'y')
+    rv = []
+
+    for path in _positions(r1.lhs):
+        if not path and same:
+            continue  # trivial overlap of a rule with itself
+
+        try:
+            subst = unification.unify(_get_at(r1.lhs, path), r2.lhs)
+        except unification.NotUnifiable:
+            continue
+
+        s = r1.rhs.apply(subst)
+        t = _replace_at(r1.lhs, path, r2.rhs).apply(subst)
+        if s != t:
+            rv.append((s, t))
+
+    return rv
+
+
+def _positions(node: Node, path: tuple = ()) -> Iterable[tuple]:
+    """Yields paths to all non-variable subterms."""
+
+    if node.is_variable():
+        return
+    yield path
+    for i, k in enumerate(node.children):
+        yield from _positions(k, (*path, i))
+
+
+def _get_at(node: Node, path: tuple) -> Node:
+    for i in path:
+        node = node.children[i]
+    return node
+
+
+def _replace_at(node: Node, path: tuple, new: Node) -> Node:
+    if not path:
+        return new
+    i, *rest = path
+    children = list(node.children)
+    children[i] = _replace_at(children[i], tuple(rest), new)
+    return node._replace(children=children)
+
+
+# Ordering
+# -----------------------------------------------------------------------------
+
+def _precedence_key(precedence: List[str]):
+    ranks = {k: len(precedence) - i for i, k in enumerate(precedence)}
+
+    def key(node: Node) -> tuple:
+        return ranks.get(node.value, 0), len(node.children), node.value
+
+    return key
+
+
+def _greater(s: Node, t: Node, key) -> bool:
+    """Lexicographic path ordering."""
+
+    if s == t or s.is_variable():
+        return False
+
+    if t.is_variable():
+        return t.value in _variables(s)
+
+    if any(k == t or _greater(k, t, key) for k in s.children):
+        return True
+
+    ks, kt = key(s), key(t)
+    if ks > kt:
+        return all(_greater(s, k, key) for k in t.children)
+    elif ks == kt:
+        for i, (a, b) in enumerate(zip(s.children, t.children)):
+            if a != b:
+                return (_greater(a, b, key)
+                        and all(_greater(s, k, key)
+                                for k in t.children[i + 1:]))
+    return False
+
+
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _is_term(node: Node) -> bool:
+    return node.is_constant() or node.is_variable() or node.is_function()
+
+
+def _subterms(node: Node) -> Iterable[Node]:
+    if _is_term(node):
+        yield node
+    for k in node.children:
+        yield from _subterms(k)
+
+
+def _variables(node: Node) -> List[str]:
+    """:returns: Names of variables in order of their first occurrence."""
+
+    rv = []
+    for k in _subterms(node):
+        if k.is_variable() and k.value not in rv:
+            rv.append(k.value)
+    return rv
+
+
+def _rename_rule(rule: Rule, prefix: str) -> Rule:
+    """Renames variables of the rule to `<prefix>1`, `<prefix>2`, ..."""
+
+    variables = _variables(rule.lhs)
+    variables.extend(k for k in _variables(rule.rhs) if k not in variables)
+
+    names: Dict[str, Node] = {
+        k: syntax.make_variable(f'{prefix}{i}')
+        for i, k in enumerate(variables, 1)
+    }
+    return Rule(rule.lhs.apply(names), rule.rhs.apply(names))
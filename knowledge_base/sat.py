@@ -0,0 +1,318 @@
+"""Conflict-driven clause learning SAT solver.
+
+Literals are non-zero integers (as in DIMACS): `v` stands for the variable `v`
+being true and `-v` for it being false.
+
+The solver uses two watched literals per clause for unit propagation, learns
+first-UIP clauses from conflicts, picks decisions by VSIDS activity with phase
+saving and restarts following the Luby sequence.
+"""
+
+import heapq
+from typing import Callable, Dict, Iterable, List, Optional
+
+T_Clause = List[int]
+
+_RESTART_BASE = 100  # conflicts
+_ACTIVITY_DECAY = 0.95
+
+
+class Solver:
+    """Incremental CDCL solver. (Clauses can be added between `solve`
+    calls.)"""
+
+    def __init__(self):
+        self._clauses: List[T_Clause] = []
+
+        #: Indexes of clauses by the literal they watch.
+        self._watches: Dict[int, List[int]] = {}
+
+        #: Assignment by variable: `1` (true), `-1` (false) or `0`.
+        self._value: List[int] = [0]
+        self._level: List[int] = [0]
+        self._reason: List[Optional[int]] = [None]
+        self._phase: List[int] = [-1]
+
+        self._trail: List[int] = []
+        self._trail_lim: List[int] = []  # trail length by decision level
+        self._qhead = 0  # propagation queue (position in trail)
+
+        self._activity: List[float] = [0.0]
+        self._increment = 1.0
+        self._order: List[tuple] = []  # heap of (-activity, variable)
+
+        self._ok = True  # whether no conflict was found on level 0
+        self._model: Optional[List[bool]] = None
+
+    @property
+    def model(self) -> Optional[List[bool]]:
+        """Values of the variables (indexed from 1) found by the last
+        successful `solve`."""
+
+        return self._model
+
+    def add_clause(self, literals: Iterable[int]) -> bool:
+        """Adds clause.
+
+        :returns: False, if the clauses are unsatisfiable already.
+        """
+
+        self._backtrack(0)
+
+        clause = []
+        for k in literals:
+            self._ensure_variable(abs(k))
+            value = self._get_value(k)
+            if -k in clause or value > 0:
+                return self._ok  # tautology or already satisfied
+            if value == 0 and k not in clause:
+                clause.append(k)
+
+        if not clause:
+            self._ok = False
+        elif len(clause) == 1:
+            self._enqueue(clause[0], None)
+            if self._propagate() is not None:
+                self._ok = False
+        else:
+            self._attach(clause)
+
+        return self._ok
+
+    def solve(self, check: Callable[[], None] = None) -> bool:
+        """:param check: Called on each conflict (e.g. to stop the search by
+            raising an exception).
+        :returns: Whether the clauses are satisfiable."""
+
+        if not self._ok:
+            return False
+
+        restart = 1
+        conflicts = 0
+        limit = _RESTART_BASE * _luby(restart)
+
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                if not self._trail_lim:
+                    self._ok = False
+                    return False
+                if check is not None:
+                    check()
+
+                learnt, level = self._analyze(conflict)
+                self._backtrack(level)
+                if len(learnt) == 1:
+                    self._enqueue(learnt[0], None)
+                else:
+                    self._enqueue(learnt[0], self._attach(learnt))
+                self._increment /= _ACTIVITY_DECAY
+
+                conflicts += 1
+                if conflicts >= limit:
+                    self._backtrack(0)
+                    restart += 1
+                    conflicts = 0
+                    limit = _RESTART_BASE * _luby(restart)
+
+            else:
+                var = self._pick_variable()
+                if var is None:
+                    self._model = [False, *(k > 0 for k in self._value[1:])]
+                    self._backtrack(0)
+                    return True
+
+                self._trail_lim.append(len(self._trail))
+                self._enqueue(var * self._phase[var], None)
+
+    # Propagation
+    # -------------------------------------------------------------------------
+
+    def _attach(self, clause: T_Clause) -> int:
+        idx = len(self._clauses)
+        self._clauses.append(clause)
+        self._watches.setdefault(clause[0], []).append(idx)
+        self._watches.setdefault(clause[1], []).append(idx)
+        return idx
+
+    def _enqueue(self, literal: int, reason: Optional[int]) -> None:
+        var = abs(literal)
+        self._value[var] = 1 if literal > 0 else -1
+        self._level[var] = len(self._trail_lim)
+        self._reason[var] = reason
+        self._trail.append(literal)
+
+    def _propagate(self) -> Optional[int]:
+        """:returns: Index of the conflicting clause (if any)."""
+
+        while self._qhead < len(self._trail):
+            false = -self._trail[self._qhead]
+            self._qhead += 1
+
+            watches = self._watches.get(false, [])
+            kept = []
+            conflict = None
+
+            for i, idx in enumerate(watches):
+                clause = self._clauses[idx]
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], clause[0]
+
+                if self._get_value(clause[0]) > 0:
+                    kept.append(idx)
+                    continue
+
+                for j in range(2, len(clause)):
+                    if self._get_value(clause[j]) >= 0:
+                        clause[1], clause[j] = clause[j], clause[1]
+                        self._watches.setdefault(clause[1], []).append(idx)
+                        break
+                else:
+                    kept.append(idx)
+                    if self._get_value(clause[0]) < 0:
+                        conflict = idx
+                        kept.extend(watches[i + 1:])
+                        break
+                    self._enqueue(clause[0], idx)
+
+            self._watches[false] = kept
+            if conflict is not None:
+                self._qhead = len(self._trail)
+                return conflict
+
+        return None
+
+    # Conflict Analysis
+    # -------------------------------------------------------------------------
+
+    def _analyze(self, conflict: int) -> tuple:
+        """:returns: Learnt (first-UIP) clause with the asserting literal
+        first, and the level to backtrack to."""
+
+        level = len(self._trail_lim)
+        learnt = [0]
+        seen = set()
+        pending = 0
+        literal = None
+        idx = len(self._trail) - 1
+        clause = self._clauses[conflict]
+
+        while True:
+            for k in clause:
+                var = abs(k)
+                if k == literal or var in seen or self._level[var] == 0:
+                    continue
+                seen.add(var)
+                self._bump(var)
+                if self._level[var] == level:
+                    pending += 1
+                else:
+                    learnt.append(k)
+
+            while abs(self._trail[idx]) not in seen:
+                idx -= 1
+            literal = self._trail[idx]
+            idx -= 1
+            seen.discard(abs(literal))
+
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self._clauses[self._reason[abs(literal)]]
+
+        learnt[0] = -literal
+
+        if len(learnt) == 1:
+            return learnt, 0
+
+        # watch the literal from the highest level besides the asserting one
+        i = max(range(1, len(learnt)),
+                key=lambda j: self._level[abs(learnt[j])])
+        learnt[1], learnt[i] = learnt[i], learnt[1]
+        return learnt, self._level[abs(learnt[1])]
+
+    def _backtrack(self, level: int) -> None:
+        if len(self._trail_lim) <= level:
+            return
+
+        for k in self._trail[self._trail_lim[level]:]:
+            var = abs(k)
+            self._phase[var] = self._value[var]
+            self._value[var] = 0
+            self._reason[var] = None
+            heapq.heappush(self._order, (-self._activity[var], var))
+
+        del self._trail[self._trail_lim[level]:]
+        del self._trail_lim[level:]
+        self._qhead = len(self._trail)
+
+    # Decisions
+    # -------------------------------------------------------------------------
+
+    def _pick_variable(self) -> Optional[int]:
+        while self._order:
+            activity, var = heapq.heappop(self._order)
+            if self._value[var] == 0 and -activity == self._activity[var]:
+                return var
+
+        # the heap contains only stale entries - rebuild it
+        free = [k for k in range(1, len(self._value)) if self._value[k] == 0]
+        if not free:
+            return None
+        self._order = [(-self._activity[k], k) for k in free]
+        heapq.heapify(self._order)
+        return self._pick_variable()
+
+    def _bump(self, var: int) -> None:
+        self._activity[var] += self._increment
+        if self._activity[var] > 1e100:
+            self._activity = [k * 1e-100 for k in self._activity]
+            self._increment *= 1e-100
+            self._order = []  # rebuilt lazily
+        elif self._value[var] == 0:
+            heapq.heappush(self._order, (-self._activity[var], var))
+
+    # Helpers
+    # -------------------------------------------------------------------------
+
+    def _ensure_variable(self, var: int) -> None:
+        while len(self._value) <= var:
+            self._value.append(0)
+            self._level.append(0)
+            self._reason.append(None)
+            self._phase.append(-1)
+            self._activity.append(0.0)
+            heapq.heappush(self._order, (0.0, len(self._value) - 1))
+
+    def _get_value(self, literal: int) -> int:
+        value = self._value[abs(literal)]
+        return value if literal > 0 else -value
+
+
+def solve(clauses: Iterable[Iterable[int]]) -> Optional[List[bool]]:
+    """Decides satisfiability of the clauses.
+
+    :returns: Values of the variables (indexed from 1), if the clauses are
+    satisfiable.
+    """
+
+    solver = Solver()
+    for k in clauses:
+        if not solver.add_clause(k):
+            return None
+    return solver.model if solver.solve() else None
+
+
+def _luby(i: int) -> int:
+    """:returns: `i`-th element (indexed from 1) of the Luby sequence."""
+
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while True:
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
@@ -0,0 +1,111 @@
+"""Timeline of the proof search in Chrome trace format.
+
+Tracing is opt-in. Spans (e.g. passes of the CNF conversion, or iterations of
+the given-clause loop) are recorded only within the `trace` context manager,
+and the recorded trace can be opened in Perfetto or `chrome://tracing`:
+
+    with tracing.trace('trace.json'):
+        kb.prove(f)
+
+The tracer is held by a context variable, so that it follows the code into
+the executor threads (when the context is copied), but not into the worker
+processes.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Tracer:
+    """Records spans in Chrome trace format."""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    def add_span(self, name: str, category: str,
+                 start: float, end: float,
+                 args: Dict[str, Any] = None) -> None:
+        """Records a span.
+
+        :param start: Start of the span (as measured by `time.perf_counter`).
+        :param end: End of the span (as measured by `time.perf_counter`).
+        :param args: Details of the span.
+        """
+
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': start * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **args) -> Iterator[None]:
+        """Records a span of the code within the context."""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, time.perf_counter(), args)
+
+    def dumps(self) -> str:
+        return json.dumps({'traceEvents': self.events,
+                           'displayTimeUnit': 'ms'})
+
+    def dump(self, path: str) -> None:
+        with open(path, 'w') as fp:
+            fp.write(self.dumps())
+
+
+_tracer: contextvars.ContextVar = contextvars.ContextVar('tracer',
+                                                         default=None)
+
+
+def get_tracer() -> Optional[Tracer]:
+    """:returns: Current tracer (None if tracing is disabled)."""
+
+    return _tracer.get()
+
+
+@contextlib.contextmanager
+def trace(path: str = None) -> Iterator[Tracer]:
+    """Enables tracing within the context.
+
+    :param path: Path to the file where the trace is written when the context
+        exits.
+    :returns: Tracer.
+    """
+
+    tracer = Tracer()
+    token = _tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _tracer.reset(token)
+        if path:
+            tracer.dump(path)
+
+
+@contextlib.contextmanager
+def span(name: str, category: str, **args) -> Iterator[None]:
+    """Records a span of the code within the context (if tracing is
+    enabled)."""
+
+    tracer = _tracer.get()
+    if tracer is None:
+        yield
+    else:
+        with tracer.span(name, category, **args):
+            yield
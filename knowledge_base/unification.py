@@ -46,6 +46,42 @@ def unify(p: syntax.Node, q: syntax.Node) -> syntax.T_Substitution:
             return rv
 
 
+def match(pattern: syntax.Node,
+          node: syntax.Node,
+          subst: syntax.T_Substitution = None) -> syntax.T_Substitution:
+    """One-way unification: Finds substitution for variables in `pattern`
+    which makes it equal to `node`. (Variables in `node` are treated as
+    constants.)
+
+    :param subst: Bindings the substitution has to be consistent with.
+    :raises NotUnifiable: If there is no such substitution.
+    """
+
+    rv = dict(subst) if subst else {}
+    _match(pattern, node, rv)
+    return rv
+
+
+def _match(pattern: syntax.Node,
+           node: syntax.Node,
+           subst: syntax.T_Substitution) -> None:
+    if pattern.is_variable():
+        bound = subst.get(pattern.value)
+        if bound is None:
+            subst[pattern.value] = node
+        elif bound != node:
+            raise NotUnifiable()
+        return
+
+    if (pattern.type_ != node.type_
+            or pattern.value != node.value
+            or len(pattern.children) != len(node.children)):
+        raise NotUnifiable()
+
+    for p, n in zip(pattern.children, node.children):
+        _match(p, n, subst)
+
+
 def compose(*args: syntax.T_Substitution) -> syntax.T_Substitution:
     rv = {}
     for k in args:
@@ -1,5 +1,6 @@
 import itertools
-from typing import List
+import sys
+from typing import List, Set
 
 
 def incrementdefault(obj: dict, key, default: int = 0) -> int:
@@ -32,6 +33,34 @@ def appenddefault(obj: dict, key, val, default: list = None) -> list:
     return arr
 
 
+def getsizeof(obj, seen: Set[int] = None) -> int:
+    """:returns: Number of bytes taken by the object and by the objects it
+    contains (in tuples, lists, sets, dicts and attributes).
+
+    Objects whose ids are in `seen` are not counted. The ids of the counted
+    ones are added to it, so that objects shared by several structures are
+    counted only once.
+    """
+
+    seen = set() if seen is None else seen
+    rv = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        rv += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (tuple, list, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(vars(obj))
+    return rv
+
+
 def justify_table(table: List[list], fillchar=" ", separator="\t") -> str:
     """:returns: String representation of the table with justified cells."""
 
@@ -1,40 +1,951 @@
 import argparse
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import itertools
 import logging
-from typing import List
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import tracemalloc
+from typing import (
+    Any, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional,
+    Tuple,
+)
 
 import pyparsing as pp
 
-from knowledge_base import grammar, inference, syntax
+from knowledge_base import (
+    datalog, grammar, horn, inference, planner, profiling, relevance,
+    rewriting, syntax, tracing,
+)
 
 pp.ParserElement.enablePackrat()
 
+_log = logging.getLogger()
+
+# Seconds between checks whether portfolio proof was cancelled.
+_POLL_INTERVAL = 0.01
+
+# How to answer queries while the knowledge base contains only Horn clauses:
+# Either by lookups into materialization, which is maintained as the axioms
+# are added, or goal-directed by tabled SLD resolution. Datalog modes support
+# only function-free Horn clauses, but materialize them into compact columnar
+# relations (either upfront, or per query by magic sets rewriting).
+FORWARD_CHAINING = 'Forward'
+BACKWARD_CHAINING = 'Backward'
+DATALOG = 'Datalog'
+GOAL_DIRECTED_DATALOG = 'GoalDirectedDatalog'
+
 
 class KnowledgeBase:
-    def __init__(self, facts: List[syntax.Node] = None):
-        self._facts = facts or []
+    def __init__(self,
+                 facts: List[syntax.Node] = None,
+                 horn_mode: str = FORWARD_CHAINING,
+                 strategies: List[inference.Strategy] = None,
+                 workers: int = 0,
+                 limits: inference.Limits = None,
+                 observers: List[inference.Observer] = None,
+                 cache_size: int = 128,
+                 max_lemma_clauses: int = 256,
+                 relevance_filter: relevance.Filter = None):
+        """
+        :param workers: Number of worker processes generating inferences of
+            each proof. (0 to generate them in this process.)
+        :param limits: Default limits of each proof.
+        :param observers: Observers of the inference of each proof. (In
+            portfolio proofs they observe every strategy in its process.)
+        :param cache_size: Maximum number of cached results of the proofs.
+            (0 to disable the cache.)
+        :param max_lemma_clauses: Maximum number of clauses retained from
+            the proofs of the lemmas. (They are premises of the later proofs,
+            thus these don't need to infer them again.)
+        :param relevance_filter: Selection of the axioms relevant to each
+            proof by the saturation. (None to use all axioms.) If the proof
+            from the selected axioms fails, it falls back to the axioms
+            transitively related to the formula, and then to all of them.
+            (The proofs share the timeout, and the result carries statistics
+            of the last one.)
+        """
+
+        self._facts = []
+        self._clauses = inference.Premises([], [], {})  # clausified facts
+        self._premises: inference.Premises = None  # with the lemma clauses
+        self._rewrite_system: rewriting.RewriteSystem = None
+        self._rewritten: inference.Premises = None  # normalized facts
+
+        # Seconds spent by clausifying the facts since the last proof (which
+        # counts them in its statistics).
+        self._cnf_time = 0.0
+
+        # Clauses inferred by the proofs of the lemmas (oldest first). (None
+        # of them subsumes the other one, nor is subsumed by the facts.)
+        self._lemma_clauses = []
+        self._max_lemma_clauses = max_lemma_clauses
+
+        # Facts by their symbols, and positions of the clauses of each fact.
+        self._relevance_index = relevance.Index()
+        self._relevance_filter = relevance_filter
+        self._fact_clauses: List[Tuple[int, int]] = []
+
+        # Statistics of the materialized atoms for ordering joins. (Updated
+        # by the materialization as the axioms are added.)
+        self._statistics = planner.Statistics()
+
+        # (None as soon as the knowledge base contains non-Horn clauses)
+        if horn_mode == FORWARD_CHAINING:
+            self._horn = horn.ForwardChainer(statistics=self._statistics)
+        elif horn_mode == BACKWARD_CHAINING:
+            self._horn = horn.BackwardChainer()
+        elif horn_mode == DATALOG:
+            self._horn = datalog.Database(statistics=self._statistics)
+        elif horn_mode == GOAL_DIRECTED_DATALOG:
+            self._horn = datalog.Database(goal_directed=True,
+                                          statistics=self._statistics)
+        else:
+            raise ValueError("Provided 'horn_mode' is not valid")
+
+        # Held while the engine is changed or queried, since its tables are
+        # not thread-safe (e.g. proofs of `search_async` run in the executor).
+        # (Reentrant, so that the thread consuming answers of `query_iter`
+        # can use the knowledge base meanwhile.)
+        self._horn_lock = threading.RLock()
+
+        # Strategies raced by portfolio proofs, and how many proofs each of
+        # them won.
+        self._strategies = strategies or inference.PORTFOLIO
+        self._wins = {k.name: 0 for k in self._strategies}
+        self._workers = workers
+        self._limits = limits or inference.NO_LIMITS
+        self._observers = observers or []
+        self._last_statistics = inference.Statistics()
+        self._last_proof = None
+
+        # Results of the proofs by canonical forms of the formulas (least
+        # recently used first), together with versions of the facts they
+        # were decided by. (The version is bumped by each added fact.)
+        self._version = 0
+        self._cache = collections.OrderedDict()
+        self._cache_size = cache_size
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        for f in facts or []:
+            self._add_fact(f)
+
+    def __getstate__(self):
+        # (e.g. copies for worker processes of batches)
+        state = self.__dict__.copy()
+        del state['_horn_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._horn_lock = threading.RLock()
 
     @property
     def facts(self) -> List[syntax.Node]:
         return self._facts
 
+    @property
+    def statistics(self) -> planner.Statistics:
+        return self._statistics
+
+    @property
+    def last_statistics(self) -> inference.Statistics:
+        """:returns: Statistics of the last proof."""
+
+        return self._last_statistics
+
+    @property
+    def last_proof(self) -> Optional[inference.Proof]:
+        """:returns: Proof of the last formula (None if it wasn't proved by
+        the saturation)."""
+
+        return self._last_proof
+
+    @property
+    def strategy_wins(self) -> Dict[str, int]:
+        """:returns: Number of portfolio proofs won by each strategy."""
+
+        return dict(self._wins)
+
+    @property
+    def cache_info(self) -> Dict[str, int]:
+        """:returns: Numbers of cache hits and misses, and number of the
+        cached results."""
+
+        return {
+            'hits': self._cache_hits,
+            'misses': self._cache_misses,
+            'size': len(self._cache),
+        }
+
+    @property
+    def lemma_clauses(self) -> List[FrozenSet[syntax.Node]]:
+        """:returns: Clauses retained from the proofs of the lemmas."""
+
+        return self._lemma_clauses
+
     def _add_fact(self, f: syntax.Node):
+        # (clausified once, the clauses of the other facts are kept)
+        n = len(self._clauses.clauses)
+        start = time.perf_counter()
+        self._clauses = inference.add_premises(self._clauses, [f])
+        self._cnf_time += time.perf_counter() - start
+        self._fact_clauses.append((n, len(self._clauses.clauses)))
+        self._relevance_index.add(f)
         self._facts.append(f)
+        self._premises = None
+        self._rewritten = None
+        self._version += 1
+
+        with self._horn_lock:
+            if self._horn is not None:
+                clauses = self._clauses.clauses[n:]
+                if self._horn.supports(clauses):
+                    try:
+                        self._horn.add_clauses(clauses)
+                    except horn.Unsupported:
+                        self._horn = None  # (falls back to the saturation)
+                else:
+                    self._horn = None
 
     def add_axiom(self, f: syntax.Node):
         self._add_fact(f)
 
     def add_lemma(self, f: syntax.Node) -> bool:
-        if self.prove(f):
-            self._add_fact(f)
-            return True
-        else:
+        """Adds the formula if it is entailed by the facts.
+
+        Clauses inferred from the facts alone by its proof are retained as
+        well (see `max_lemma_clauses`).
+
+        :returns: Whether the formula was proved.
+        """
+
+        rv = self.search(f)
+        if rv.status != inference.PROVED:
             return False
 
-    def prove(self, f: syntax.Node) -> bool:
-        return inference.infer(self._facts, f) is not None
+        self._add_fact(f)
+        if rv.proof is not None:
+            self._add_lemma_clauses(rv.proof.get_lemmas())
+        return True
+
+    def _add_lemma_clauses(self, clauses: List[FrozenSet[syntax.Node]]):
+        for c in clauses:
+            if any(inference.subsumes(k, c)
+                   for k in itertools.chain(self._clauses.clauses,
+                                            self._lemma_clauses)):
+                continue  # redundant
+            self._lemma_clauses = [k for k in self._lemma_clauses
+                                   if not inference.subsumes(c, k)]
+            self._lemma_clauses.append(c)
+
+        # (drops the oldest ones)
+        del self._lemma_clauses[:-self._max_lemma_clauses or None]
+        self._premises = None
+
+    @property
+    def rewrite_system(self) -> rewriting.RewriteSystem:
+        return self._rewrite_system
+
+    def complete(self, cache: str = None) -> rewriting.RewriteSystem:
+        """Runs Knuth-Bendix completion on the equational axioms.
+
+        Subsequent proofs normalize formulas with the resulting rewrite rules
+        instead of paramodulating with the equational axioms.
+
+        :param cache: Path to the file with previously completed system. It is
+            reused if it was completed from the same equational axioms, and
+            (re)written otherwise.
+        :returns: Completed system.
+        :raises rewriting.CompletionError: If the completion fails.
+        """
+
+        rs = None
+        if cache and os.path.exists(cache):
+            with open(cache) as fp:
+                rs = rewriting.RewriteSystem.loads(fp.read())
+            if not rs.is_up_to_date(self._facts):
+                rs = None
+
+        if rs is None:
+            rs = rewriting.complete(self._facts)
+            if cache:
+                with open(cache, 'w') as fp:
+                    fp.write(rs.dumps(indent=2))
+
+        self._rewrite_system = rs
+        self._rewritten = None
+        self._get_rewritten_premises()
+        return rs
+
+    def prove(self, f: syntax.Node,
+              portfolio: bool = False,
+              limits: inference.Limits = None) -> bool:
+        """:returns: Whether the formula is entailed. (False also if it is
+        not decided within the limits, see `search`.)"""
+
+        rv = self.search(f, portfolio=portfolio, limits=limits)
+        return rv.status == inference.PROVED
+
+    def prove_many(self,
+                   formulas: Iterable[syntax.Node],
+                   limits: inference.Limits = None) \
+            -> Iterator[Tuple[int, bool]]:
+        """Proves several formulas at once.
+
+        Formulas which can't be answered by the Horn clauses are decided by a
+        single saturation of the knowledge base, which is thus clausified and
+        saturated only once for all of them.
+
+        :param limits: Limits of the whole saturation.
+        :returns: Index of each formula and whether it is entailed, in order
+            in which the formulas are decided.
+        """
+
+        formulas = list(formulas)
+        pending = []
+
+        for i, f in enumerate(formulas):
+            rv = self._search_horn(f, inference.NO_LIMITS, None)
+            if rv is None:
+                pending.append(i)
+            else:
+                yield i, rv.status == inference.PROVED
+
+        if pending:
+            premises = self._get_premises()
+            cnf_time = self._take_cnf_time()
+            for i, rv in inference.search_many(
+                    premises,
+                    [formulas[k] for k in pending],
+                    workers=self._workers,
+                    limits=limits or self._limits,
+                    observers=self._observers):
+                # (the results share the statistics)
+                rv.statistics.cnf_time += cnf_time
+                cnf_time = 0.0
+                self._last_statistics = rv.statistics
+                self._last_proof = rv.proof
+                yield pending[i], rv.status == inference.PROVED
+
+    def query(self, f: syntax.Node,
+              portfolio: bool = False,
+              limits: inference.Limits = None) -> syntax.T_Substitution:
+        """:returns: Substitution for variables of the formula, if it is
+        entailed. (None also if it is not decided within the limits, see
+        `search`.)"""
+
+        return self.search(f, portfolio=portfolio, limits=limits).substitution
+
+    def query_iter(self, f: syntax.Node,
+                   limit: int = None,
+                   timeout: float = None,
+                   limits: inference.Limits = None) \
+            -> Iterator[syntax.T_Substitution]:
+        """Finds distinct substitutions for variables of the formula (e.g.
+        every `x` such that `hate(x, Caesar)`).
+
+        :param limit: Maximum number of the answers.
+        :param timeout: Maximum number of seconds spent by finding each
+            answer.
+        :param limits: Limits of the whole saturation. (Default limits of the
+            knowledge base if not provided.)
+        :returns: Answers, as they're found.
+        :raises inference.Cancelled: If the proof is cancelled.
+        """
+
+        answers = self._query_iter(f, timeout, limits)
+        try:
+            for i, subst in enumerate(itertools.islice(answers, limit), 1):
+                if i == limit:
+                    # (releases the budget of the search before the last
+                    # answer is consumed, since it's not needed anymore)
+                    answers.close()
+                yield subst
+        finally:
+            answers.close()
+
+    def search(self, f: syntax.Node,
+               portfolio: bool = False,
+               limits: inference.Limits = None,
+               cancel: threading.Event = None) -> inference.Result:
+        """Decides whether the formula is entailed.
+
+        :param portfolio: Whether to race all strategies in separate
+            processes (instead of running the default one). The first proof
+            wins and the other strategies are terminated.
+        :param limits: Limits of the proof. (Default limits of the knowledge
+            base if not provided.) If the proof runs out of them, the result
+            is UNKNOWN and carries statistics of the search so far.
+        :param cancel: Event (set e.g. by another thread) which stops the
+            proof.
+        :returns: Result of the proof. (Results of formulas decided already,
+            up to renaming of their variables, are cached.)
+        :raises inference.Cancelled: If the proof is cancelled.
+        """
+
+        key = _canonicalize(f)
+        rv = self._get_cached(key)
+        if rv is None:
+            rv = self._decide(f, portfolio, limits or self._limits, cancel)
+            self._cache_result(key, rv)
+
+        self._last_statistics = rv.statistics
+        self._last_proof = rv.proof
+        return rv
+
+    async def prove_async(self, f: syntax.Node,
+                          portfolio: bool = False,
+                          limits: inference.Limits = None) -> bool:
+        """(See `prove` and `search_async`.)"""
+
+        rv = await self.search_async(f, portfolio=portfolio, limits=limits)
+        return rv.status == inference.PROVED
+
+    async def query_async(self, f: syntax.Node,
+                          portfolio: bool = False,
+                          limits: inference.Limits = None) \
+            -> syntax.T_Substitution:
+        """(See `query` and `search_async`.)"""
+
+        rv = await self.search_async(f, portfolio=portfolio, limits=limits)
+        return rv.substitution
+
+    async def search_async(self, f: syntax.Node,
+                           portfolio: bool = False,
+                           limits: inference.Limits = None) \
+            -> inference.Result:
+        """Decides whether the formula is entailed without blocking the event
+        loop.
+
+        The proof (by the Horn clauses or the saturation) runs in the default
+        executor of the loop. Cancelling the awaiting task cancels the proof
+        as well. (See `search`.)
+        """
+
+        key = _canonicalize(f)
+        rv = self._get_cached(key)
+        if rv is None:
+            self._get_premises()
+            cancel = threading.Event()
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()  # (e.g. with the tracer)
+            future = loop.run_in_executor(None, context.run, self._decide,
+                                          f, portfolio,
+                                          limits or self._limits, cancel)
+            try:
+                rv = await future
+            except asyncio.CancelledError:
+                cancel.set()
+                raise
+            self._cache_result(key, rv)
+
+        self._last_statistics = rv.statistics
+        self._last_proof = rv.proof
+        return rv
+
+    def check_proof(self, f: syntax.Node, proof: inference.Proof) -> bool:
+        """:returns: Whether the proof of the formula is valid in the
+        knowledge base (e.g. after adding axioms since it was found). (See
+        `inference.check_proof`.) Proofs from the facts normalized by the
+        rewrite system (see `complete`) are replayed from them."""
+
+        if inference.check_proof(self._get_premises(), f, proof):
+            return True
+
+        rs = self._rewrite_system
+        return (rs is not None
+                and inference.check_proof(self._get_rewritten_premises(),
+                                          rs.normalize(f), proof))
+
+    def _query_iter(self, f: syntax.Node,
+                    timeout: Optional[float],
+                    limits: Optional[inference.Limits]) \
+            -> Iterator[syntax.T_Substitution]:
+        seen = set()
+
+        # (held until the answers of the engine are consumed)
+        with self._horn_lock:
+            if self._horn is not None:
+                statistics = inference.Statistics()
+                try:
+                    with inference.Budget(limits or self._limits,
+                                          statistics) as budget:
+                        budget.restart_answer_timeout(timeout)
+                        for subst in self._horn.query(f, budget.check):
+                            seen.add(frozenset(subst.items()))
+                            yield subst
+                            budget.restart_answer_timeout(timeout)
+                except horn.Unsupported:
+                    pass
+                except inference.ResourceExhausted:
+                    return
+                else:
+                    if self._horn.is_complete():
+                        return
+
+        for subst in inference.infer_all(self._get_premises(), f,
+                                         workers=self._workers,
+                                         limits=limits or self._limits,
+                                         answer_timeout=timeout,
+                                         observers=self._observers):
+            key = frozenset(subst.items())
+            if key not in seen:
+                seen.add(key)
+                yield subst
+
+    def _get_cached(self, key: Optional[Tuple[str, Dict[str, str]]]) \
+            -> Optional[inference.Result]:
+        if not self._cache_size or key is None:
+            return None
+
+        canonical, names = key
+        try:
+            version, rv = self._cache[canonical]
+        except KeyError:
+            self._cache_misses += 1
+            return None
+
+        # Facts are only added, thus proved formulas stay proved, but the
+        # others might be proved by the new facts.
+        if rv.status != inference.PROVED and version != self._version:
+            del self._cache[canonical]
+            self._cache_misses += 1
+            return None
+
+        self._cache.move_to_end(canonical)
+        self._cache_hits += 1
+
+        subst = rv.substitution
+        if subst is not None:
+            inverse = {v: k for k, v in names.items()}
+            subst = {inverse.get(k, k): v for k, v in subst.items()}
+        return rv._replace(substitution=subst,
+                           statistics=inference.Statistics())
+
+    def _cache_result(self, key: Optional[Tuple[str, Dict[str, str]]],
+                      rv: inference.Result) -> None:
+        if not self._cache_size or key is None:
+            return
+        if rv.status == inference.UNKNOWN:
+            return  # (depends on the limits)
+
+        canonical, names = key
+        subst = rv.substitution
+        if subst is not None:
+            subst = {names.get(k, k): v for k, v in subst.items()}
+
+        self._cache[canonical] = (self._version,
+                                  rv._replace(substitution=subst))
+        self._cache.move_to_end(canonical)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _decide(self, f: syntax.Node,
+                portfolio: bool,
+                limits: inference.Limits,
+                cancel: Optional[threading.Event]) -> inference.Result:
+        # (the stages share the timeout)
+        deadline = _get_deadline(limits)
+
+        rv = self._search_horn(f, limits, cancel)
+        if rv is None:
+            rv = self._saturate(f, portfolio, limits, deadline, cancel)
+        rv.statistics.cnf_time += self._take_cnf_time()
+        return rv
+
+    def _search_horn(self, f: syntax.Node,
+                     limits: inference.Limits,
+                     cancel: Optional[threading.Event]) \
+            -> Optional[inference.Result]:
+        with self._horn_lock:
+            if self._horn is None:
+                return None
+
+            statistics = inference.Statistics()
+            try:
+                with tracing.span('query', 'horn'), \
+                        inference.Budget(limits, statistics,
+                                         cancel) as budget:
+                    rv = self._query_horn(f, budget.check)
+            except horn.Unsupported:
+                return None
+            except inference.ResourceExhausted as e:
+                statistics.exhausted = str(e)
+                return inference.Result(inference.UNKNOWN, None, statistics)
+
+        status = inference.DISPROVED if rv is None else inference.PROVED
+        return inference.Result(status, rv, statistics)
+
+    def _saturate(self, f: syntax.Node,
+                  portfolio: bool,
+                  limits: inference.Limits,
+                  deadline: Optional[float],
+                  cancel: Optional[threading.Event]) -> inference.Result:
+        rs = self._rewrite_system
+        if rs is not None:
+            premises = self._get_rewritten_premises()
+            if premises.formulas:
+                rv = inference.search(premises, rs.normalize(f),
+                                      workers=self._workers,
+                                      limits=_get_remaining(limits, deadline),
+                                      cancel=cancel,
+                                      observers=self._observers)
+                if rv.status == inference.PROVED or _is_past(deadline):
+                    return rv
+
+            # Normalization is sound, but without unification modulo the
+            # rewrite rules it can miss proofs where variables need to be
+            # instantiated into reducible terms. Fall back to paramodulation.
+
+        if self._relevance_filter is not None:
+            for premises in self._get_relevant_premises(f):
+                rv = self._search_premises(premises, f, portfolio,
+                                           _get_remaining(limits, deadline),
+                                           cancel)
+                if rv.status == inference.PROVED or _is_past(deadline):
+                    return rv
+
+            # Failed proof from the selected axioms doesn't decide anything,
+            # since it might need the other ones.
+
+        return self._search_premises(self._get_premises(), f, portfolio,
+                                     _get_remaining(limits, deadline),
+                                     cancel)
+
+    def _search_premises(self, premises: inference.Premises,
+                         f: syntax.Node,
+                         portfolio: bool,
+                         limits: inference.Limits,
+                         cancel: Optional[threading.Event]) \
+            -> inference.Result:
+        if portfolio:
+            return self._search_portfolio(premises, f, limits, cancel)
+
+        return inference.search(premises, f,
+                                workers=self._workers,
+                                limits=limits,
+                                cancel=cancel,
+                                observers=self._observers)
+
+    def _get_relevant_premises(self, f: syntax.Node) \
+            -> Iterator[inference.Premises]:
+        # (increasingly larger selections, except of all the facts)
+        filters = [self._relevance_filter,
+                   self._relevance_filter._replace(depth=None)]
+        previous = 0
+
+        for k in filters:
+            selected = self._relevance_index.select(f, k)
+            if previous < len(selected) < len(self._facts):
+                previous = len(selected)
+                yield self._select_premises(sorted(selected))
+
+    def _select_premises(self, facts: List[int]) -> inference.Premises:
+        # (lemma clauses are kept, they are few and entailed by the facts)
+        clauses = self._clauses.clauses
+        return self._clauses._replace(
+            formulas=[self._facts[i] for i in facts],
+            clauses=[*(clauses[j]
+                       for i in facts
+                       for j in range(*self._fact_clauses[i])),
+                     *self._lemma_clauses])
+
+    def _search_portfolio(self, premises: inference.Premises,
+                          f: syntax.Node,
+                          limits: inference.Limits,
+                          cancel: Optional[threading.Event]) \
+            -> inference.Result:
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(
+            target=_run_strategy,
+            args=(premises, f, k, limits, self._observers, results),
+            daemon=True)
+            for k in self._strategies]
+        for k in processes:
+            k.start()
+
+        try:
+            rv = unknown = None
+            pending = {k.name: p for k, p in zip(self._strategies, processes)}
+            while pending:
+                name, rv = _get_result(results, pending, cancel)
+                del pending[name]
+                if rv.status == inference.PROVED:
+                    self._wins[name] += 1
+                    return rv
+                if rv.status == inference.UNKNOWN:
+                    unknown = rv
+
+            # disproved only if every strategy saturated
+            return unknown or rv
+
+        finally:
+            for k in processes:
+                if k.is_alive():
+                    k.terminate()
+                k.join()
+
+    def _get_rewritten_premises(self) -> inference.Premises:
+        # (normalized by the rewrite system, except of the axioms it was
+        # completed from)
+        if self._rewritten is None:
+            rs = self._rewrite_system
+            premises = [rs.normalize(k) for k in self._facts
+                        if str(k) not in rs.axioms]
+            premises.extend(rs.get_equations())
+            start = time.perf_counter()
+            self._rewritten = inference.clausify(premises)
+            self._cnf_time += time.perf_counter() - start
+        return self._rewritten
+
+    def _get_premises(self) -> inference.Premises:
+        if self._premises is None:
+            self._premises = self._clauses._replace(
+                clauses=[*self._clauses.clauses, *self._lemma_clauses])
+        return self._premises
+
+    def _take_cnf_time(self) -> float:
+        rv = self._cnf_time
+        self._cnf_time = 0.0
+        return rv
+
+    def _query_horn(self, f: syntax.Node,
+                    check: horn.T_Check = None) -> syntax.T_Substitution:
+        for subst in self._horn.query(f, check):
+            return subst
+
+        if not self._horn.is_complete():
+            raise horn.Unsupported("Some answers might be missing")
+
+        return None
+
+    def prove_batch(self, formulas: Iterable[syntax.Node],
+                    **kwargs) -> Iterator['BatchResult']:
+        """Proves formulas independently of each other in parallel.
+
+        (See `run_batch`. Values of the results are results of `prove`.)
+        """
+
+        return self.run_batch('prove', formulas, **kwargs)
 
-    def query(self, f: syntax.Node) -> syntax.T_Substitution:
-        return inference.infer(self._facts, f)
+    def query_batch(self, formulas: Iterable[syntax.Node],
+                    **kwargs) -> Iterator['BatchResult']:
+        """Queries formulas independently of each other in parallel.
+
+        (See `run_batch`. Values of the results are results of `query`.)
+        """
+
+        return self.run_batch('query', formulas, **kwargs)
+
+    def run_batch(self, method: str,
+                  formulas: Iterable[syntax.Node],
+                  max_workers: int = None,
+                  timeout: float = None,
+                  ordered: bool = True) -> Iterator['BatchResult']:
+        """Calls the method on each formula in pool of worker processes.
+
+        Every worker receives a copy of the knowledge base (with the facts
+        clausified already) once when it starts, the tasks carry only the
+        formulas.
+
+        :param method: Either 'prove' or 'query'.
+        :param max_workers: Number of worker processes. (Number of CPUs by
+            default.)
+        :param timeout: Maximum number of seconds for each formula.
+        :param ordered: Whether to yield results in order of the formulas.
+            Otherwise they are yielded as they complete.
+        :returns: Results of the method.
+        """
+
+        if method not in ('prove', 'query'):
+            raise ValueError("Provided 'method' is not valid")
+
+        formulas = list(formulas)
+        self._get_premises()
+
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(self,)) as executor:
+            futures = {executor.submit(_run_task, method, f, timeout): i
+                       for i, f in enumerate(formulas)}
+
+            if ordered:
+                done = futures
+            else:
+                done = concurrent.futures.as_completed(futures)
+
+            try:
+                for future in done:
+                    value, timed_out = future.result()
+                    yield BatchResult(futures[future], value, timed_out)
+            finally:
+                # (e.g. the results are not consumed anymore)
+                executor.shutdown(cancel_futures=True)
+
+
+class BatchResult(NamedTuple):
+    #: Position of the formula in the batch.
+    index: int
+
+    #: Return value of the method (None if it timed out).
+    value: Any
+
+    timed_out: bool
+
+
+# Cache
+# -----------------------------------------------------------------------------
+
+def _canonicalize(f: syntax.Node) -> Optional[Tuple[str, Dict[str, str]]]:
+    """:returns: The formula with quantified variables renamed in order of
+    their quantifiers (i.e. the same string for formulas which differ only
+    in names of the quantified variables), and the new names of the
+    variables. (None if a name is quantified more than once, or is also
+    free.)"""
+
+    names = {}
+    free = set()
+
+    def rename(node: syntax.Node, scope: Dict[str, str]) -> syntax.Node:
+        if node.is_quantified():
+            old = node.get_quantified_variable().value
+            if old in names:
+                raise _Ambiguous()
+            new = names[old] = f"_{len(names)}"
+            quant = syntax.make_quantifier(node.get_quantifier_type(), new)
+            scope = dict(scope, **{old: new})
+            return syntax.make_formula(quant, [rename(k, scope)
+                                               for k in node.children])
+
+        if node.is_variable():
+            if node.value not in scope:
+                free.add(node.value)
+            return syntax.make_variable(scope.get(node.value, node.value))
+
+        return node._replace(children=[rename(k, scope)
+                                       for k in node.children])
+
+    try:
+        rv = rename(f, {})
+    except _Ambiguous:
+        return None
+    if free & set(names):
+        return None
+    return str(rv), names
+
+
+class _Ambiguous(Exception):
+    pass
+
+
+# Limits
+# -----------------------------------------------------------------------------
+
+def _get_deadline(limits: inference.Limits) -> Optional[float]:
+    return (time.monotonic() + limits.timeout
+            if limits.timeout is not None
+            else None)
+
+
+def _get_remaining(limits: inference.Limits,
+                   deadline: Optional[float]) -> inference.Limits:
+    """:returns: The limits with timeout of the time left until the
+    deadline."""
+
+    if deadline is None:
+        return limits
+    return limits._replace(timeout=max(0.0, deadline - time.monotonic()))
+
+
+def _is_past(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+# Worker Processes
+# -----------------------------------------------------------------------------
+
+def _run_strategy(premises: inference.Premises,
+                  f: syntax.Node,
+                  strategy: inference.Strategy,
+                  limits: inference.Limits,
+                  observers: List[inference.Observer],
+                  results: multiprocessing.Queue) -> None:
+    try:
+        rv = inference.search(premises, f,
+                              strategy=strategy,
+                              limits=limits,
+                              observers=observers)
+    except Exception:
+        rv = inference.Result(inference.UNKNOWN, None,
+                              inference.Statistics())
+        _log.exception(f"Strategy {strategy.name} failed")
+    results.put((strategy.name, rv))
+
+
+def _get_result(results: multiprocessing.Queue,
+                processes: Dict[str, multiprocessing.Process],
+                cancel: Optional[threading.Event]) \
+        -> Tuple[str, inference.Result]:
+    """:param processes: Processes of the strategies by their names, which
+        haven't posted their results yet.
+    :returns: Name of the next strategy and its result. (UNKNOWN if its
+        process died without posting it, e.g. killed for lack of memory.)
+    :raises inference.Cancelled: If the cancel event is set.
+    """
+
+    while True:
+        try:
+            return results.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            if cancel is not None and cancel.is_set():
+                raise inference.Cancelled("Search was cancelled")
+
+        for name, process in processes.items():
+            if not process.is_alive():
+                # (results are flushed before the processes exit)
+                try:
+                    return results.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+
+                _log.error(f"Strategy {name} exited with code "
+                           f"{process.exitcode}")
+                return name, inference.Result(inference.UNKNOWN, None,
+                                              inference.Statistics())
+
+
+_worker_kb: KnowledgeBase = None
+
+
+def _init_worker(kb: KnowledgeBase) -> None:
+    global _worker_kb
+    _worker_kb = kb
+
+
+def _run_task(method: str, f: syntax.Node,
+              timeout: float = None) -> Tuple[Any, bool]:
+    limits = _worker_kb._limits
+    if timeout is not None and (limits.timeout is None
+                                or timeout < limits.timeout):
+        limits = limits._replace(timeout=timeout)
+
+    rv = _worker_kb.search(f, limits=limits)
+    if (rv.status == inference.UNKNOWN
+            and rv.statistics.exhausted == 'timeout'):
+        return None, True
+
+    if method == 'prove':
+        return rv.status == inference.PROVED, False
+    else:
+        return rv.substitution, False
 
 
 def main():
@@ -45,6 +956,39 @@ def main():
     parser.add_argument(
         '-vv', '--debug', action='store_true',
         help="Be even more verbose.")
+    parser.add_argument(
+        '--goal-directed', action='store_true',
+        help="Answer queries on Horn clauses by backward chaining (or with "
+             "--datalog by magic sets rewriting) instead of materializing "
+             "the knowledge base.")
+    parser.add_argument(
+        '--datalog', action='store_true',
+        help="Materialize function-free Horn clauses into columnar "
+             "relations.")
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help="Number of worker processes generating inferences of each "
+             "proof.")
+    parser.add_argument(
+        '--timeout', type=float, default=30,
+        help="Maximum number of seconds for each proof. (0 for no limit.)")
+    parser.add_argument(
+        '--max-clauses', type=int,
+        help="Maximum number of clauses kept by each proof.")
+    parser.add_argument(
+        '--max-memory', type=int,
+        help="Maximum number of megabytes allocated by each proof.")
+    parser.add_argument(
+        '--memory', action='store_true',
+        help="Account memory allocated by each proof (see the stats "
+             "command). Slows down the proofs.")
+    parser.add_argument(
+        '--trace', metavar='FILE',
+        help="Write timeline of the commands and proofs into the file (in "
+             "Chrome trace format).")
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="Profile every command (see the profile command).")
     args = parser.parse_args()
     setup_logging(args)
 
@@ -52,27 +996,79 @@ def main():
     print()
     usage()
 
-    kb = KnowledgeBase()
+    if args.datalog:
+        horn_mode = GOAL_DIRECTED_DATALOG if args.goal_directed else DATALOG
+    elif args.goal_directed:
+        horn_mode = BACKWARD_CHAINING
+    else:
+        horn_mode = FORWARD_CHAINING
+
+    limits = inference.Limits(
+        timeout=args.timeout or None,
+        max_kept=args.max_clauses,
+        max_memory=(args.max_memory * 2 ** 20
+                    if args.max_memory is not None
+                    else None))
+    observers = [inference.LoggingObserver()] if args.debug else []
+    if args.memory:
+        tracemalloc.start()
+    kb = KnowledgeBase(horn_mode=horn_mode, workers=args.workers,
+                       limits=limits, observers=observers)
+
+    if args.trace:
+        with tracing.trace(args.trace):
+            repl(kb, profile=args.profile)
+    else:
+        repl(kb, profile=args.profile)
+
+
+def repl(kb: KnowledgeBase, profile: bool = False) -> None:
     while True:
         print(">> ", end="")
-        v = input()
-        command, *rest = v.split(maxsplit=1)
-
-        command = command.lower()
-        rest = rest[0].strip() if rest else None
-
-        if command == 'list':
-            list_content(kb)
-        elif command == 'axiom':
-            add_axiom(kb, rest)
-        elif command == 'lemma':
-            add_lemma(kb, rest)
-        elif command == 'prove':
-            prove(kb, rest)
-        elif command == 'query':
-            query(kb, rest)
-        else:
-            usage()
+        command, rest = parse_command(input())
+
+        with tracing.span(command, 'command', argument=rest):
+            if profile and command != 'profile':
+                profile_command(kb, command, rest)
+            else:
+                run_command(kb, command, rest)
+
+
+def parse_command(v: str) -> Tuple[str, Optional[str]]:
+    command, *rest = v.split(maxsplit=1)
+
+    command = command.lower()
+    rest = rest[0].strip() if rest else None
+
+    return command, rest
+
+
+def run_command(kb: KnowledgeBase, command: str, rest: str) -> None:
+    if command == 'list':
+        list_content(kb)
+    elif command == 'axiom':
+        add_axiom(kb, rest)
+    elif command == 'lemma':
+        add_lemma(kb, rest)
+    elif command == 'prove':
+        prove(kb, rest)
+    elif command == 'query':
+        query(kb, rest)
+    elif command == 'answers':
+        answers(kb, rest)
+    elif command == 'complete':
+        complete(kb, rest)
+    elif command == 'stats':
+        print_statistics(kb)
+    elif command == 'proof':
+        print_proof(kb)
+    elif command == 'profile':
+        if not rest:
+            print("Error: Expected 1 argument\n")
+            return
+        profile_command(kb, *parse_command(rest))
+    else:
+        usage()
 
 
 def usage():
@@ -84,6 +1080,14 @@ def usage():
         lemma <formula>     Prove and add lemma to the knowledge base
         prove <formula>     Prove formula
         query <formula>     Shows binding list that satisfies the formula
+        answers <formula>   Shows all binding lists that satisfy the
+                            formula
+        complete [<file>]   Complete equational axioms into rewrite rules
+                            (and cache them in the file)
+        stats               Show statistics of the last proof
+        proof               Show the last proof
+        profile <command>   Profile command (and write the profile into
+                            a pstats file)
     """)
 
 
@@ -138,11 +1142,13 @@ def prove(kb: KnowledgeBase, arg: str) -> None:
         print("Error: Invalid syntax\n")
         return
 
-    rv = kb.prove(f)
-    if rv:
+    rv = kb.search(f)
+    if rv.status == inference.PROVED:
         print(f"Formula is entailed by the knowledge base.\n")
-    else:
+    elif rv.status == inference.DISPROVED:
         print(f"Formula is not entailed by the knowledge base.\n")
+    else:
+        print_unknown(rv)
 
 
 def query(kb: KnowledgeBase, arg: str) -> None:
@@ -156,17 +1162,101 @@ def query(kb: KnowledgeBase, arg: str) -> None:
         print("Error: Invalid syntax\n")
         return
 
-    rv = kb.query(f)
+    rv = kb.search(f)
 
-    if rv is None:
+    if rv.status == inference.UNKNOWN:
+        print_unknown(rv)
+        return
+
+    if rv.status == inference.DISPROVED:
         print(f"Error: Query is not entailed by the knowledge base.\n")
         return
 
-    for k, v in rv.items():
+    for k, v in rv.substitution.items():
         print(f"{k} = {v}")
     print()
 
 
+def answers(kb: KnowledgeBase, arg: str) -> None:
+    if not arg:
+        print("Error: Expected 1 argument\n")
+        return
+
+    try:
+        f = grammar.parse(arg)
+    except grammar.InvalidSyntaxError:
+        print("Error: Invalid syntax\n")
+        return
+
+    n = 0
+    for n, subst in enumerate(kb.query_iter(f), start=1):
+        bindings = ", ".join(f"{k} = {v}" for k, v in subst.items())
+        print(bindings or "(no bindings)")
+
+    if not n:
+        print("Error: No answers were found.\n")
+        return
+    print()
+
+
+def print_unknown(rv: inference.Result) -> None:
+    s = rv.statistics
+    print(f"Unknown: Proof exceeded {s.exhausted} after {s.elapsed:.1f}s "
+          f"({s.given} given, {s.generated} generated and {s.kept} kept "
+          f"clauses).")
+    if s.peak_memory is not None:
+        memory = ", ".join(f"{k} {v / 2 ** 20:.1f} MB"
+                           for k, v in s.memory.items())
+        print(f"Peak memory: {s.peak_memory / 2 ** 20:.1f} MB ({memory}).")
+    print()
+
+
+def complete(kb: KnowledgeBase, arg: str) -> None:
+    try:
+        rs = kb.complete(cache=arg)
+    except rewriting.CompletionError as e:
+        print(f"Error: {e}\n")
+        return
+
+    print(rs)
+    if not rs.is_convergent():
+        print("Warning: Some equations could not be oriented.")
+    print()
+
+
+def print_statistics(kb: KnowledgeBase) -> None:
+    for k, v in kb.last_statistics.as_dict().items():
+        if isinstance(v, dict):
+            for k2, v2 in v.items():
+                print(f"{k}.{k2} = {v2}")
+        elif isinstance(v, float):
+            print(f"{k} = {v:.3f}")
+        else:
+            print(f"{k} = {v}")
+    print()
+
+
+def print_proof(kb: KnowledgeBase) -> None:
+    if kb.last_proof is None:
+        print("Error: The last formula was not proved by the saturation.\n")
+        return
+
+    print(kb.last_proof)
+    print()
+
+
+_profiles = itertools.count(1)
+
+
+def profile_command(kb: KnowledgeBase, command: str, rest: str) -> None:
+    path = f"profile-{next(_profiles)}-{command}.pstats"
+    _, stats = profiling.profile(run_command, kb, command, rest, path=path)
+
+    print(profiling.format_summary(stats))
+    print()
+    print(f"Profile was written into {path}.\n")
+
+
 def setup_logging(args: argparse.Namespace) -> None:
     log = logging.getLogger()
     if args.debug:
@@ -0,0 +1,50 @@
+import pytest
+
+from knowledge_base import congruence
+from knowledge_base.grammar import parse
+
+
+@pytest.mark.parametrize('equalities, s, t, expected', [
+    ([], 'A', 'A', True),
+    ([], 'A', 'B', False),
+    (['A = B'], 'A', 'B', True),
+    (['A = B', 'B = C'], 'A', 'C', True),
+    (['A = B', 'C = D'], 'A', 'C', False),
+
+    # congruence
+    (['A = B'], 'F(A)', 'F(B)', True),
+    (['A = B'], 'G(F(A), C)', 'G(F(B), C)', True),
+    (['A = B'], 'F(A)', 'G(B)', False),
+    (['F(A) = B', 'F(B) = A'], 'F(F(A))', 'A', True),
+    (['F(F(F(A))) = A', 'F(F(F(F(F(A))))) = A'], 'F(A)', 'A', True),
+])
+def test_are_equal(equalities, s, t, expected):
+    cc = _make_cc(equalities)
+    assert cc.are_equal(_parse(s), _parse(t)) == expected
+
+
+@pytest.mark.parametrize('equalities, node, expected', [
+    ([], 'p(A)', 'p(A)'),
+    (['Caesar = Julius'], 'hate(Marcus, Julius)', 'hate(Marcus, Caesar)'),
+    (['Caesar = Julius'], '*x: hate(x, Julius)', '*x: hate(x, Caesar)'),
+    (['F(A) = B'], 'p(G(F(A)), x)', 'p(G(B), x)'),
+    (['F(A) = B'], 'p(F(x))', 'p(F(x))'),
+    (['F(F(F(A))) = A', 'F(F(F(F(F(A))))) = A'], 'F(F(A)) = C', 'A = C'),
+])
+def test_canonicalize(equalities, node, expected):
+    cc = _make_cc(equalities)
+    assert cc.canonicalize(_parse(node)) == _parse(expected)
+
+
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _make_cc(equalities):
+    cc = congruence.CongruenceClosure()
+    for k in equalities:
+        cc.add_equality(*_parse(k).children)
+    return cc
+
+
+def _parse(s):
+    return parse(s, _allow_partial_expression=True)
@@ -0,0 +1,158 @@
+import pytest
+
+from knowledge_base import datalog, horn
+from knowledge_base.grammar import parse, parse_substitution
+
+family_model = [
+    'parent(Abe, Homer)',
+    'parent(Homer, Bart)',
+    'parent(Homer, Lisa)',
+    '*x, *y: parent(x, y) => ancestor(x, y)',
+    '*x, *y, *z: parent(x, y) & ancestor(y, z) => ancestor(x, z)',
+]
+
+
+@pytest.mark.parametrize('formulas, expected', [
+    (['f(P)'], True),
+    (['*x: man(x) => person(x)'], True),
+    (['*x: man(x) => !ruler(x)'], True),
+    (['f(P) | f(Q)'], False),
+    (['*x: f(x)'], False),
+    (['f(F(P))'], False),
+    (['*x: f(x) => g(F(x))'], False),
+])
+def test_supports(formulas, expected):
+    clauses = [c for k in formulas for c in _clauses(k)]
+    assert datalog.Database.supports(clauses) == expected
+
+
+@pytest.mark.parametrize('formulas, query, expected', [
+    (family_model, 'ancestor(Abe, Bart)', [{}]),
+    (family_model, 'ancestor(Bart, Abe)', []),
+    (family_model, 'ancestor(Bart, Moe)', []),
+    (family_model, '?x: ancestor(x, Lisa)',
+     [{'x': 'Abe'}, {'x': 'Homer'}]),
+    (family_model, '?x: ancestor(Abe, x) & parent(x, Bart)',
+     [{'x': 'Homer'}]),
+    (family_model, '?x, ?y: parent(x, y) & parent(y, Lisa)',
+     [{'x': 'Abe', 'y': 'Homer'}]),
+
+    # repeated variables
+    (['edge(A, B)', 'edge(B, C)', 'edge(C, A)', 'edge(D, A)',
+      '*x, *y: edge(x, y) => path(x, y)',
+      '*x, *y, *z: path(x, y) & path(y, z) => path(x, z)'],
+     '?x: path(x, x)', [{'x': 'A'}, {'x': 'B'}, {'x': 'C'}]),
+
+    # constants in rules
+    (['man(Marcus)', 'man(Caesar)',
+      '*x: man(x) => hate(x, Caesar)'],
+     '?x: hate(Marcus, x)', [{'x': 'Caesar'}]),
+
+    # integrity constraint is violated - everything is entailed
+    (['man(Marcus)', '*x: man(x) => !man(x)'], 'person(Caesar)', [{}]),
+])
+@pytest.mark.parametrize('goal_directed', [False, True])
+def test_query(goal_directed, formulas, query, expected):
+    db = datalog.Database(goal_directed=goal_directed)
+    for k in formulas:
+        db.add_clauses(_clauses(k))
+
+    rv = list(db.query(parse(query)))
+    expected = [parse_substitution(k) for k in expected]
+    assert sorted(rv, key=str) == sorted(expected, key=str)
+
+
+@pytest.mark.parametrize('query', [
+    'f(P) | f(Q)',
+    'f(F(P))',
+])
+def test_query_unsupported(query):
+    db = datalog.Database()
+    with pytest.raises(horn.Unsupported):
+        list(db.query(parse(query)))
+
+
+def test_add_clauses_incremental():
+    db = datalog.Database()
+    for k in family_model[3:]:
+        db.add_clauses(_clauses(k))
+    assert len(db) == 0
+
+    db.add_clauses(_clauses(family_model[0]))
+    db.add_clauses(_clauses(family_model[1]))
+    assert len(db) == 5
+    assert list(db.query(parse('ancestor(Abe, Bart)'))) == [{}]
+
+
+def test_add_atoms():
+    n = 200
+    db = datalog.Database()
+    db.add_clauses(_clauses('*x, *y: edge(x, y) => path(x, y)'))
+    db.add_clauses(_clauses('*x, *y, *z: edge(x, y) & path(y, z) '
+                            '=> path(x, z)'))
+    db.add_atoms(parse(f'edge(N{i}, N{i + 1})') for i in range(n))
+
+    assert len(db) == n + n * (n + 1) // 2
+    assert len(list(db.query(parse('?x: path(N0, x)')))) == n
+
+
+def test_magic_sets():
+    a = datalog.Atom
+    rules = [
+        datalog.Rule(a(('path', 2), ('x', 'y')),
+                     [a(('edge', 2), ('x', 'y'))]),
+        datalog.Rule(a(('path', 2), ('x', 'z')),
+                     [a(('edge', 2), ('x', 'y')), a(('path', 2), ('y', 'z'))]),
+    ]
+    query = datalog.Rule(a(('answer', 1), ('x',)), [a(('path', 2), (0, 'x'))])
+
+    rv, seed, answers = datalog.magic_sets(rules, query)
+    heads = {k.head.relation for k in rv}
+    assert heads == {('answer^f', 1), ('path^bf', 2), ('_magic_path^bf', 1)}
+    assert seed == ('_magic_answer^f', 0)
+    assert answers == ('answer^f', 1)
+
+    # edges are joined only from the bound nodes
+    for k in rv:
+        if k.head.relation == ('path^bf', 2):
+            assert k.body[0].relation == ('_magic_path^bf', 1)
+
+
+def test_query_goal_directed():
+    n = 100
+    db = datalog.Database(goal_directed=True)
+    db.add_clauses(_clauses('*x, *y: edge(x, y) => path(x, y)'))
+    db.add_clauses(_clauses('*x, *y, *z: edge(x, y) & path(y, z) '
+                            '=> path(x, z)'))
+    db.add_atoms(parse(f'edge(N{i}, N{i + 1})') for i in range(n))
+
+    # only the facts are stored
+    assert len(db) == n
+    assert len(list(db.query(parse(f'?x: path(N{n - 2}, x)')))) == 2
+    assert list(db.query(parse(f'path(N0, N{n})'))) == [{}]
+    assert len(db) == n
+
+
+def test_relation():
+    r = datalog.Relation(2)
+    assert r.add((1, 2))
+    assert r.add((1, 3))
+    assert not r.add((1, 2))
+    assert r.add((2, 3))
+
+    assert len(r) == 3
+    assert (1, 3) in r
+    assert r.get_row(2) == (2, 3)
+    assert list(r.lookup((0,), (1,))) == [0, 1]
+    assert list(r.lookup((0,), (1,), start=1)) == [1]
+    assert list(r.lookup((1,), (3,), end=2)) == [1]
+
+    r.add((4, 3))
+    assert list(r.lookup((1,), (3,))) == [1, 2, 3]
+
+
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _clauses(formula):
+    return parse(formula).to_cnf()[0].to_clause_form()
@@ -0,0 +1,136 @@
+import pytest
+
+from knowledge_base import horn
+from knowledge_base.grammar import parse, parse_substitution
+
+family_model = [
+    'parent(Abe, Homer)',
+    'parent(Homer, Bart)',
+    'parent(Homer, Lisa)',
+    '*x, *y: parent(x, y) => ancestor(x, y)',
+    '*x, *y, *z: parent(x, y) & ancestor(y, z) => ancestor(x, z)',
+]
+
+
+@pytest.mark.parametrize('formulas, expected', [
+    (['f(P)'], True),
+    (['f(P)', 'f(P) => f(Q)'], True),
+    (['*x: man(x) => person(x)'], True),
+    (['*x: man(x) => !ruler(x)'], True),
+    (['f(P) | f(Q)'], False),  # two positive literals
+    (['*x: f(x)'], False),  # not range-restricted
+    (['*x, ?y: loyal(x, y)'], False),
+    (['A = B'], False),
+])
+def test_is_horn(formulas, expected):
+    clauses = [c for k in formulas for c in _clauses(k)]
+    assert horn.is_horn(clauses) == expected
+
+
+@pytest.mark.parametrize('formulas, query, expected', [
+    (family_model, 'ancestor(Abe, Bart)', [{}]),
+    (family_model, 'ancestor(Bart, Abe)', []),
+    (family_model, '?x: ancestor(x, Lisa)',
+     [{'x': 'Abe'}, {'x': 'Homer'}]),
+    (family_model, '?x: ancestor(Abe, x) & parent(x, Bart)',
+     [{'x': 'Homer'}]),
+    (['man(Marcus)', '*x: man(x) => person(x)'], 'person(Marcus)', [{}]),
+
+    # integrity constraint is violated - everything is entailed
+    (['man(Marcus)', '*x: man(x) => !man(x)'], 'person(Caesar)', [{}]),
+])
+@pytest.mark.parametrize('chainer', [horn.ForwardChainer,
+                                     horn.BackwardChainer])
+def test_query(chainer, formulas, query, expected):
+    ch = chainer()
+    for k in formulas:
+        ch.add_clauses(_clauses(k))
+
+    rv = list(ch.query(parse(query)))
+    expected = [parse_substitution(k) for k in expected]
+    assert sorted(rv, key=str) == sorted(expected, key=str)
+
+
+def test_query_unsupported():
+    fc = horn.ForwardChainer()
+    with pytest.raises(horn.Unsupported):
+        list(fc.query(parse('f(P) | f(Q)')))
+
+
+def test_add_clauses_incremental():
+    fc = horn.ForwardChainer()
+    for k in family_model[3:]:
+        fc.add_clauses(_clauses(k))
+    assert not fc.atoms
+
+    fc.add_clauses(_clauses(family_model[0]))
+    fc.add_clauses(_clauses(family_model[1]))
+    assert list(fc.query(parse('ancestor(Abe, Bart)'))) == [{}]
+
+
+def test_max_depth():
+    fc = horn.ForwardChainer(max_depth=5)
+    fc.add_clauses(_clauses('nat(Zero)'))
+    fc.add_clauses(_clauses('*x: nat(x) => nat(Succ(x))'))
+
+    assert len(fc.atoms) == 4
+    assert not fc.is_complete()
+    assert list(fc.query(parse('nat(Succ(Succ(Zero)))'))) == [{}]
+
+
+def test_max_work():
+    fc = horn.ForwardChainer(max_work=1000)
+    fc.add_clauses(_clauses('p(A)'))
+    with pytest.raises(horn.Unsupported):
+        fc.add_clauses(_clauses('*x, *y: p(x) & p(y) => p(F(x, y))'))
+
+    # function-free rules are not limited
+    fc = horn.ForwardChainer(max_work=1)
+    for k in family_model:
+        fc.add_clauses(_clauses(k))
+    assert list(fc.query(parse('ancestor(Abe, Bart)'))) == [{}]
+
+
+@pytest.mark.parametrize('formulas, query, expected', [
+    # left recursion
+    (['parent(Abe, Homer)',
+      'parent(Homer, Bart)',
+      '*x, *y: parent(x, y) => ancestor(x, y)',
+      '*x, *y, *z: ancestor(x, y) & parent(y, z) => ancestor(x, z)'],
+     '?x: ancestor(x, Bart)', [{'x': 'Abe'}, {'x': 'Homer'}]),
+
+    # cycles
+    (['edge(A, B)', 'edge(B, C)', 'edge(C, A)', 'edge(D, A)',
+      '*x, *y: edge(x, y) => path(x, y)',
+      '*x, *y, *z: path(x, y) & path(y, z) => path(x, z)'],
+     '?x: path(A, x)', [{'x': 'A'}, {'x': 'B'}, {'x': 'C'}]),
+
+    # non-ground facts
+    (['*x: likes(x, Pizza)', 'person(Marcus)'],
+     '?x: person(x) & likes(x, Pizza)', [{'x': 'Marcus'}]),
+])
+def test_query_backward(formulas, query, expected):
+    bc = horn.BackwardChainer()
+    for k in formulas:
+        bc.add_clauses(_clauses(k))
+
+    rv = list(bc.query(parse(query)))
+    expected = [parse_substitution(k) for k in expected]
+    assert sorted(rv, key=str) == sorted(expected, key=str)
+    assert bc.is_complete()
+
+
+def test_query_backward_max_depth():
+    bc = horn.BackwardChainer(max_depth=5)
+    bc.add_clauses(_clauses('nat(Zero)'))
+    bc.add_clauses(_clauses('*x: nat(x) => nat(Succ(x))'))
+
+    assert len(list(bc.query(parse('?x: nat(x)')))) == 4
+    assert not bc.is_complete()
+
+
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _clauses(formula):
+    return parse(formula).to_cnf()[0].to_clause_form()
@@ -1,6 +1,14 @@
+import functools
+import itertools
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
 import pytest
 
-from knowledge_base import inference, utils
+from knowledge_base import inference, syntax, utils
 from knowledge_base.grammar import parse, parse_substitution
 
 caesar_model = [
@@ -108,12 +116,43 @@ def test_infer_first_order_logic(premises, conclusion, expected):
     assert entailed == expected
 
 
+@pytest.mark.parametrize('premises, conclusion, expected', [
+    (['Caesar = Julius'], 'Julius = Caesar', True),
+    (['Caesar = Julius'], 'Julius != Caesar', False),
+    (['Caesar = Julius'], 'Julius = Marcus', False),
+    (['Caesar = Julius', 'hate(Marcus, Julius)'],
+     'hate(Marcus, Caesar)', True),
+    (['Caesar = Julius', 'hate(Marcus, Julius)'],
+     'hate(Caesar, Marcus)', False),
+    (['F(A) = B', 'F(B) = A', 'p(F(F(A)))'], 'p(A)', True),
+    (['Caesar = Julius', 'Caesar != Julius | p(A)'], 'p(A)', True),
+    (['Caesar = Julius', '*x: hate(x, Julius) => enemy(x)',
+      'hate(Marcus, Caesar)'], 'enemy(Marcus)', True),
+])
+def test_infer_ground_equality(premises, conclusion, expected):
+    entailed, _ = _infer(premises, conclusion)
+    assert entailed == expected
+
+
 @pytest.mark.parametrize('premises, conclusion, expected', [
     # Who hates Caesar?
     (caesar_model, '?x: hate(x, Caesar)', {'x': 'Marcus'}),
 
     # Who is not loyal to Caesar?
     (caesar_model, '?x: !loyal(x, Caesar)', {'x': 'Marcus'}),
+
+    # answers of several inferences
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))'], '?x: nat(S(x))',
+     {'x': 'Zero'}),
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))'], '?x: nat(S(S(x)))',
+     {'x': 'Zero'}),
+    (['parent(Abe, Homer)', 'parent(Homer, Bart)',
+      '*x, *y, *z: parent(x, y) & parent(y, z) => grandparent(x, z)'],
+     '?x: grandparent(x, Bart)', {'x': 'Abe'}),
+
+    # disjunctive answer
+    (['p(A) | p(B)'], '?x: p(x)', {}),
+    (['p(A, C) | p(B, C)'], '?x, ?y: p(x, y)', {'y': 'C'}),
 ])
 def test_query_first_order_logic(premises, conclusion, expected):
     expected = parse_substitution(expected)
@@ -122,9 +161,395 @@ def test_query_first_order_logic(premises, conclusion, expected):
     assert binding == expected
 
 
+@pytest.mark.parametrize('conclusion, expected', [
+    ('?x: hate(x, Caesar)', [{'x': 'Marcus'}]),
+    ('?x: ruler(x)', [{'x': 'Caesar'}]),
+    ('?x: roman(x) | ruler(x)', [{'x': 'Marcus'}, {'x': 'Caesar'}]),
+    ('hate(Marcus, Caesar)', [{}]),
+    ('hate(Caesar, Marcus)', []),
+])
+def test_infer_all(conclusion, expected):
+    premises = [parse(k) for k in caesar_model]
+    rv = list(inference.infer_all(premises, parse(conclusion)))
+    expected = [parse_substitution(k) for k in expected]
+    assert sorted(rv, key=str) == sorted(expected, key=str)
+
+
+def test_infer_all_timeout():
+    premises = [parse('nat(Zero)'), parse('*x: nat(x) => nat(S(x))')]
+    rv = inference.infer_all(premises, parse('?x: nat(x)'),
+                             answer_timeout=1)
+    assert [next(rv) for _ in range(3)] == \
+        [parse_substitution({'x': k})
+         for k in ('Zero', 'S(Zero)', 'S(S(Zero))')]
+    rv.close()
+
+    rv = inference.infer_all(premises, parse('?x: nat(x) & nat(Q)'),
+                             answer_timeout=0.2)
+    assert list(rv) == []
+
+
+@pytest.mark.parametrize('premises, conclusions, expected', [
+    (caesar_model,
+     ['hate(Marcus, Caesar)', '!hate(Marcus, Caesar)',
+      'loyal(Marcus, Caesar)', '!loyal(Marcus, Caesar)', 'person(Marcus)'],
+     [True, False, False, True, True]),
+
+    # conclusions are not combined
+    (['f(P) | f(Q)'], ['f(P)', '!f(Q)', 'f(Q)'], [False, False, False]),
+
+    # premises are contradictions
+    (['f(P) & !f(P)'], ['f(Q)', '!f(Q)'], [True, True]),
+
+    (['Caesar = Julius', 'hate(Marcus, Julius)'],
+     ['hate(Marcus, Caesar)', 'hate(Caesar, Marcus)', 'Julius = Caesar'],
+     [True, False, True]),
+])
+def test_infer_many(premises, conclusions, expected):
+    premises = [parse(k) for k in premises]
+    conclusions = [parse(k) for k in conclusions]
+
+    rv = list(inference.infer_many(premises, conclusions))
+    assert sorted(i for i, _ in rv) == list(range(len(conclusions)))
+    assert [dict(rv)[i] is not None for i in range(len(conclusions))] == \
+        expected
+
+
+@pytest.mark.parametrize('conclusion, expected', [
+    ('hate(Marcus, Caesar)', True),
+    ('!hate(Marcus, Caesar)', False),
+    ('loyal(Marcus, Caesar)', False),
+    ('!loyal(Marcus, Caesar)', True),
+])
+@pytest.mark.parametrize('strategy', inference.PORTFOLIO,
+                         ids=[k.name for k in inference.PORTFOLIO])
+def test_infer_strategy(strategy, conclusion, expected):
+    premises = [parse(k) for k in caesar_model]
+    rv = inference.infer(premises, parse(conclusion), strategy=strategy)
+    assert (rv is not None) == expected
+
+
+@pytest.mark.parametrize('conclusion', [
+    'hate(Marcus, Caesar)',
+    'loyal(Marcus, Caesar)',
+    '?x: !loyal(x, Caesar)',
+])
+@pytest.mark.parametrize('strategy', inference.PORTFOLIO,
+                         ids=[k.name for k in inference.PORTFOLIO])
+def test_infer_workers(strategy, conclusion):
+    premises = [parse(k) for k in caesar_model]
+    conclusion = parse(conclusion)
+
+    expected = inference.infer(premises, conclusion, strategy=strategy)
+    rv = inference.infer(premises, conclusion, strategy=strategy, workers=2)
+    assert rv == expected
+
+
+@pytest.mark.parametrize('premises, conclusion, limits, expected', [
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))'], 'nat(S(S(Zero)))',
+     inference.Limits(max_generated=1000), (inference.PROVED, None)),
+    (['p(A)', '*x: p(x) => q(x)'], 'q(B)',
+     inference.Limits(max_generated=1000), (inference.DISPROVED, None)),
+
+    # saturation never ends
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))'], 'nat(Q)',
+     inference.Limits(timeout=0.2), (inference.UNKNOWN, 'timeout')),
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))'], 'nat(Q)',
+     inference.Limits(max_generated=100),
+     (inference.UNKNOWN, 'max_generated')),
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))'], 'nat(Q)',
+     inference.Limits(max_kept=100), (inference.UNKNOWN, 'max_kept')),
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))'], 'nat(Q)',
+     inference.Limits(max_memory=10 ** 5), (inference.UNKNOWN, 'max_memory')),
+])
+def test_search(premises, conclusion, limits, expected):
+    premises = [parse(k) for k in premises]
+    rv = inference.search(premises, parse(conclusion), limits=limits)
+
+    assert (rv.status, rv.statistics.exhausted) == expected
+    assert (rv.substitution is not None) == (rv.status == inference.PROVED)
+    assert rv.statistics.given > 0
+    assert rv.statistics.elapsed > 0
+    if limits.max_generated is not None:
+        assert rv.statistics.generated <= limits.max_generated
+    if limits.max_kept is not None:
+        assert rv.statistics.kept <= limits.max_kept
+
+
+def test_search_propositional_limits():
+    # 8 pigeons into 7 holes (decided by the SAT solver in seconds)
+    pigeons, holes = range(8), range(7)
+    atoms = {(i, j): parse(f'in(P{i}, H{j})') for i in pigeons for j in holes}
+    premises = [functools.reduce(_make_disjunction,
+                                 (atoms[i, j] for j in holes))
+                for i in pigeons]
+    premises.extend(_make_disjunction(atoms[i, k].negate(),
+                                      atoms[j, k].negate())
+                    for i, j in itertools.combinations(pigeons, 2)
+                    for k in holes)
+
+    start = time.monotonic()
+    rv = inference.search(premises, parse('p(A)'),
+                          limits=inference.Limits(timeout=0.5))
+    assert time.monotonic() - start < 1.5
+    assert (rv.status, rv.statistics.exhausted) == (inference.UNKNOWN,
+                                                    'timeout')
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_search_statistics(workers):
+    premises = [parse(k) for k in caesar_model]
+    rv = inference.search(premises, parse('hate(Marcus, Caesar)'),
+                          workers=workers)
+    s = rv.statistics
+
+    assert rv.status == inference.PROVED
+    assert s.generated == sum(s.inferences.values())
+    assert s.inferences['resolve'] > 0
+    assert s.inferences['paramodulate'] == 0
+    assert s.generated <= s.kept + s.subsumed
+    assert 0 < s.unification_failures < s.unifications
+    assert s.unification_time > 0
+    assert s.cnf_time > 0
+    assert s.indexing_time > 0
+    assert s.as_dict()['inferences'] == s.inferences
+
+
+def test_search_observers(caplog):
+    class Recorder(inference.Observer):
+        def __init__(self):
+            self.generated = {}
+            self.events = []
+
+        def on_clause_generated(self, clause_id, parent_ids, rule, literals):
+            assert clause_id not in self.generated
+            assert all(k in self.generated for k in parent_ids)
+            self.generated[clause_id] = (rule, literals)
+
+        def on_clause_kept(self, clause_id):
+            self.events.append(('kept', clause_id))
+
+        def on_subsumed(self, clause_id):
+            self.events.append(('subsumed', clause_id))
+
+        def on_given(self, clause_id):
+            self.events.append(('given', clause_id))
+
+        def on_proof_found(self, clause_id, goals):
+            self.events.append(('proof', clause_id))
+            assert goals == {0}
+
+    premises = [parse(k) for k in caesar_model]
+    recorder = Recorder()
+    with caplog.at_level(logging.DEBUG):
+        rv = inference.search(premises, parse('hate(Marcus, Caesar)'),
+                              observers=[recorder,
+                                         inference.LoggingObserver()])
+    s = rv.statistics
+
+    inputs = [k for k, v in recorder.generated.values() if k == 'input']
+    assert len(recorder.generated) - len(inputs) == s.generated
+    for event, n in (('kept', s.kept), ('subsumed', s.subsumed),
+                     ('given', s.given), ('proof', 1)):
+        ids = [i for k, i in recorder.events if k == event]
+        assert len(ids) == n
+        assert all(i in recorder.generated for i in ids)
+
+    _, proof = recorder.events[-1]
+    assert recorder.generated[proof][1] == frozenset()
+    assert f"[{proof}] refutes [0]" in caplog.text
+
+
+def test_search_cancel():
+    premises = [parse('nat(Zero)'), parse('*x: nat(x) => nat(S(x))')]
+    cancel = threading.Event()
+    timer = threading.Timer(0.1, cancel.set)
+    timer.start()
+
+    with pytest.raises(inference.Cancelled):
+        inference.search(premises, parse('nat(Q)'), cancel=cancel)
+    timer.join()
+
+
+@pytest.mark.parametrize('conclusion', [
+    'hate(Marcus, Caesar)',
+    '?x: hate(x, Caesar)',
+])
+@pytest.mark.parametrize('workers', [0, 2])
+def test_search_proof(workers, conclusion):
+    premises = [parse(k) for k in caesar_model]
+    conclusion = parse(conclusion)
+    rv = inference.search(premises, conclusion, workers=workers)
+    steps = rv.proof.steps
+
+    assert rv.status == inference.PROVED
+    assert steps[-1].literals == frozenset() or \
+        all(k.value == '$ans' for k in steps[-1].literals)
+    ids = [k.id for k in steps]
+    assert ids == sorted(ids)
+    for k in steps:
+        assert (k.rule == inference.INPUT) == (not k.parents)
+        assert all(j in ids[:ids.index(k.id)] for j in k.parents)
+    assert str(rv.proof).splitlines()[-1].startswith(f"[{ids[-1]}] ")
+
+    assert inference.check_proof(premises, conclusion, rv.proof)
+    assert inference.check_proof([*premises, parse('p(A) | q(A)')],
+                                 conclusion, rv.proof)
+
+    # premise of the proof is missing
+    assert not inference.check_proof(premises[1:], conclusion, rv.proof)
+    assert not inference.check_proof(premises, parse('hate(Caesar, Marcus)'),
+                                     rv.proof)
+
+    # step is not inferred from its parents
+    i = next(i for i, k in enumerate(steps) if k.parents)
+    tampered = [*steps]
+    tampered[i] = steps[i]._replace(literals=frozenset([parse('p(A)')]))
+    assert not inference.check_proof(premises, conclusion,
+                                     inference.Proof(tampered))
+
+
+@pytest.mark.parametrize('premises, steps', [
+    # resolution by either of the complementary pairs
+    (['*x: p(x) | q(x)', '!p(A) | !q(B)', '!p(B)', 'p(A)'],
+     [('p(x) | q(x)', ()), ('!p(A) | !q(B)', ()),
+      ('p(B) | !p(A)', (1, 2)), ('!p(B)', ()), ('!p(A)', (3, 4)),
+      ('p(A)', ()), (None, (5, 6))]),
+    (['*x: p(x) | q(x)', '!p(A) | !q(B)', 'q(B)', '!q(A)'],
+     [('p(x) | q(x)', ()), ('!p(A) | !q(B)', ()),
+      ('q(A) | !q(B)', (1, 2)), ('q(B)', ()), ('q(A)', (3, 4)),
+      ('!q(A)', ()), (None, (5, 6))]),
+
+    # variables of the conclusion renamed
+    (['*x: p(x) | q(x)', '*x: !p(x) | r(x)', '!q(A)', '!r(A)'],
+     [('p(x) | q(x)', ()), ('!p(y) | r(y)', ()), ('q(z) | r(z)', (1, 2)),
+      ('!q(A)', ()), ('r(A)', (3, 4)), ('!r(A)', ()), (None, (5, 6))]),
+
+    # paramodulation into the outer term
+    (['*x: x = B', 'p(F(A))', '!p(B)'],
+     [('x = B', ()), ('p(F(A))', ()), ('p(B)', (1, 2), 'paramodulate'),
+      ('!p(B)', ()), (None, (3, 4))]),
+])
+def test_check_proof(premises, steps):
+    premises = [parse(k) for k in premises]
+    steps = [_make_step(i, *k) for i, k in enumerate(steps, 1)]
+    assert inference.check_proof(premises, parse('r(C)'),
+                                 inference.Proof(steps))
+
+
+def test_proof_lemmas():
+    premises = [parse(k) for k in caesar_model]
+    rv = inference.search(premises, parse('hate(Marcus, Caesar)'))
+    lemmas = rv.proof.get_lemmas()
+
+    assert lemmas
+    assert frozenset([parse('person(Marcus)')]) in lemmas
+    for k in rv.proof.steps:
+        if k.rule == inference.INPUT:
+            assert k.literals not in lemmas
+        elif k.literals in lemmas:
+            assert not k.goals
+
+
+@pytest.mark.parametrize('p, q, expected', [
+    ('p(x)', 'p(A)', True),
+    ('p(x)', 'p(A) | q(B)', True),
+    ('p(x) | q(x)', 'p(A) | q(A) | r(A)', True),
+    ('p(x) | q(x)', 'p(A) | q(B)', False),
+    ('p(x, y)', 'p(A, A)', True),
+    ('p(x, x)', 'p(A, B)', False),
+    ('p(A)', 'p(x)', False),
+    ('!p(x)', 'p(A)', False),
+    ('p(x) | p(y)', 'p(A)', False),
+])
+def test_subsumes(p, q, expected):
+    p, = parse(p).to_cnf()[0].to_clause_form()
+    q, = parse(q).to_cnf()[0].to_clause_form()
+    assert inference.subsumes(p, q) == expected
+
+
+@pytest.mark.parametrize('limits', [
+    inference.Limits(max_generated=100),
+    inference.Limits(max_memory=10 ** 5),
+])
+def test_search_memory(limits):
+    premises = inference.clausify([parse('nat(Zero)'),
+                                   parse('*x: nat(x) => nat(S(x))')])
+    conclusion = parse('nat(Q)')
+
+    rv = inference.search(premises, conclusion, limits=limits)
+    if limits.max_memory is None:
+        assert rv.statistics.peak_memory is None
+        assert rv.statistics.memory == {}
+
+        tracemalloc.start()
+        try:
+            rv = inference.search(premises, conclusion, limits=limits)
+        finally:
+            tracemalloc.stop()
+    assert not tracemalloc.is_tracing()
+
+    s = rv.statistics
+    assert rv.status == inference.UNKNOWN
+    assert set(s.memory) == {'parse_trees', 'clauses', 'indexes',
+                             'substitutions', 'proofs'}
+    assert all(v > 0 for v in s.memory.values())
+    assert s.memory['clauses'] > s.memory['parse_trees']
+    assert s.memory['substitutions'] > sys.getsizeof(premises.subst)
+    assert s.peak_memory > 0
+    assert s.as_dict()['memory'] == s.memory
+
+
+@pytest.mark.parametrize('traced', [False, True])
+def test_search_memory_concurrent(traced):
+    premises = [parse('nat(Zero)'), parse('*x: nat(x) => nat(S(x))')]
+    conclusion = parse('nat(Q)')
+    results = []
+
+    def search():
+        limits = inference.Limits(timeout=5, max_memory=10 ** 9)
+        results.append(inference.search(premises, conclusion, limits=limits))
+
+    if traced:
+        tracemalloc.start()
+    try:
+        thread = threading.Thread(target=search)
+        thread.start()
+        search_memory = inference.Limits(max_generated=10,
+                                         max_memory=10 ** 9)
+        rv = inference.search(premises, conclusion, limits=search_memory)
+        assert rv.statistics.exhausted == 'max_generated'
+
+        # (the concurrent search is still traced)
+        assert thread.is_alive()
+        assert tracemalloc.is_tracing()
+        thread.join()
+        assert tracemalloc.is_tracing() == traced
+    finally:
+        if traced:
+            tracemalloc.stop()
+
+    rv, = results
+    assert rv.statistics.exhausted == 'timeout'
+    assert rv.statistics.peak_memory > 0
+
+
 # Helpers
 # -----------------------------------------------------------------------------
 
+def _make_disjunction(p, q):
+    return syntax.make_formula(syntax.DISJUNCTION, [p, q])
+
+
+def _make_step(id_, literals, parents, rule=None):
+    if literals is not None:
+        literals, = parse(literals).to_cnf()[0].to_clause_form()
+    if rule is None:
+        rule = 'resolve' if parents else inference.INPUT
+    return inference.Step(id_, rule, parents, literals or frozenset(),
+                          frozenset())
+
+
 def _infer(premises, conclusion):
     premises = [parse(k) for k in premises]
     conclusion = parse(conclusion)
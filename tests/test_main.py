@@ -0,0 +1,605 @@
+import asyncio
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+import main
+from knowledge_base import inference, relevance, rewriting
+from knowledge_base.grammar import parse, parse_substitution
+
+
+@pytest.mark.parametrize('axioms, conclusion, expected', [
+    (['Caesar = Julius', 'hate(Marcus, Julius)'],
+     'hate(Marcus, Caesar)', True),
+    (['Caesar = Julius', 'hate(Marcus, Julius)'],
+     'hate(Caesar, Marcus)', False),
+    (['*x: F(F(F(x))) = x', '*x: F(F(F(F(F(x))))) = x', 'p(F(A))'],
+     'p(A)', True),
+    (['*x: F(G(x)) = x', '*x: p(G(x))'],
+     'p(G(F(A)))', True),
+])
+def test_prove_complete(axioms, conclusion, expected):
+    kb = _make_kb(axioms)
+    kb.complete()
+    assert kb.prove(parse(conclusion)) == expected
+
+
+def test_complete_limits():
+    kb = _make_kb(['*x: F(G(x)) = x', 'nat(Zero)',
+                   '*x: nat(x) => nat(S(x))'])
+    kb.complete()
+
+    # fallback to paramodulation shares the timeout
+    start = time.monotonic()
+    rv = kb.search(parse('nat(Q)'), limits=inference.Limits(timeout=1))
+    assert rv.status == inference.UNKNOWN
+    assert time.monotonic() - start < 1.8
+
+    # normalized facts include the added ones
+    kb.add_axiom(parse('nat(Q)'))
+    assert kb.prove(parse('nat(F(G(Q)))'),
+                    limits=inference.Limits(timeout=10))
+
+
+def test_complete_cache(tmpdir):
+    cache = str(tmpdir.join('rules.json'))
+
+    kb = _make_kb(['Caesar = Julius'])
+    rs = kb.complete(cache=cache)
+    assert kb.complete(cache=cache) == rs
+
+    kb.add_axiom(parse('Brutus = Marcus'))
+    rs2 = kb.complete(cache=cache)
+    assert rs2 != rs
+    assert rewriting.RewriteSystem.loads(open(cache).read()) == rs2
+
+
+@pytest.mark.parametrize('axioms, conclusion, expected', [
+    (['man(Marcus)', '*x: man(x) => person(x)'], 'person(Marcus)', {}),
+    (['man(Marcus)', '*x: man(x) => person(x)'], 'person(Caesar)', None),
+    (['man(Marcus)', '*x: man(x) => person(x)'],
+     '?x: person(x)', {'x': 'Marcus'}),
+    (['man(Marcus)', '*x: man(x) => person(x)'],
+     '!person(Caesar)', None),
+    (['man(Marcus)', '*x: man(x) => person(x)',
+      'man(Caesar) | ruler(Caesar)'],
+     'person(Marcus)', {}),
+])
+@pytest.mark.parametrize('horn_mode', [main.FORWARD_CHAINING,
+                                       main.BACKWARD_CHAINING,
+                                       main.DATALOG,
+                                       main.GOAL_DIRECTED_DATALOG])
+def test_query_horn(horn_mode, axioms, conclusion, expected):
+    kb = _make_kb(axioms, horn_mode=horn_mode)
+    expected = parse_substitution(expected)
+    assert kb.query(parse(conclusion)) == expected
+
+
+family_model = [
+    'parent(Abe, Homer)',
+    'parent(Homer, Bart)',
+    'parent(Homer, Lisa)',
+    '*x, *y, *z: parent(x, y) & parent(y, z) => grandparent(x, z)',
+]
+
+
+@pytest.mark.parametrize('axioms, conclusion, limit, expected', [
+    (family_model, '?x: parent(Homer, x)', None,
+     [{'x': 'Bart'}, {'x': 'Lisa'}]),
+    (family_model, '?x: parent(Homer, x)', 1, [{'x': 'Bart'}]),
+    (family_model, '?x, ?y: grandparent(x, y)', None,
+     [{'x': 'Abe', 'y': 'Bart'}, {'x': 'Abe', 'y': 'Lisa'}]),
+    (family_model, 'parent(Abe, Homer)', None, [{}]),
+    (family_model, 'parent(Bart, Homer)', None, []),
+
+    # non-Horn knowledge base
+    ([*family_model, 'p(A) | q(A)'], '?x: parent(Homer, x)', None,
+     [{'x': 'Bart'}, {'x': 'Lisa'}]),
+    (['nat(Zero)', '*x: nat(x) => nat(S(x))', 'p(A) | q(A)'],
+     '?x: nat(x)', 3,
+     [{'x': 'Zero'}, {'x': 'S(Zero)'}, {'x': 'S(S(Zero))'}]),
+])
+@pytest.mark.parametrize('horn_mode', [main.FORWARD_CHAINING,
+                                       main.BACKWARD_CHAINING])
+def test_query_iter(horn_mode, axioms, conclusion, limit, expected):
+    kb = _make_kb(axioms, horn_mode=horn_mode)
+    rv = list(kb.query_iter(parse(conclusion), limit=limit))
+    expected = [parse_substitution(k) for k in expected]
+    assert sorted(rv, key=str) == sorted(expected, key=str)
+
+
+@pytest.mark.parametrize('axioms', [
+    ['nat(Zero)', '*x: nat(x) => nat(S(x))'],
+    ['nat(Zero)', '*x: nat(x) => nat(S(x))', 'p(A) | q(A)'],
+])
+def test_query_iter_limit(axioms):
+    kb = _make_kb(axioms, limits=inference.Limits(max_memory=10 ** 9))
+    rv = kb.query_iter(parse('?x: nat(x)'), limit=2)
+    next(rv)
+    assert tracemalloc.is_tracing()
+
+    # the search is closed as soon as the limit is reached (i.e. its budget
+    # stopped tracing the memory)
+    next(rv)
+    assert not tracemalloc.is_tracing()
+    assert list(rv) == []
+
+
+def test_query_iter_timeout():
+    kb = _make_kb(['nat(Zero)', '*x: nat(x) => nat(S(x))', 'p(A) | q(A)'])
+
+    # next answer takes longer than the timeout
+    rv = list(kb.query_iter(parse('?x: nat(x) & p(x)'), timeout=0.2))
+    assert rv == []
+
+
+@pytest.mark.parametrize('horn_mode', [main.FORWARD_CHAINING,
+                                       main.DATALOG])
+def test_statistics(horn_mode):
+    kb = _make_kb(['man(Marcus)', 'man(Caesar)', '*x: man(x) => person(x)'],
+                  horn_mode=horn_mode)
+    key = 'person' if horn_mode == main.FORWARD_CHAINING else ('person', 1)
+    assert kb.statistics.get_cardinality(key) == 2
+
+    kb.add_axiom(parse('person(Brutus)'))
+    assert kb.statistics.get_cardinality(key) == 3
+    assert kb.statistics.get_distinct(key, 0) == 3
+
+
+@pytest.mark.parametrize('horn_mode', [main.FORWARD_CHAINING,
+                                       main.BACKWARD_CHAINING,
+                                       main.DATALOG,
+                                       main.GOAL_DIRECTED_DATALOG])
+def test_horn_limits(horn_mode):
+    kb = _make_kb(family_model, horn_mode=horn_mode)
+    f = parse('?x: grandparent(Abe, x)')
+
+    rv = kb.search(f, limits=inference.Limits(timeout=0))
+    assert rv.status == inference.UNKNOWN
+    assert rv.statistics.exhausted == 'timeout'
+
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(inference.Cancelled):
+        kb.search(f, cancel=cancel)
+
+    assert kb.query(f) in [parse_substitution({'x': 'Bart'}),
+                           parse_substitution({'x': 'Lisa'})]
+
+
+def test_horn_limits_backward_chaining():
+    kb = _make_kb(['p(A)', '*x, *y: p(x) & p(y) => p(F(x, y))'],
+                  horn_mode=main.BACKWARD_CHAINING)
+
+    start = time.monotonic()
+    rv = kb.search(parse('?x: p(x)'), limits=inference.Limits(timeout=1))
+    assert rv.status == inference.UNKNOWN
+    assert time.monotonic() - start < 5
+
+
+def test_materialization_limit():
+    # too many atoms to materialize, falls back to the saturation
+    start = time.monotonic()
+    kb = _make_kb(['p(A)', '*x, *y: p(x) & p(y) => p(F(x, y))'])
+    assert time.monotonic() - start < 10
+    assert kb.prove(parse('p(F(A, A))'))
+
+
+@pytest.mark.parametrize('horn_mode', [main.FORWARD_CHAINING,
+                                       main.BACKWARD_CHAINING])
+def test_prove_many(horn_mode):
+    kb = _make_kb(['man(Marcus)', 'roman(Marcus)', 'ruler(Caesar)',
+                   '*x: man(x) => person(x)',
+                   '*x: roman(x) => loyal(x, Caesar) | hate(x, Caesar)'],
+                  horn_mode=horn_mode)
+    formulas = ['person(Marcus)', 'hate(Marcus, Caesar)',
+                'loyal(Marcus, Caesar) | hate(Marcus, Caesar)',
+                'person(Caesar)', '?x: person(x)']
+
+    rv = dict(kb.prove_many(parse(k) for k in formulas))
+    assert rv == {0: True, 1: False, 2: True, 3: False, 4: True}
+    assert rv == {i: kb.prove(parse(k)) for i, k in enumerate(formulas)}
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_prove_batch(ordered):
+    kb = _make_kb(['man(Marcus)', 'roman(Marcus)', 'ruler(Caesar)',
+                   '*x: roman(x) => loyal(x, Caesar) | hate(x, Caesar)'])
+    formulas = ['man(Marcus)', 'hate(Marcus, Caesar)',
+                'loyal(Marcus, Caesar) | hate(Marcus, Caesar)']
+
+    rv = list(kb.prove_batch([parse(k) for k in formulas],
+                             max_workers=2, ordered=ordered))
+    assert sorted(rv) == [main.BatchResult(0, True, False),
+                          main.BatchResult(1, False, False),
+                          main.BatchResult(2, True, False)]
+    if ordered:
+        assert [k.index for k in rv] == [0, 1, 2]
+
+
+def test_query_batch_timeout():
+    kb = _make_kb(['nat(Zero)', '*x: nat(x) => nat(S(x))'])
+    formulas = ['?x: nat(S(x))', 'nat(Q)']
+
+    rv = list(kb.query_batch([parse(k) for k in formulas],
+                             max_workers=2, timeout=1))
+    assert rv[0] == main.BatchResult(0, parse_substitution({'x': 'Zero'}),
+                                     False)
+    assert rv[1] == main.BatchResult(1, None, True)
+
+
+def test_prove_batch_close():
+    kb = _make_kb(['nat(Zero)', '*x: nat(x) => nat(S(x))'])
+    rv = kb.prove_batch([parse('nat(Q)')] * 20, max_workers=2, timeout=0.5)
+
+    # the pending tasks are cancelled
+    start = time.monotonic()
+    assert next(rv).timed_out
+    rv.close()
+    assert time.monotonic() - start < 3
+
+
+@pytest.mark.parametrize('conclusion, expected', [
+    ('hate(Marcus, Caesar)', True),
+    ('loyal(Marcus, Caesar)', False),
+])
+def test_prove_portfolio(conclusion, expected):
+    kb = _make_kb(['man(Marcus)', 'roman(Marcus)', 'ruler(Caesar)',
+                   '*x: man(x) => person(x)',
+                   '*x: roman(x) => loyal(x, Caesar) | hate(x, Caesar)',
+                   '*x, *y: person(x) & ruler(y) & tryAssassin(x, y) '
+                   '=> !loyal(x, y)',
+                   'tryAssassin(Marcus, Caesar)'])
+
+    assert kb.prove(parse(conclusion), portfolio=True) == expected
+    assert sum(kb.strategy_wins.values()) == int(expected)
+
+
+def test_prove_portfolio_cancel():
+    # Set of support never refutes the inconsistent premises, and keeps
+    # deriving nat(S(C)), nat(S(S(C))), ...
+    strategies = [inference.Strategy('sos', set_of_support=True),
+                  inference.Strategy('default')]
+    kb = _make_kb(['p(A)', '!p(A)', 'r(A) | s(A)',
+                   '*x: nat(x) => nat(S(x))'],
+                  strategies=strategies)
+
+    assert kb.prove(parse('!nat(C)'), portfolio=True)
+    assert kb.strategy_wins == {'sos': 0, 'default': 1}
+    assert not multiprocessing.active_children()
+
+
+def test_prove_portfolio_crash():
+    kb = _make_kb(['man(Marcus)', '*x: man(x) => person(x)', 'p(A) | q(A)'],
+                  observers=[_Crash()])
+
+    # the processes of the strategies die without their results
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(
+            kb.search(parse('person(Marcus)'), portfolio=True)),
+        daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+
+    rv, = results
+    assert rv.status == inference.UNKNOWN
+    assert not multiprocessing.active_children()
+
+
+@pytest.mark.parametrize('portfolio', [False, True])
+def test_search_limits(portfolio):
+    # (non-Horn, so that the formulas are proved by saturation)
+    kb = _make_kb(['nat(Zero)', '*x: nat(x) => nat(S(x))', 'p(A) | q(A)'],
+                  limits=inference.Limits(max_generated=20))
+
+    rv = kb.search(parse('nat(Q)'), portfolio=portfolio)
+    assert rv.status == inference.UNKNOWN
+    assert rv.statistics.exhausted == 'max_generated'
+    assert not kb.prove(parse('nat(Q)'), portfolio=portfolio)
+
+    rv = kb.search(parse('nat(S(Zero))'), portfolio=portfolio)
+    assert rv.status == inference.PROVED
+
+    rv = kb.search(parse('nat(Q)'), portfolio=portfolio,
+                   limits=inference.Limits(timeout=0.2))
+    assert rv.statistics.exhausted == 'timeout'
+
+
+def test_last_statistics():
+    kb = _make_kb(['nat(Zero)', '*x: nat(x) => nat(S(x))', 'p(A) | q(A)'])
+    assert kb.last_statistics.generated == 0
+
+    assert kb.prove(parse('nat(S(S(Zero)))'))
+    assert kb.last_statistics.inferences['resolve'] > 0
+
+    assert list(kb.prove_many([parse('nat(S(Zero))')])) == [(0, True)]
+    assert kb.last_statistics.given > 0
+
+
+def test_last_statistics_cnf_time():
+    kb = _make_kb(['nat(Zero)', '*x: nat(x) => nat(S(x))',
+                   'p(A) <=> (q(A) <=> (r(A) <=> (s(A) <=> t(A))))'])
+
+    # the first proof counts clausification of the facts
+    assert kb.prove(parse('nat(S(Zero))'))
+    cnf_time = kb.last_statistics.cnf_time
+    assert kb.prove(parse('nat(S(S(Zero)))'))
+    assert kb.last_statistics.cnf_time < cnf_time
+
+    kb.add_axiom(parse('p(B) <=> (q(B) <=> (r(B) <=> (s(B) <=> t(B))))'))
+    assert list(kb.prove_many([parse('nat(S(Zero))')])) == [(0, True)]
+    assert kb.last_statistics.cnf_time > kb.last_statistics.elapsed
+
+
+def test_check_proof():
+    kb = _make_kb(['man(Marcus)', 'roman(Marcus)', 'ruler(Caesar)',
+                   '*x: man(x) => person(x)',
+                   '*x: roman(x) => loyal(x, Caesar) | hate(x, Caesar)',
+                   '*x, *y: person(x) & ruler(y) & tryAssassin(x, y) '
+                   '=> !loyal(x, y)',
+                   'tryAssassin(Marcus, Caesar)'])
+    f = parse('hate(Marcus, Caesar)')
+    assert kb.prove(f)
+    proof = kb.last_proof
+    assert kb.check_proof(f, proof)
+
+    kb.add_axiom(parse('p(A) | q(A)'))
+    assert kb.check_proof(f, proof)
+    assert not kb.prove(parse('p(A)'))
+    assert kb.last_proof is None
+
+
+def test_check_proof_rewritten():
+    kb = _make_kb(['*x: F(G(x)) = x', '*x: nat(x) | p(x)', '*x: !p(x)'])
+    kb.complete()
+
+    # proved from the normalized facts
+    f = parse('nat(F(G(Zero)))')
+    assert kb.prove(f)
+    assert kb.check_proof(f, kb.last_proof)
+    assert not kb.check_proof(parse('nat(F(G(One)))'), kb.last_proof)
+
+
+def test_add_lemma():
+    axioms = ['man(Marcus)', 'roman(Marcus)', 'ruler(Caesar)',
+              '*x: man(x) => person(x)',
+              '*x: roman(x) => loyal(x, Caesar) | hate(x, Caesar)',
+              '*x, *y: person(x) & ruler(y) & tryAssassin(x, y) '
+              '=> !loyal(x, y)',
+              'tryAssassin(Marcus, Caesar)']
+    kb = _make_kb(axioms)
+    assert kb.add_lemma(parse('hate(Marcus, Caesar)'))
+    assert not kb.add_lemma(parse('hate(Caesar, Marcus)'))
+
+    lemmas = kb.lemma_clauses
+    assert frozenset([parse('person(Marcus)')]) in lemmas
+    assert all(not inference.subsumes(j, k)
+               for j in lemmas for k in lemmas if j is not k)
+
+    kb2 = _make_kb(axioms, max_lemma_clauses=0)
+    assert kb2.add_lemma(parse('hate(Marcus, Caesar)'))
+    assert kb2.lemma_clauses == []
+    assert kb2.facts[-1] == parse('hate(Marcus, Caesar)')
+
+    # lemma clauses are premises of the later proofs
+    f = parse('!loyal(Marcus, Caesar) & hate(Marcus, Caesar)')
+    assert kb.prove(f)
+    assert kb.check_proof(f, kb.last_proof)
+    assert kb2.prove(f)
+    assert kb.last_statistics.generated < kb2.last_statistics.generated
+
+    kb = _make_kb(axioms, max_lemma_clauses=1)
+    assert kb.add_lemma(parse('hate(Marcus, Caesar)'))
+    assert len(kb.lemma_clauses) == 1
+
+
+def test_relevance_filter():
+    axioms = ['a(C)', '*x: a(x) => b(x)', '*x: b(x) => c(x)',
+              'p(A) | q(A)', 'n0(D) | m(D)',
+              *(f'*x: n{i}(x) => n{i + 1}(x)' for i in range(10))]
+    kb = _make_kb(axioms, relevance_filter=relevance.Filter(depth=1))
+    kb2 = _make_kb(axioms)
+
+    # irrelevant axioms are not used
+    f = parse('n5(D) | m(D)')
+    assert kb.prove(f)
+    assert kb2.prove(f)
+    assert kb.last_statistics.generated < kb2.last_statistics.generated
+
+    # falls back to larger selection
+    f = parse('c(C)')
+    assert kb.prove(f)
+    assert kb.check_proof(f, kb.last_proof)
+    assert kb.prove(parse('p(A) | q(A)'), portfolio=True)
+
+    # falls back to all axioms
+    assert not kb.prove(parse('c(D)'))
+    assert not kb.prove(parse('r(A)'))
+
+
+def test_relevance_filter_limits():
+    axioms = ['nat(Zero)', '*x: nat(x) => nat(S(x))', 'zero(Zero)', 'p(A)']
+    kb = _make_kb(axioms, limits=inference.Limits(timeout=1),
+                  relevance_filter=relevance.Filter(depth=1, tolerance=10))
+
+    # (all the stages share the timeout)
+    start = time.monotonic()
+    assert not kb.prove(parse('nat(Q)'))
+    assert time.monotonic() - start < 1.8
+    assert kb.last_statistics.exhausted == 'timeout'
+
+
+@pytest.mark.parametrize('horn_mode', [main.FORWARD_CHAINING,
+                                       main.BACKWARD_CHAINING])
+def test_cache(horn_mode):
+    kb = _make_kb(['man(Marcus)', '*x: man(x) => person(x)', 'p(A) | q(A)'],
+                  horn_mode=horn_mode)
+
+    assert kb.query(parse('?x: person(x)')) == \
+        parse_substitution({'x': 'Marcus'})
+    assert kb.cache_info == {'hits': 0, 'misses': 1, 'size': 1}
+
+    # alpha-equivalent formula
+    assert kb.query(parse('?y: person(y)')) == \
+        parse_substitution({'y': 'Marcus'})
+    assert kb.cache_info == {'hits': 1, 'misses': 1, 'size': 1}
+    assert kb.last_statistics.generated == 0
+
+    assert not kb.prove(parse('person(Caesar)'))
+    assert not kb.prove(parse('person(Caesar)'))
+    assert kb.cache_info == {'hits': 2, 'misses': 2, 'size': 2}
+
+    # proved formulas stay proved, the others are decided again
+    kb.add_axiom(parse('man(Caesar)'))
+    assert kb.prove(parse('person(Caesar)'))
+    assert kb.query(parse('?z: person(z)')) == \
+        parse_substitution({'z': 'Marcus'})
+    assert kb.cache_info == {'hits': 3, 'misses': 3, 'size': 2}
+
+
+def test_cache_size():
+    kb = _make_kb(['man(Marcus)', 'p(A) | q(A)'], cache_size=1)
+    for f in ('man(Marcus)', 'man(Caesar)', 'man(Marcus)'):
+        kb.prove(parse(f))
+    assert kb.cache_info == {'hits': 0, 'misses': 3, 'size': 1}
+
+    kb = _make_kb(['man(Marcus)', 'p(A) | q(A)'], cache_size=0)
+    kb.prove(parse('man(Marcus)'))
+    kb.prove(parse('man(Marcus)'))
+    assert kb.cache_info == {'hits': 0, 'misses': 0, 'size': 0}
+
+
+@pytest.mark.parametrize('formula, expected', [
+    ('?x: hate(x, Caesar)', ('?_0: hate(_0, Caesar)', {'x': '_0'})),
+    ('?y: hate(y, Caesar)', ('?_0: hate(_0, Caesar)', {'y': '_0'})),
+    ('*x: ?y: p(x, y)', ('*_0: ?_1: p(_0, _1)', {'x': '_0', 'y': '_1'})),
+    ('p(x)', ('p(x)', {})),
+
+    # ambiguous names
+    ('p(x) & ?x: q(x)', None),
+    ('(?x: p(x)) & ?x: q(x)', None),
+])
+def test_canonicalize(formula, expected):
+    assert main._canonicalize(parse(formula)) == expected
+
+
+@pytest.mark.parametrize('portfolio', [False, True])
+def test_search_async(portfolio):
+    kb = _make_kb(['nat(Zero)', '*x: nat(x) => nat(S(x))', 'p(A) | q(A)'])
+
+    async def run():
+        assert await kb.prove_async(parse('nat(S(Zero))'),
+                                    portfolio=portfolio)
+        assert await kb.query_async(parse('?x: nat(x)'),
+                                    portfolio=portfolio) == \
+            parse_substitution({'x': 'Zero'})
+
+        # the loop is served while the saturation never ends
+        task = asyncio.ensure_future(
+            kb.search_async(parse('nat(Q)'), portfolio=portfolio))
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert not task.done()
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        start = time.monotonic()
+        await asyncio.get_running_loop().shutdown_default_executor()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 1
+    assert not multiprocessing.active_children()
+
+
+def test_search_async_cache():
+    kb = _make_kb(['man(Marcus)', '*x: man(x) => person(x)', 'p(A) | q(A)'])
+    f = parse('person(Marcus)')
+
+    async def run():
+        return [await kb.search_async(f) for _ in range(2)]
+
+    rv, cached = asyncio.run(run())
+    assert rv.statistics.generated > 0
+    assert cached.statistics.generated == 0
+    assert kb.cache_info == {'hits': 1, 'misses': 1, 'size': 1}
+
+    # (the cached result keeps statistics of the proof)
+    (_, rv2), = kb._cache.values()
+    assert rv2.statistics is rv.statistics
+
+
+def test_search_async_horn():
+    kb = _make_kb(['p(A)', '*x, *y: p(x) & p(y) => p(F(x, y))'],
+                  horn_mode=main.BACKWARD_CHAINING)
+
+    async def run():
+        # the loop is served while the Horn clauses are queried
+        task = asyncio.ensure_future(kb.search_async(parse('?x: p(x)')))
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+        assert not task.done()
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        start = time.monotonic()
+        await asyncio.get_running_loop().shutdown_default_executor()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 1
+
+
+def test_search_async_add_axiom():
+    kb = _make_kb(['p(A)', '*x, *y: p(x) & p(y) => p(F(x, y))'],
+                  horn_mode=main.BACKWARD_CHAINING)
+
+    async def run():
+        task = asyncio.ensure_future(kb.search_async(parse('?x: p(x)')))
+        await asyncio.sleep(0.05)
+
+        # the axiom is added once the Horn clauses are not queried anymore
+        thread = threading.Thread(target=kb.add_axiom,
+                                  args=(parse('*x: p(x) => q(x)'),))
+        thread.start()
+        await asyncio.sleep(0.1)
+        assert thread.is_alive()
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        thread.join(1)
+        assert not thread.is_alive()
+
+    asyncio.run(run())
+    assert kb.prove(parse('q(A)'))
+
+
+def test_pickle():
+    kb = _make_kb(['man(Marcus)', '*x: man(x) => person(x)'])
+    kb = pickle.loads(pickle.dumps(kb))
+    assert kb.prove(parse('person(Marcus)'))
+
+
+# Helpers
+# -----------------------------------------------------------------------------
+
+class _Crash(inference.Observer):
+    def on_given(self, clause_id):
+        os._exit(1)
+
+
+def _make_kb(axioms, **kwargs):
+    kb = main.KnowledgeBase(**kwargs)
+    for k in axioms:
+        kb.add_axiom(parse(k))
+    return kb
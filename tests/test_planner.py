@@ -0,0 +1,56 @@
+import pytest
+
+from knowledge_base import planner
+
+
+def test_statistics():
+    s = planner.Statistics()
+    s.add('parent', ['Abe', 'Homer'])
+    s.add('parent', ['Homer', 'Bart'])
+    s.add('parent', ['Homer', 'Lisa'])
+
+    assert s.get_cardinality('parent') == 3
+    assert s.get_cardinality('person') == 0
+    assert s.get_distinct('parent', 0) == 2
+    assert s.get_distinct('parent', 1) == 3
+    assert s.estimate('parent', []) == 3
+    assert s.estimate('parent', [0]) == 1.5
+    assert s.estimate('parent', [0], cardinality=1) == 0.5
+
+    derived = planner.Statistics(s)
+    derived.add('magic', ['Abe'])
+    assert derived.get_cardinality('parent') == 3
+    assert derived.get_distinct('parent', 0) == 2
+    assert derived.get_cardinality('magic') == 1
+    assert s.get_cardinality('magic') == 0
+
+
+@pytest.mark.parametrize('atoms, bound, cardinalities, expected', [
+    # small relation first
+    ([('person', ['x']), ('ruler', ['y']), ('tryAssassin', ['x', 'y'])],
+     [], None, [(1, ()), (2, (1,)), (0, (0,))]),
+
+    # bound arguments first
+    ([('person', ['x']), ('tryAssassin', ['x', 'y'])],
+     ['y'], None, [(1, (1,)), (0, (0,))]),
+
+    # delta first
+    ([('person', ['x']), ('tryAssassin', ['x', 'y'])],
+     [], [1, None], [(0, ()), (1, (0,))]),
+
+    # the most selective index first
+    ([('tryAssassin', ['x', 'y'])],
+     ['x', 'y'], None, [(0, (0, 1))]),
+])
+def test_plan(atoms, bound, cardinalities, expected):
+    s = planner.Statistics()
+    for i in range(100):
+        s.add('person', [i])
+    for i in range(2):
+        s.add('ruler', [i])
+    for i in range(50):
+        s.add('tryAssassin', [i, i % 2])
+
+    atoms = [(p, [frozenset([k]) for k in args]) for p, args in atoms]
+    rv = planner.plan(atoms, s, bound=bound, cardinalities=cardinalities)
+    assert rv == [planner.Step(*k) for k in expected]
@@ -0,0 +1,42 @@
+import os
+import pstats
+
+import pytest
+
+from knowledge_base import profiling
+from knowledge_base.grammar import parse
+
+_PACKAGE_DIR = os.path.dirname(profiling.__file__)
+
+
+@pytest.mark.parametrize('filename, expected', [
+    (os.path.join(_PACKAGE_DIR, 'syntax.py'), 'syntax'),
+    (os.path.join(_PACKAGE_DIR, 'unification.py'), 'unification'),
+    (os.path.join(os.path.dirname(_PACKAGE_DIR), 'main.py'), 'main'),
+    ('/usr/lib/python3/site-packages/pyparsing.py', 'pyparsing'),
+    ('/usr/lib/python3/site-packages/yaml/nodes.py', 'yaml'),
+    ('/usr/lib/python3/copy.py', profiling.OTHER),
+    ('~', profiling.BUILTINS),
+])
+def test_get_module(filename, expected):
+    assert profiling.get_module(filename) == expected
+
+
+def test_profile(tmpdir):
+    path = str(tmpdir.join('profile.pstats'))
+
+    def func(x):
+        return parse(x).to_cnf()[0]
+
+    rv, stats = profiling.profile(func, '*x: man(x) => person(x)', path=path)
+    assert rv.is_cnf()
+    assert pstats.Stats(path).total_calls == stats.total_calls
+
+    modules = profiling.group_by_module(stats)
+    assert {'syntax', 'cnf', 'grammar'} <= modules.keys()
+    assert list(modules.values()) == sorted(modules.values(), reverse=True)
+    assert sum(modules.values()) == pytest.approx(stats.total_tt)
+
+    summary = profiling.format_summary(stats, top=5)
+    assert summary.startswith("Time by module:")
+    assert "Top 5 functions:" in summary
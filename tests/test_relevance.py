@@ -0,0 +1,57 @@
+import pytest
+
+from knowledge_base import relevance
+from knowledge_base.grammar import parse
+
+chain_model = [
+    'a(C)',
+    '*x: a(x) => b(x)',
+    '*x: b(x) => c(x)',
+    '*x: x = x',
+    'd(E)',
+]
+
+
+@pytest.mark.parametrize('formula, expected', [
+    ('man(Marcus)', {'man', 'Marcus'}),
+    ('*x: man(x) => person(x)', {'man', 'person'}),
+    ('?y: F(x) = G(A, y)', {'F', 'G', 'A'}),
+    ('*x: x = x', set()),
+])
+def test_get_symbols(formula, expected):
+    assert relevance.get_symbols(parse(formula)) == expected
+
+
+@pytest.mark.parametrize('axioms, goal, filter_, expected', [
+    (chain_model, 'c(C)', relevance.Filter(depth=1), {0, 2, 3}),
+    (chain_model, 'c(C)', relevance.Filter(depth=2), {0, 1, 2, 3}),
+    (chain_model, 'c(C)', relevance.Filter(), {0, 1, 2, 3}),
+    (chain_model, 'd(C)', relevance.Filter(), {0, 1, 3, 4}),
+    (chain_model, 'f(G)', relevance.Filter(), {3}),
+
+    # common symbol doesn't trigger axioms with rarer symbols
+    (['p(A)', 'p(B)', 'p(C) & q(C)'], 'p(x)',
+     relevance.Filter(), set()),
+    (['p(A)', 'p(B)', 'p(C) & q(C)'], 'p(A)',
+     relevance.Filter(), {0}),
+    (['p(A)', 'p(B)', 'p(C) & q(C)'], 'p(x)',
+     relevance.Filter(tolerance=3), {0, 1, 2}),
+    (['p(A)', 'p(B)', 'p(C) & q(C)'], 'q(x)',
+     relevance.Filter(), {2}),
+])
+def test_select(axioms, goal, filter_, expected):
+    index = relevance.Index()
+    for k in axioms:
+        index.add(parse(k))
+
+    assert len(index) == len(axioms)
+    assert index.select(parse(goal), filter_) == expected
+
+
+@pytest.mark.parametrize('filter_', [
+    relevance.Filter(depth=0),
+    relevance.Filter(tolerance=0.5),
+])
+def test_select_invalid(filter_):
+    with pytest.raises(ValueError):
+        relevance.Index().select(parse('p(A)'), filter_)
@@ -0,0 +1,52 @@
+import pytest
+
+from knowledge_base import rewriting
+from knowledge_base.grammar import parse
+
+
+@pytest.mark.parametrize('axioms, expected_rules, expected_equations', [
+    (['Caesar = Julius'], ['Julius -> Caesar'], []),
+    (['Caesar = Julius', 'man(Marcus)'], ['Julius -> Caesar'], []),
+    (['*x: F(F(F(x))) = x', '*x: F(F(F(F(F(x))))) = x'],
+     ['F(x1) -> x1'], []),
+    (['*x: F(G(x)) = x', '*x: G(x) = H(x)'],
+     ['F(G(x1)) -> x1', 'H(x1) -> G(x1)'], []),
+    (['*x, *y: P(x, y) = P(y, x)'],
+     [], ['P(x1, x2) = P(x2, x1)']),
+])
+def test_complete(axioms, expected_rules, expected_equations):
+    axioms = [parse(k) for k in axioms]
+    rs = rewriting.complete(axioms)
+    print(rs)
+
+    assert sorted(str(k) for k in rs.rules) == sorted(expected_rules)
+    assert [f'{s} = {t}' for s, t in rs.equations] == expected_equations
+    assert rs.is_convergent() == (not expected_equations)
+    assert rs.is_up_to_date(axioms)
+
+
+def test_complete_limit():
+    axioms = [parse('*x: F(F(x)) = G(x)'), parse('*x: F(G(x)) = G(F(x))')]
+    with pytest.raises(rewriting.CompletionError):
+        rewriting.complete(axioms, precedence=['F', 'G'], max_rules=1)
+
+
+@pytest.mark.parametrize('axioms, node, expected', [
+    (['Caesar = Julius'], 'hate(Marcus, Julius)', 'hate(Marcus, Caesar)'),
+    (['Caesar = Julius'], '*x: hate(x, Julius)', '*x: hate(x, Caesar)'),
+    (['*x: F(F(F(x))) = x', '*x: F(F(F(F(F(x))))) = x'],
+     'p(F(F(A))) & F(x) = G(F(y))', 'p(A) & x = G(y)'),
+])
+def test_normalize(axioms, node, expected):
+    rs = rewriting.complete([parse(k) for k in axioms])
+    assert rs.normalize(parse(node)) == parse(expected)
+
+
+@pytest.mark.parametrize('axioms', [
+    ['Caesar = Julius'],
+    ['*x: F(G(x)) = x', '*x: G(x) = H(x)'],
+    ['*x, *y: P(x, y) = P(y, x)', '?x: x = A'],
+])
+def test_dumps_loads(axioms):
+    rs = rewriting.complete([parse(k) for k in axioms])
+    assert rewriting.RewriteSystem.loads(rs.dumps()) == rs
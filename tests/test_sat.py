@@ -0,0 +1,73 @@
+import itertools
+import random
+
+import pytest
+
+from knowledge_base import sat
+
+
+@pytest.mark.parametrize('clauses, expected', [
+    ([], True),
+    ([[1]], True),
+    ([[1], [-1]], False),
+    ([[1, -1]], True),
+    ([[1, 2], [-1, 2], [1, -2], [-1, -2]], False),
+    ([[1, 2], [-1, 2], [1, -2]], True),
+    ([[1], [-1, 2], [-2, 3], [-3]], False),
+    ([[1, 2, 3], [-1], [-2], [-3, 4], [-4, 5]], True),
+])
+def test_solve(clauses, expected):
+    model = sat.solve(clauses)
+    assert (model is not None) == expected
+    if model is not None:
+        assert _satisfies(model, clauses)
+
+
+@pytest.mark.parametrize('pigeons', [2, 3, 4, 5])
+def test_solve_pigeonhole(pigeons):
+    # `pigeons` pigeons into `pigeons - 1` holes
+    holes = pigeons - 1
+
+    def var(p, h):
+        return p * holes + h + 1
+
+    clauses = [[var(p, h) for h in range(holes)] for p in range(pigeons)]
+    for h in range(holes):
+        for p, q in itertools.combinations(range(pigeons), 2):
+            clauses.append([-var(p, h), -var(q, h)])
+
+    assert sat.solve(clauses) is None
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_solve_random(seed):
+    rnd = random.Random(seed)
+    n = 8
+    clauses = [[rnd.choice([-1, 1]) * rnd.randint(1, n) for _ in range(3)]
+               for _ in range(rnd.randint(20, 45))]
+
+    expected = any(_satisfies([False, *values], clauses)
+                   for values in itertools.product([False, True], repeat=n))
+
+    model = sat.solve(clauses)
+    assert (model is not None) == expected
+    if model is not None:
+        assert _satisfies(model, clauses)
+
+
+def test_solver_incremental():
+    solver = sat.Solver()
+    assert solver.add_clause([1, 2])
+    assert solver.solve()
+    assert solver.add_clause([-1])
+    assert solver.solve()
+    assert solver.model[2]
+    assert not solver.add_clause([-2])
+    assert not solver.solve()
+
+
+# Helpers
+# -----------------------------------------------------------------------------
+
+def _satisfies(model, clauses):
+    return all(any(model[abs(k)] == (k > 0) for k in c) for c in clauses)
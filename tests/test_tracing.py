@@ -0,0 +1,51 @@
+import json
+
+from knowledge_base import inference, tracing
+from knowledge_base.grammar import parse
+
+
+def test_trace(tmpdir):
+    path = str(tmpdir.join('trace.json'))
+    premises = [parse('man(Marcus)'), parse('*x: man(x) => person(x)')]
+
+    assert tracing.get_tracer() is None
+    with tracing.trace(path) as tracer:
+        assert tracing.get_tracer() is tracer
+        rv = inference.search(premises, parse('person(Marcus)'))
+    assert tracing.get_tracer() is None
+    assert rv.status == inference.PROVED
+
+    with open(path) as fp:
+        events = json.load(fp)['traceEvents']
+    assert events == tracer.events
+
+    names = {(k['cat'], k['name']) for k in events}
+    assert {('inference', 'search'), ('inference', 'clausify'),
+            ('inference', 'select'), ('inference', 'given clause'),
+            ('cnf', 'skolemize')} <= names
+
+    given = [k for k in events if k['name'] == 'given clause']
+    assert sum(k['args']['generated'] for k in given) == \
+        rv.statistics.generated
+    assert all(k['ph'] == 'X' and k['dur'] >= 0 for k in events)
+
+    # spans are nested in the search
+    search, = (k for k in events if k['name'] == 'search')
+    for k in events:
+        assert search['ts'] <= k['ts']
+        assert k['ts'] + k['dur'] <= search['ts'] + search['dur']
+
+
+def test_span():
+    with tracing.span('noop', 'test'):
+        pass
+
+    with tracing.trace() as tracer:
+        with tracing.span('outer', 'test', n=1):
+            with tracing.span('inner', 'test'):
+                pass
+
+    inner, outer = tracer.events
+    assert (inner['name'], outer['name']) == ('inner', 'outer')
+    assert outer['args'] == {'n': 1}
+    assert 'args' not in inner
@@ -96,3 +96,28 @@ def test_compose(r, s, expected):
         assert not r and not s
 
     assert subst == expected
+
+
+@pytest.mark.parametrize('pattern, node, expected', [
+    ('P', 'P', {}),
+    ('P', 'Q', None),
+    ('x', 'P', {'x': 'P'}),
+    ('x', 'y', {'x': 'y'}),
+    ('P', 'x', None),
+    ('H(x, x)', 'H(P, P)', {'x': 'P'}),
+    ('H(x, x)', 'H(P, Q)', None),
+    ('H(x, G(y))', 'H(G(y), G(P))', {'x': 'G(y)', 'y': 'P'}),
+])
+def test_match(pattern, node, expected):
+    pattern = parse(pattern, _allow_partial_expression=True)
+    node = parse(node, _allow_partial_expression=True)
+    expected = parse_substitution(expected)
+
+    try:
+        subst = unification.match(pattern, node)
+    except unification.NotUnifiable:
+        subst = None
+    else:
+        assert pattern.apply(subst) == node
+
+    assert subst == expected
@@ -1,4 +1,5 @@
 import copy
+import sys
 
 import pytest
 
@@ -49,6 +50,27 @@ def test_appenddefault(before, default):
         assert rv == [val]
 
 
+def test_getsizeof():
+    node = parse('f(x, y)')
+    assert utils.getsizeof(node) > sys.getsizeof(node)
+
+    seen = set()
+    size = utils.getsizeof([node], seen)
+    assert size == sys.getsizeof([node]) + utils.getsizeof(node)
+
+    # shared objects are counted once
+    assert utils.getsizeof({'k': node}, seen) == \
+        utils.getsizeof({'k': None}) - sys.getsizeof(None)
+    assert utils.getsizeof((node, node)) == \
+        sys.getsizeof((None, None)) + utils.getsizeof(node)
+
+    # attributes
+    obj = type('Foo', (), {})()
+    obj.node = node
+    assert utils.getsizeof(obj) == \
+        sys.getsizeof(obj) + utils.getsizeof(vars(obj))
+
+
 @pytest.mark.parametrize('table, expected', [
     ([[0, 1, 2],
       ['aa', 'b', 'c'],